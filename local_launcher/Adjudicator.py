@@ -0,0 +1,68 @@
+import math
+from typing import Optional
+from Board import Sign, GameOutcome
+from utils import get_value
+
+
+def parse_score(text: str) -> Optional[float]:
+    """
+    Engines report scores from their own point of view, either as a number or as a distance to a forced win or loss.
+    :param text: score as reported by the engine, for example '35', '+1.25', '61.3%', 'M7', '-M4'
+    :return: score, infinity for a forced win, minus infinity for a forced loss, None if the score is unknown
+    """
+    text = text.strip().rstrip('%')
+    if text.lstrip('+-').upper().startswith('M'):
+        return -math.inf if text.startswith('-') else math.inf
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class Adjudicator:
+    """
+    Ends games that both engines agree on:
+        - the game is won if both engines report a score beyond 'resign_score' (in favour of the same player)
+          for 'resign_moves' consecutive moves each,
+        - the game is drawn if after move 'draw_after' both engines report a score within 'draw_score' from zero
+          for 'draw_moves' consecutive moves each.
+    Thresholds are in the units reported by the engines, so both of them should use the same scale.
+    """
+
+    def __init__(self, config: dict):
+        """
+        :param config: 'adjudication' section of tournament config
+        """
+        self._enabled = get_value(config, 'enabled', False)
+        self._resign_score = get_value(config, 'resign_score', 1000.0)
+        self._resign_moves = get_value(config, 'resign_moves', 4)
+        self._draw_score = get_value(config, 'draw_score', 10.0)
+        self._draw_moves = get_value(config, 'draw_moves', 8)
+        self._draw_after = get_value(config, 'draw_after', 100)
+        self._history = []  # (sign, score) of consecutive moves
+
+    def add_move(self, sign: Sign, score: str, move_number: int) -> Optional[tuple]:
+        """
+        :param sign: sign of the player that has just moved
+        :param score: score reported by this player while searching for the move
+        :param move_number: number of moves on the board
+        :return: (GameOutcome, reason) if the game should be adjudicated, None otherwise
+        """
+        if not self._enabled:
+            return None
+        self._history.append((sign, parse_score(score)))
+
+        last = self._history[-2 * self._resign_moves:]
+        if len(last) == 2 * self._resign_moves and all(s is not None and abs(s) >= self._resign_score for _, s in last):
+            winners = set(player if s > 0 else (Sign.WHITE if player == Sign.BLACK else Sign.BLACK) for player, s in last)
+            if len(winners) == 1:
+                winner = winners.pop()
+                return GameOutcome.BLACK_WIN if winner == Sign.BLACK else GameOutcome.WHITE_WIN, \
+                    'adjudicated win, both engines reported scores beyond ' + str(self._resign_score) + ' for ' + str(self._resign_moves) + ' moves'
+
+        last = self._history[-2 * self._draw_moves:]
+        if move_number >= self._draw_after and len(last) == 2 * self._draw_moves and \
+                all(s is not None and abs(s) <= self._draw_score for _, s in last):
+            return GameOutcome.DRAW, 'adjudicated draw, both engines reported scores within ' + str(self._draw_score) + ' for ' + \
+                str(self._draw_moves) + ' moves after move ' + str(self._draw_after)
+        return None
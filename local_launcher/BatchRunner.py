@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+from Tournament import Tournament
+from SlotPool import SlotPool
+
+'''
+Runs a queue of tournaments on one machine. All of them are started at once, but a game can be played only while
+holding one of the global slots, so the machine is never oversubscribed and a tournament that is finishing
+leaves its slots to the others. Each tournament keeps its state in its own directory, as if it was run alone,
+so the batch can be interrupted and resumed, and the tournaments can later be continued separately.
+'''
+
+
+def parse_job(text: str) -> tuple:
+    """
+    :param text: path to the working directory of the tournament, optionally followed by ':priority'
+    :return: (path, priority)
+    """
+    path, _, priority = text.rpartition(':')
+    if path != '' and priority.lstrip('-').isdigit():
+        return path, int(priority)
+    return text, 0
+
+
+def run_batch(jobs: list, slots: int) -> None:
+    """
+    :param jobs: list of (working directory, priority), tournaments with higher priority get free slots first
+    :param slots: maximal number of games played at the same time by all the tournaments
+    :return:
+    """
+    for path, _ in jobs:
+        if not os.path.exists(os.path.join(path, 'config.json')):
+            raise Exception('there is no config.json in \'' + path + '\'')
+
+    pool = SlotPool(slots)
+    tournaments = []
+    for path, priority in jobs:
+        tournaments.append((path, Tournament(os.path.join(path, ''), None, False, pool, priority)))
+
+    def signal_handler(sig, frame):
+        logging.info('Requesting interruption, this may take a while...')
+        for _, t in tournaments:
+            t.stop()
+
+    signal.signal(signal.SIGINT, signal_handler)
+
+    for _, t in tournaments:
+        t.start()
+    running = list(tournaments)
+    while len(running) > 0:
+        time.sleep(1)
+        for path, t in list(running):
+            if t.is_running():
+                t.adjust_parallelism()
+                t.release_expired_games()
+            else:
+                print('tournament \'' + path + '\' has ended')
+                print(t.get_summary())
+                t.cleanup()
+                running.remove((path, t))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays several tournaments sharing one budget of parallel games.')
+    parser.add_argument('jobs', nargs='+', help='working directories of the tournaments, each optionally followed by :priority')
+    parser.add_argument('--slots', type=int, default=os.cpu_count(), help='number of games played at the same time')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO if args.verbose else logging.WARNING)
+    run_batch([parse_job(job) for job in args.jobs], args.slots)
+    exit(0)
@@ -6,6 +6,7 @@ from typing import Optional
 from utils import get_value
 from game_rules import Sign, Move, GameRules, check_freestyle, check_standard, check_renju, check_caro, is_forbidden
 from exceptions import MadeIllegalMove, MadeFoulMove
+from Tracing import traced
 
 
 class GameOutcome(IntEnum):
@@ -91,8 +92,12 @@ class Board:
     def number_of_moves(self) -> int:
         return len(self._played_moves)
 
-    def get_played_moves(self) -> list:
-        return copy.deepcopy(self._played_moves)
+    def get_played_moves(self, first: int = 0) -> list:
+        """
+        :param first: index of the first move to return, allows fetching only the moves played since some point
+        :return: copy of the played moves
+        """
+        return copy.deepcopy(self._played_moves[first:])
 
     def get_last_move(self) -> Optional[Move]:
         if len(self._played_moves) == 0:
@@ -100,6 +105,7 @@ class Board:
         else:
             return copy.deepcopy(self._played_moves[-1])
 
+    @traced('board')
     def make_move(self, move: Move) -> None:
         if 0 <= move.row < self.rows() and 0 <= move.col < self.cols() and \
                 (move.sign == Sign.BLACK or move.sign == Sign.WHITE) and \
@@ -109,6 +115,7 @@ class Board:
         else:
             raise MadeIllegalMove(move.sign, move)
 
+    @traced('board')
     def get_outcome(self) -> GameOutcome:
         if self.number_of_moves() == 0:  # no outcome for empty board
             return GameOutcome.NO_OUTCOME
@@ -124,11 +131,7 @@ class Board:
             else:
                 return GameOutcome.WHITE_WIN
 
-        empty_spots = 0
-        for row in range(self.rows()):
-            for col in range(self.cols()):
-                if self.get_sign_at(row, col) == Sign.EMPTY:
-                    empty_spots += 1
+        empty_spots = int(np.count_nonzero(self._board == int(Sign.EMPTY)))
 
         # no winner was found
         if self._rules == GameRules.FREESTYLE:
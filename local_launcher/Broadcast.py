@@ -0,0 +1,183 @@
+import os
+import json
+import queue
+import logging
+from threading import Thread, Lock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from EventBus import EventBus, GameStarted, MoveMade, EvalUpdated, ClockUpdate, EngineCrashed, GameFinished
+
+'''
+Games are streamed to spectators as server-sent events (http://host:port/events), viewer.html is served at /.
+Every event is encoded once, no matter how many viewers there are, and carries only what has changed:
+    snapshot {games: [{s, rows, cols, names, moves, clocks, evals}]} - sent first to every new viewer
+    start {s, rows, cols, names} - new game has started in slot s
+    move {s, m: [row, col, sign]}
+    clock {s, p, t, on, sign} - time left (t) is in milliseconds, the viewer runs the clock of the player on move
+    eval {s, p, mem, d, sc, n, sp}
+    crash {s, name, reason}
+    result {i, b, w, o} - game i between black (b) and white (w) player has ended with outcome o
+'''
+
+_EVENTS = (GameStarted, MoveMade, EvalUpdated, ClockUpdate, EngineCrashed, GameFinished)
+
+
+def _encode(kind: str, data: dict) -> bytes:
+    return ('event: ' + kind + '\ndata: ' + json.dumps(data, separators=(',', ':')) + '\n\n').encode('utf-8')
+
+
+class _Game:
+    def __init__(self, event: GameStarted):
+        self.header = {'s': event.slot, 'rows': event.rows, 'cols': event.cols, 'names': [event.name1, event.name2]}
+        self.moves = []
+        self.clocks = [None, None]
+        self.evals = [None, None]
+
+    def to_dict(self) -> dict:
+        return dict(self.header, moves=self.moves, clocks=self.clocks, evals=self.evals)
+
+
+class _Viewer:
+    def __init__(self, max_lag: int):
+        self.queue = queue.Queue(max_lag)
+        self.lagging = False  # set when an event could not be queued, then the viewer has an incorrect state
+
+
+class _BroadcastHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path == '/' or self.path == '/index.html':
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'viewer.html'), 'rb') as file:
+                body = file.read()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == '/events':
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.server.stream(self.wfile)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug('broadcast request ' + (format % args))
+
+
+class BroadcastServer(ThreadingHTTPServer):
+    """
+    Streams all running games to spectators. The judge only publishes events on the bus, encoding and sending
+    is done by the broadcasting thread and by one thread per viewer.
+    """
+    daemon_threads = True
+
+    def __init__(self, event_bus: EventBus, host: str, port: int, max_lag: int = 10000):
+        """
+        :param event_bus:
+        :param host:
+        :param port:
+        :param max_lag: viewer that has that many events waiting is disconnected, the browser then reconnects
+                        and gets a new snapshot
+        """
+        super().__init__((host, port), _BroadcastHandler)
+        self._max_lag = max_lag
+        self._lock = Lock()
+        self._games = {}  # slot -> _Game
+        self._viewers = []
+        self._subscription = event_bus.subscribe(_EVENTS, 100000)  # losing events would desynchronise the boards
+        self._broadcaster = Thread(target=self._broadcast, daemon=True)
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._broadcaster.start()
+        self._thread.start()
+        logging.info('broadcasting games on ' + str(self.server_address))
+
+    def _apply(self, event: tuple) -> bytes:
+        """
+        Updates the state kept for new viewers.
+        :param event:
+        :return: encoded delta
+        """
+        if isinstance(event, GameStarted):
+            game = _Game(event)
+            self._games[event.slot] = game
+            return _encode('start', game.header)
+        elif isinstance(event, GameFinished):
+            return _encode('result', {'i': event.game.index, 'b': event.engines[0], 'w': event.engines[1],
+                                      'o': event.game.outcome.name})
+        elif isinstance(event, EngineCrashed):
+            return _encode('crash', {'s': event.slot, 'name': event.name, 'reason': event.reason})
+
+        game = self._games.get(event.slot)
+        if isinstance(event, MoveMade):
+            data = {'s': event.slot, 'm': [event.row, event.col, event.sign]}
+            if game is not None:
+                game.moves.append(data['m'])
+            return _encode('move', data)
+        elif isinstance(event, ClockUpdate):
+            data = {'s': event.slot, 'p': event.player, 't': int(1000 * event.time_left), 'on': event.on_move, 'sign': event.sign}
+            if game is not None:
+                game.clocks[event.player] = data
+            return _encode('clock', data)
+        else:
+            data = {'s': event.slot, 'p': event.player, 'mem': event.memory, 'd': event.depth, 'sc': event.score,
+                    'n': event.nodes, 'sp': event.speed}
+            if game is not None:
+                game.evals[event.player] = data
+            return _encode('eval', data)
+
+    def _broadcast(self) -> None:
+        while True:
+            event = self._subscription.get()
+            if event is None:
+                break
+            with self._lock:
+                data = self._apply(event)
+                for viewer in self._viewers:
+                    try:
+                        viewer.queue.put_nowait(data)
+                    except queue.Full:  # viewer is too slow, it will be disconnected
+                        viewer.lagging = True
+        with self._lock:  # the tournament has ended
+            for viewer in self._viewers:
+                viewer.lagging = True
+
+    def stream(self, file) -> None:
+        """
+        Sends events to a single viewer until it disconnects. Called in the thread of the connection.
+        """
+        viewer = _Viewer(self._max_lag)
+        with self._lock:
+            snapshot = _encode('snapshot', {'games': [self._games[s].to_dict() for s in sorted(self._games.keys())]})
+            self._viewers.append(viewer)
+        logging.info('new viewer, there are ' + str(len(self._viewers)) + ' viewers')
+        try:
+            file.write(snapshot)
+            file.flush()
+            idle = 0
+            while not viewer.lagging:
+                try:
+                    data = viewer.queue.get(timeout=1.0)
+                    idle = 0
+                except queue.Empty:
+                    idle += 1
+                    if idle < 15:
+                        continue
+                    data = b': keep-alive\n\n'  # lets the server notice that the viewer has disconnected
+                    idle = 0
+                file.write(data)
+                file.flush()
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._viewers.remove(viewer)
+
+    def get_number_of_viewers(self) -> int:
+        return len(self._viewers)
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
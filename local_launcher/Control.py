@@ -0,0 +1,79 @@
+import json
+import logging
+from threading import Thread
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+'''
+Control of a running tournament over HTTP, requests and responses are JSON objects:
+    GET /status -> {games_in_parallel, paused, games_total, games_finished, games_running, games_pending}
+    POST /parallelism {games_in_parallel: n} - surplus threads stop after finishing their current games
+    POST /pause - threads finish their current games and wait, engines are started anew for every game anyway
+    POST /resume
+    POST /priority {priority: p, games: [ids]} or {priority: p, player: name} - pending games with higher priority
+        are played first, name is the key of the player in the config ('player_1', 'player_2', 'engine_<i>') or
+        the name given to it in the config, unknown names are rejected
+For example: curl -X POST -d '{"games_in_parallel": 4}' http://localhost:port/parallelism
+'''
+
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    def _respond(self, code: int, response: dict) -> None:
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        if self.path == '/status':
+            self._respond(200, self.server.tournament.get_status())
+        else:
+            self._respond(404, {'error': 'unknown path \'' + self.path + '\''})
+
+    def do_POST(self) -> None:
+        tournament = self.server.tournament
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length)) if length > 0 else {}
+            if self.path == '/parallelism':
+                tournament.set_games_in_parallel(int(request['games_in_parallel']))
+            elif self.path == '/pause':
+                tournament.pause()
+            elif self.path == '/resume':
+                tournament.resume()
+            elif self.path == '/priority':
+                changed = tournament.set_priority(int(request['priority']), request.get('games'), request.get('player'))
+                self._respond(200, dict(tournament.get_status(), games_changed=changed))
+                return
+            else:
+                self._respond(404, {'error': 'unknown path \'' + self.path + '\''})
+                return
+        except Exception as e:
+            logging.error('control request ' + self.path + ' failed : ' + str(e))
+            self._respond(400, {'error': str(e)})
+            return
+        self._respond(200, tournament.get_status())
+
+    def log_message(self, format: str, *args) -> None:
+        logging.info('control request ' + (format % args))
+
+
+class ControlServer(ThreadingHTTPServer):
+    """
+    Serves the control API at http://host:port/, it should be bound only to trusted interfaces.
+    """
+    daemon_threads = True
+
+    def __init__(self, tournament, host: str, port: int):
+        super().__init__((host, port), _ControlHandler)
+        self.tournament = tournament
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        logging.info('serving control API on ' + str(self.server_address))
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
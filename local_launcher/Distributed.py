@@ -0,0 +1,252 @@
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import logging
+import argparse
+import socketserver
+from threading import Thread, Lock, Event
+from typing import Optional
+from GameConfig import GameConfig
+from Journal import get_journal_path
+import Tracing
+import Profiling
+from utils import get_value
+
+'''
+Coordinator and remote workers exchange JSON objects over TCP, one object per line. Every request gets a response:
+    {'type': 'hello'} -> {'config': tournament config}
+    {'type': 'get', 'worker': name} -> {'game': game (as in GameConfig.to_dict) or null if there is nothing to play,
+                                        'paused': true if the tournament is paused and the worker should ask again later}
+    {'type': 'finish', 'worker': name, 'game': game} -> {'ok': true}
+    {'type': 'renew', 'worker': name, 'index': index of the game} -> {'ok': false if the game is no longer claimed}
+If a request fails the response is {'error': message}.
+There is no authentication, the coordinator listens on localhost unless it is given another interface with --host.
+'''
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                response = self.server.process(json.loads(line))
+            except Exception as e:
+                logging.error('request from ' + str(self.client_address) + ' failed : ' + str(e))
+                response = {'error': str(e)}
+            self.wfile.write((json.dumps(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+
+class Coordinator(socketserver.ThreadingTCPServer):
+    """
+    Serves games of the tournament to remote workers. Each connection is handled in its own thread.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, tournament, host: str, port: int):
+        super().__init__((host, port), _RequestHandler)
+        self._tournament = tournament
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        logging.info('coordinator is listening on ' + str(self.server_address))
+
+    def process(self, request: dict) -> dict:
+        if request['type'] == 'hello':
+            return {'config': self._tournament.get_config()}
+        elif request['type'] == 'get':
+            if self._tournament.is_paused():
+                return {'game': None, 'paused': True}
+            game = self._tournament.get_game_to_play(request['worker'])
+            return {'game': None if game is None else game.to_dict(), 'paused': False}
+        elif request['type'] == 'finish':
+            self._tournament.finish_gamed(GameConfig.from_dict(request['game']), request['worker'])
+            return {'ok': True}
+        elif request['type'] == 'renew':
+            return {'ok': self._tournament.renew_lease(request['index'], request['worker'])}
+        else:
+            raise Exception('unknown request \'' + str(request['type']) + '\'')
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class RemoteTournament:
+    """
+    Used by PlayingThreads on a worker host in place of the Tournament. Games are claimed from the coordinator,
+    and while they are played their leases are periodically renewed.
+    """
+
+    def __init__(self, host: str, port: int, working_dir: str, name: str = '', retry_time: float = 60.0):
+        """
+        :param working_dir: local directory for journals of the games
+        :param name: identifier of the worker, must be unique among all workers
+        :param retry_time: for how long (in seconds) to try to reconnect to the coordinator before giving up
+        """
+        self._address = (host, port)
+        self._name = name if name != '' else socket.gethostname() + ':' + str(os.getpid())
+        self._retry_time = retry_time
+        self._lock = Lock()
+        self._socket = None
+        self._file = None
+
+        self._config = self._call({'type': 'hello'})['config']
+        self._config['working_dir'] = working_dir
+        if not os.path.exists(working_dir + '/journal/'):
+            os.makedirs(working_dir + '/journal/')
+
+        self._games = set()  # indices of games that are being played
+        self._stop = Event()
+        self._lease_thread = Thread(target=self._renew_leases, daemon=True)
+        self._lease_thread.start()
+
+    def _connect(self) -> None:
+        self._socket = socket.create_connection(self._address, timeout=30.0)
+        self._file = self._socket.makefile('rwb')
+
+    def _disconnect(self) -> None:
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+            self._socket = None
+
+    def _call(self, request: dict) -> dict:
+        """
+        Sends the request, reconnecting if the connection was lost.
+        :param request:
+        :return: response of the coordinator
+        """
+        deadline = time.time() + self._retry_time
+        delay = 0.5
+        with self._lock:
+            while True:
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    self._file.write((json.dumps(request) + '\n').encode('utf-8'))
+                    self._file.flush()
+                    line = self._file.readline()
+                    if len(line) == 0:
+                        raise ConnectionError('coordinator has closed the connection')
+                    break
+                except OSError as e:
+                    self._disconnect()
+                    if time.time() + delay > deadline:
+                        raise
+                    logging.warning('could not reach coordinator at ' + str(self._address) + ' : ' + str(e))
+                    time.sleep(delay)
+                    delay = min(2 * delay, 10.0)
+        response = json.loads(line)
+        if 'error' in response:
+            raise Exception('coordinator could not process \'' + request['type'] + '\' : ' + response['error'])
+        return response
+
+    def _renew_leases(self) -> None:
+        interval = get_value(self._config, 'lease_timeout', 60.0) / 3.0
+        while not self._stop.wait(interval):
+            for index in list(self._games):
+                try:
+                    if not self._call({'type': 'renew', 'worker': self._name, 'index': index})['ok']:
+                        logging.warning('lease of game ' + str(index) + ' was lost, its result will be ignored')
+                except Exception as e:
+                    logging.error(str(e))
+
+    def get_config(self) -> dict:
+        return self._config
+
+    def get_event_bus(self) -> None:  # events are not sent over the network
+        return None
+
+    def get_journal_path(self, index: int) -> str:
+        return get_journal_path(self._config['working_dir'], index)
+
+    def get_game_to_play(self) -> Optional[GameConfig]:
+        try:
+            while True:
+                response = self._call({'type': 'get', 'worker': self._name})
+                if not response.get('paused', False) or self._stop.wait(5.0):
+                    break
+            tmp = response['game']
+        except Exception as e:
+            logging.error(str(e))
+            return None
+        if tmp is None:
+            return None
+        self._games.add(tmp['index'])
+        return GameConfig.from_dict(tmp)
+
+    def finish_gamed(self, game: GameConfig) -> None:
+        try:
+            self._call({'type': 'finish', 'worker': self._name, 'game': game.to_dict()})
+        except Exception as e:  # the game will be played again when its lease expires
+            logging.error(str(e))
+        self._games.discard(game.index)
+
+    def release_slot(self) -> None:  # slots are shared only by tournaments of the coordinator
+        pass
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._disconnect()
+
+
+def run_worker(host: str, port: int, working_dir: str, games_in_parallel: int, name: str = '') -> None:
+    from Tournament import PlayingThread  # imported here to avoid circular import
+
+    manager = RemoteTournament(host, port, working_dir, name)
+    threads = [PlayingThread(manager, i) for i in range(games_in_parallel)]
+
+    def signal_handler(sig, frame):
+        logging.info('Requesting interruption, this may take a while...')
+        manager.close()  # threads waiting while the tournament is paused stop waiting
+        for t in threads:
+            t.cleanup()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    for t in threads:
+        t.start()
+    for t in threads:
+        while t.is_alive():  # join with timeout, so that the signal handler can run
+            t.join(1.0)
+    manager.close()
+    if Tracing.is_enabled():
+        Tracing.write_trace(working_dir + '/trace.json', Tracing.take_all_events())
+    if get_value(manager.get_config(), 'profile', False):  # profiling is requested by the coordinator
+        config = dict(manager.get_config())
+        del config['working_dir'], config['profile']
+        print('profile saved to ' + Profiling.merge_profiles(working_dir + '/profile/', config) + '.*')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays a tournament on several hosts.')
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+    coordinator_parser = subparsers.add_parser('coordinator', help='manages the tournament, games are played by the workers')
+    coordinator_parser.add_argument('working_dir', help='directory with config.json of the tournament')
+    coordinator_parser.add_argument('--host', default='127.0.0.1',
+                                    help='interface to listen on, there is no authentication, so give one that only trusted workers can reach')
+    coordinator_parser.add_argument('--port', type=int, default=5005)
+    coordinator_parser.add_argument('--draw', action='store_true', help='show games played by local threads')
+    coordinator_parser.add_argument('--profile', action='store_true', help='profile playing threads, also on the workers')
+    worker_parser = subparsers.add_parser('worker', help='plays games of the tournament run by a coordinator')
+    worker_parser.add_argument('host', help='address of the coordinator')
+    worker_parser.add_argument('--port', type=int, default=5005)
+    worker_parser.add_argument('--working-dir', default='./worker/', help='directory for journals of the games')
+    worker_parser.add_argument('--games-in-parallel', type=int, default=1)
+    worker_parser.add_argument('--name', default='', help='unique name of the worker (default is hostname:pid)')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO if args.verbose else logging.WARNING)
+    if args.mode == 'coordinator':
+        from Tournament import run_tournament
+
+        run_tournament(args.working_dir, args.draw, (args.host, args.port), args.profile)
+    else:
+        run_worker(args.host, args.port, args.working_dir, args.games_in_parallel, args.name)
+    exit(0)
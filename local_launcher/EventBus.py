@@ -0,0 +1,187 @@
+import queue
+import logging
+from threading import Thread, Lock
+from typing import Callable, NamedTuple, Optional
+from GameConfig import GameConfig
+
+'''
+Events are named tuples, so that they are cheap to create and to pickle (they are sent from worker processes).
+Events of a game carry the slot (index of playing thread), and player (0 for player1 and 1 for player2 of the Match).
+'''
+
+
+class GameStarted(NamedTuple):
+    slot: int
+    rows: int
+    cols: int
+    name1: str
+    name2: str
+
+
+class MoveMade(NamedTuple):
+    slot: int
+    row: int
+    col: int
+    sign: int
+
+
+class MoveTimed(NamedTuple):
+    slot: int
+    player: int
+    think_time: float  # time the engine took to make the move
+    judge_time: float  # time between receiving the move and sending the next request
+
+
+class EvalUpdated(NamedTuple):
+    slot: int
+    player: int
+    memory: float
+    depth: str
+    score: str
+    nodes: str
+    speed: str
+
+
+class ClockUpdate(NamedTuple):
+    slot: int
+    player: int
+    time_left: float
+    on_move: bool
+    sign: int
+
+
+class EngineCrashed(NamedTuple):
+    slot: int
+    name: str
+    reason: str
+
+
+class GameFinished(NamedTuple):
+    game: GameConfig
+    engines: list  # names of black_player and white_player
+
+
+'''events published by the playing threads, GameFinished is published by the Tournament once the game is stored'''
+GAME_EVENTS = (GameStarted, MoveMade, MoveTimed, EvalUpdated, ClockUpdate, EngineCrashed)
+
+
+class Subscription:
+    """
+    Bounded queue of events of the subscribed types. If the subscriber falls behind, new events are dropped
+    rather than blocking the publishers.
+    """
+
+    def __init__(self, types: tuple, maxsize: int):
+        self.types = types
+        self._queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def accepts(self, event: tuple) -> bool:
+        return len(self.types) == 0 or type(event) in self.types
+
+    def offer(self, event: Optional[tuple]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        try:  # unlike events, the end of the stream should not be lost
+            self._queue.put(None, timeout=5.0)
+        except queue.Full:
+            logging.warning('event subscriber is not responding')
+
+    def get(self, timeout: Optional[float] = None) -> Optional[tuple]:
+        """
+        :param timeout:
+        :return: next event, None if the bus was closed, raises queue.Empty after the timeout
+        """
+        return self._queue.get(timeout=timeout)
+
+
+class EventBus:
+    """
+    Publishing only puts the event into a queue, a dispatcher thread then copies it into the queues of the
+    subscribers. So the cost for the publisher (the judge) does not depend on the number of subscribers,
+    and events that nobody subscribed to are not even queued.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = Lock()
+        self._subscriptions = []
+        self._wanted = frozenset()  # classes of events that someone subscribed to, None means all
+        self._dispatcher = Thread(target=self._dispatch, name='EventBus', daemon=True)
+        self._dispatcher.start()
+
+    def publish(self, event: tuple) -> None:
+        if self.wants(type(event)):
+            self._queue.put(event)
+
+    def wants(self, event_type: type) -> bool:
+        wanted = self._wanted
+        return wanted is None or event_type in wanted
+
+    def _update_wanted(self) -> None:
+        if any(len(s.types) == 0 for s in self._subscriptions):
+            self._wanted = None
+        else:
+            self._wanted = frozenset(t for s in self._subscriptions for t in s.types)
+
+    def subscribe(self, types: tuple = (), maxsize: int = 1000) -> Subscription:
+        """
+        :param types: classes of events to receive (subclasses are not matched), all events if empty
+        :param maxsize: capacity of the queue of the subscriber
+        :return:
+        """
+        result = Subscription(types, maxsize)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [result]  # publishers and dispatcher iterate without lock
+            self._update_wanted()
+        return result
+
+    def subscribe_callback(self, callback: Callable[[tuple], None], types: tuple = (), maxsize: int = 1000) -> Subscription:
+        """
+        Calls the callback for every event in a separate thread.
+        """
+        result = self.subscribe(types, maxsize)
+
+        def consume() -> None:
+            while True:
+                event = result.get()
+                if event is None:
+                    break
+                try:
+                    callback(event)
+                except Exception as e:
+                    logging.error('event subscriber failed : ' + str(e))
+
+        Thread(target=consume, name='EventSubscriber', daemon=True).start()
+        return result
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+            self._update_wanted()
+        subscription.close()
+
+    def get_dropped_events(self) -> int:
+        return sum(s.dropped for s in self._subscriptions)
+
+    def _dispatch(self) -> None:
+        while True:
+            event = self._queue.get()
+            if event is None:
+                break
+            for subscription in self._subscriptions:
+                if subscription.accepts(event):
+                    subscription.offer(event)
+
+    def close(self) -> None:
+        """
+        Events published so far are still delivered, then all subscribers get None.
+        """
+        self._queue.put(None)
+        self._dispatcher.join()
+        for subscription in self._subscriptions:
+            subscription.close()
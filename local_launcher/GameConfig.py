@@ -0,0 +1,47 @@
+from __future__ import annotations
+import copy
+from Board import GameOutcome
+
+
+class GameConfig:
+    def __init__(self, black_player: str, white_player: str, opening: str, saved_state: str = '', index: int = None):
+        self.black_player = copy.deepcopy(black_player)
+        self.white_player = copy.deepcopy(white_player)
+        self.opening = copy.deepcopy(opening)
+        self.outcome = GameOutcome.NO_OUTCOME
+        self.saved_state = copy.deepcopy(saved_state)
+        self.index = index
+        self.pgn = ''
+        '''statistics below are not stored, they are only reported by the thread that played the game'''
+        self.judge_latency = 0.0  # in seconds per move
+        self.memory_used = 0.0  # by both engines, in MB
+        self.judge_times = []  # for each move, in seconds
+        '''below, the first element is for black_player and the second for white_player (colors may change in swap2)'''
+        self.think_times = [[], []]  # for each move, in seconds
+        self.engine_memory = [0.0, 0.0]  # in MB
+        self.in_progress = False
+
+    def save(self) -> str:
+        return self.black_player + ':' + self.white_player + ':' + self.opening + ':' + str(self.outcome) + ':' + self.saved_state
+
+    @staticmethod
+    def load(text: str) -> GameConfig:
+        tmp = text.strip('\n').split(':')
+        assert len(tmp) == 5
+        result = GameConfig(tmp[0], tmp[1], tmp[2], tmp[4])
+        result.outcome = GameOutcome.from_string(tmp[3])
+        return result
+
+    def to_dict(self) -> dict:
+        result = dict(self.__dict__)
+        result['outcome'] = int(self.outcome)
+        return result
+
+    @staticmethod
+    def from_dict(data: dict) -> GameConfig:
+        result = GameConfig(data['black_player'], data['white_player'], data['opening'], data['saved_state'], data['index'])
+        for key, value in data.items():  # unknown keys (e.g. from a newer version) are ignored
+            if hasattr(result, key):
+                setattr(result, key, value)
+        result.outcome = GameOutcome(data['outcome'])
+        return result
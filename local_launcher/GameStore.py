@@ -0,0 +1,234 @@
+import sqlite3
+import time
+from threading import Lock
+from typing import Optional
+from Board import GameOutcome
+from GameConfig import GameConfig
+from Tracing import traced
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    black_player TEXT NOT NULL,
+    white_player TEXT NOT NULL,
+    opening TEXT NOT NULL,
+    outcome INTEGER NOT NULL DEFAULT 0,
+    saved_state TEXT NOT NULL DEFAULT '',
+    in_progress INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT NOT NULL DEFAULT '',
+    claimed_at REAL NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS pending_games_by_priority ON games(priority DESC, id) WHERE outcome = 0 AND in_progress = 0;
+CREATE INDEX IF NOT EXISTS running_games ON games(claimed_at) WHERE in_progress = 1;
+CREATE TABLE IF NOT EXISTS results (
+    black_player TEXT NOT NULL,
+    white_player TEXT NOT NULL,
+    outcome INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    PRIMARY KEY (black_player, white_player, outcome)
+);
+'''
+
+_COLUMNS = 'id, black_player, white_player, opening, outcome, saved_state, in_progress'
+
+
+def _to_game_config(row: tuple) -> GameConfig:
+    result = GameConfig(row[1], row[2], row[3], row[5], row[0])
+    result.outcome = GameOutcome(row[4])
+    result.in_progress = bool(row[6])
+    return result
+
+
+class GameStore:
+    """
+    Transactional store of all games of a tournament, kept in SQLite database (in WAL mode).
+    Pending and running games are found through partial indexes, and the W/D/L counts are updated together with
+    the game that finished, so none of the operations has to scan all games.
+    Claiming a game is done in an immediate transaction, so it is safe even if several processes use the same file.
+    """
+
+    def __init__(self, path: str):
+        self._lock = Lock()
+        self._connection = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+
+    def _transaction(self, function, *args):
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = function(cursor, *args)
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+            return result
+
+    def _query(self, sql: str, args: tuple = ()) -> list:
+        with self._lock:
+            return self._connection.execute(sql, args).fetchall()
+
+    @staticmethod
+    def _add_result(cursor: sqlite3.Cursor, game: GameConfig) -> None:
+        cursor.execute('INSERT INTO results VALUES (?, ?, ?, 1) '
+                       'ON CONFLICT (black_player, white_player, outcome) DO UPDATE SET games = games + 1',
+                       (game.black_player, game.white_player, int(game.outcome)))
+
+    def is_empty(self) -> bool:
+        return len(self._query('SELECT id FROM games LIMIT 1')) == 0
+
+    def add_games(self, games: list) -> None:
+        """
+        Inserts games in a single transaction. Indices of the games are used as their ids.
+        :param games: list of GameConfig
+        :return:
+        """
+
+        def add(cursor: sqlite3.Cursor) -> None:
+            cursor.executemany('INSERT INTO games (id, black_player, white_player, opening, outcome, saved_state) VALUES (?, ?, ?, ?, ?, ?)',
+                               [(g.index, g.black_player, g.white_player, g.opening, int(g.outcome), g.saved_state) for g in games])
+            for g in games:
+                if g.outcome != GameOutcome.NO_OUTCOME:
+                    self._add_result(cursor, g)
+
+        self._transaction(add)
+
+    def number_of_games(self) -> int:
+        '''ids are consecutive numbers starting from 0'''
+        tmp = self._query('SELECT MAX(id) FROM games')[0][0]
+        return 0 if tmp is None else tmp + 1
+
+    def number_of_finished_games(self) -> int:
+        tmp = self._query('SELECT SUM(games) FROM results')[0][0]
+        return 0 if tmp is None else tmp
+
+    def number_of_running_games(self) -> int:
+        return self._query('SELECT COUNT(*) FROM games WHERE in_progress = 1')[0][0]
+
+    def get_game(self, index: int) -> Optional[GameConfig]:
+        tmp = self._query('SELECT ' + _COLUMNS + ' FROM games WHERE id = ?', (index,))
+        return _to_game_config(tmp[0]) if len(tmp) > 0 else None
+
+    @traced('io')
+    def claim_game(self, worker: str = '') -> Optional[GameConfig]:
+        """
+        Marks the pending game with the highest priority (and then the lowest id) as being in progress.
+        :param worker: identifier of whoever is going to play the game
+        :return: claimed game or None if there are no more games to play
+        """
+
+        def claim(cursor: sqlite3.Cursor) -> Optional[GameConfig]:
+            row = cursor.execute('SELECT ' + _COLUMNS + ' FROM games WHERE outcome = 0 AND in_progress = 0 '
+                                 'ORDER BY priority DESC, id LIMIT 1').fetchone()
+            if row is None:
+                return None
+            cursor.execute('UPDATE games SET in_progress = 1, claimed_by = ?, claimed_at = ? WHERE id = ?', (worker, time.time(), row[0]))
+            result = _to_game_config(row)
+            result.in_progress = True
+            return result
+
+        return self._transaction(claim)
+
+    @traced('io')
+    def update_game(self, game: GameConfig, worker: str = '') -> bool:
+        """
+        Stores the outcome and state of the game and releases it.
+        Results that come too late are ignored - if the game has already finished, or if it was not finished and
+        in the meantime the game was claimed by someone else (after the lease of the worker expired).
+        :param game:
+        :param worker: identifier of whoever played the game
+        :return: True if the game was updated
+        """
+
+        def update(cursor: sqlite3.Cursor) -> bool:
+            previous = cursor.execute('SELECT outcome, claimed_by FROM games WHERE id = ?', (game.index,)).fetchone()
+            if previous is None or previous[0] != GameOutcome.NO_OUTCOME:
+                return False
+            if game.outcome == GameOutcome.NO_OUTCOME and previous[1] != worker:
+                return False
+            cursor.execute('UPDATE games SET outcome = ?, saved_state = ?, in_progress = 0, claimed_by = \'\' WHERE id = ?',
+                           (int(game.outcome), game.saved_state, game.index))
+            if game.outcome != GameOutcome.NO_OUTCOME:
+                self._add_result(cursor, game)
+            return True
+
+        return self._transaction(update)
+
+    def renew_lease(self, index: int, worker: str) -> bool:
+        """
+        :return: False if the game is no longer claimed by the worker
+        """
+        return self._transaction(lambda cursor: cursor.execute('UPDATE games SET claimed_at = ? WHERE id = ? AND in_progress = 1 AND claimed_by = ?',
+                                                               (time.time(), index, worker)).rowcount == 1)
+
+    def release_expired_games(self, timeout: float) -> list:
+        """
+        Games claimed by remote workers that did not renew their lease for too long become pending again.
+        Games claimed without an identifier of the worker (by local threads) never expire.
+        :param timeout: in seconds
+        :return: list of ids of released games
+        """
+
+        def release(cursor: sqlite3.Cursor) -> list:
+            rows = cursor.execute('SELECT id FROM games WHERE in_progress = 1 AND claimed_at < ? AND claimed_by != \'\'',
+                                  (time.time() - timeout,)).fetchall()
+            cursor.executemany('UPDATE games SET in_progress = 0, claimed_by = \'\' WHERE id = ?', rows)
+            return [row[0] for row in rows]
+
+        return self._transaction(release)
+
+    def set_priority(self, priority: int, indices: Optional[list] = None, player: Optional[str] = None) -> int:
+        """
+        Changes the priority of unfinished games, they are claimed in the order of decreasing priority.
+        :param priority:
+        :param indices: ids of the games to change
+        :param player: if given, games of this player are changed
+        :return: number of changed games
+        """
+        if indices is None and player is None:
+            raise Exception('games to reprioritise must be given by indices or by player')
+
+        def update(cursor: sqlite3.Cursor) -> int:
+            result = 0
+            if indices is not None:
+                result += cursor.executemany('UPDATE games SET priority = ? WHERE id = ? AND outcome = 0',
+                                             [(priority, i) for i in indices]).rowcount
+            if player is not None:
+                result += cursor.execute('UPDATE games SET priority = ? WHERE outcome = 0 AND (black_player = ? OR white_player = ?)',
+                                         (priority, player, player)).rowcount
+            return result
+
+        return self._transaction(update)
+
+    def set_saved_state(self, index: int, saved_state: str) -> None:
+        self._transaction(lambda cursor: cursor.execute('UPDATE games SET saved_state = ? WHERE id = ?', (saved_state, index)))
+
+    def release_running_games(self) -> int:
+        """
+        Used on startup, games that were in progress when the launcher stopped become pending again.
+        :return: number of released games
+        """
+        return self._transaction(lambda cursor: cursor.execute('UPDATE games SET in_progress = 0, claimed_by = \'\' WHERE in_progress = 1').rowcount)
+
+    def get_finished_games(self) -> list:
+        """
+        :return: list of all finished games, ordered by id (without saved state)
+        """
+        return [_to_game_config(row[:5] + ('', 0)) for row in
+                self._query('SELECT id, black_player, white_player, opening, outcome FROM games WHERE outcome != 0 ORDER BY id')]
+
+    def get_results(self) -> dict:
+        """
+        :return: dict (black_player, white_player, outcome) -> number of games
+        """
+        result = {}
+        for black, white, outcome, games in self._query('SELECT black_player, white_player, outcome, games FROM results'):
+            result[(black, white, GameOutcome(outcome))] = games
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
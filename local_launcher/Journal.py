@@ -0,0 +1,118 @@
+import os
+import time
+import logging
+from Tracing import traced
+
+
+def get_journal_path(working_dir: str, index: int) -> str:
+    return working_dir + '/journal/' + str(index) + '.journal'
+
+
+class AppendOnlyFile:
+    """
+    File that is only ever appended to. Every write is flushed to the OS immediately (so it survives the process being
+    killed), but the expensive fsync (needed to survive power loss or reboot) is batched.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 16, fsync_interval: float = 1.0):
+        """
+        :param path:
+        :param fsync_every: fsync after that many pending writes
+        :param fsync_interval: fsync if that many seconds passed since the last fsync
+        """
+        self._path = path
+        self._fsync_every = fsync_every
+        self._fsync_interval = fsync_interval
+        self._file = open(path, 'a')
+        self._pending = 0
+        self._last_sync = time.time()
+
+    def get_path(self) -> str:
+        return self._path
+
+    def append(self, text: str) -> None:
+        self._file.write(text)
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self._fsync_every or time.time() - self._last_sync >= self._fsync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._pending > 0:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.time()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+
+class GameJournal:
+    """
+    Per-game journal of all actions and clocks. Every line has the format 'time1 time2 action action ...' -
+    clocks replace the previous ones and actions are appended to those already read. The first line is a checkpoint
+    with the whole state (in the format of Match.save_state), all following lines contain single actions.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 1.0):
+        self._path = path
+        self._fsync_interval = fsync_interval
+        self._file = None
+
+    @traced('io')
+    def checkpoint(self, state: str) -> None:
+        """
+        Atomically replaces the whole journal with given state.
+        :param state: game state as returned by Match.save_state
+        :return:
+        """
+        self.close()
+        with open(self._path + '.tmp', 'w') as file:
+            file.write(state + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self._path + '.tmp', self._path)
+        self._file = AppendOnlyFile(self._path, fsync_interval=self._fsync_interval)
+
+    @traced('io')
+    def record(self, time1: float, time2: float, action: str) -> None:
+        if self._file is None:
+            self.checkpoint(str(round(time1, 3)) + ' ' + str(round(time2, 3)))
+        self._file.append(str(round(time1, 3)) + ' ' + str(round(time2, 3)) + ' ' + action + '\n')
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self) -> None:
+        self.close()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def read(path: str) -> str:
+        """
+        Replays the journal. Incomplete last line (if the process died while writing it) is ignored.
+        :param path:
+        :return: game state in the format of Match.save_state, or empty string if the journal is empty or broken
+        """
+        with open(path, 'r') as file:
+            lines = file.read().split('\n')[:-1]  # last element is either empty or a torn line without '\n'
+
+        clocks = None
+        actions = []
+        for line in lines:
+            tmp = line.strip().split(' ')
+            if len(tmp) < 2:
+                logging.warning('skipping malformed journal entry \'' + line + '\' in ' + path)
+                continue
+            clocks = tmp[:2]
+            actions += tmp[2:]
+        if clocks is None:
+            return ''
+        return ' '.join(clocks + actions)
@@ -1,9 +1,13 @@
 from Board import Board, Move, Sign, GameOutcome
 from Player import Player
+from Journal import GameJournal
+from Adjudicator import Adjudicator
+from EventBus import GameStarted, MoveMade, MoveTimed
+from utils import get_time
+from Tracing import traced
 import copy
-from typing import Union, Optional
-import numpy as np
-import cv2
+import logging
+from typing import Union, Optional, Callable
 
 
 def parse_action(action: Union[str, Move, list], cut_offset: int = 0) -> str:
@@ -21,14 +25,32 @@ def parse_action(action: Union[str, Move, list], cut_offset: int = 0) -> str:
 
 
 class Match:
-    def __init__(self, board: Board, player1: Player, player2: Player, opening: str = ''):
+    def __init__(self, board: Board, player1: Player, player2: Player, opening: str = '', publish: Optional[Callable[[tuple], None]] = None,
+                 journal: Optional[GameJournal] = None, adjudication: Optional[dict] = None, slot: int = 0,
+                 pgn_evals: bool = False):
+        """
+        :param publish: optional non-blocking callable receiving events about the game (see EventBus.py)
+        :param journal: optional journal to which every action is appended as soon as it is made
+        :param adjudication: optional config of Adjudicator
+        :param slot: identifies the game in the events
+        :param pgn_evals: if True, scores reported by the engines are written to PGN as comments after their moves
+        """
         self._player1 = player1
         self._player2 = player2
         self._board = board
         self._move_log = []
         self._opening = copy.deepcopy(opening)
-        self._frame = None
-        self._prev_number_of_moves = -1
+        self._publish = publish
+        self._slot = slot
+        self._journal = journal
+        self._judge_times = []  # time spent between receiving each move and sending the next request
+        self._think_times = [[], []]  # time used by player1 and player2 for each move
+        self._adjudicator = Adjudicator({} if adjudication is None else adjudication)
+        self._adjudication = None  # (outcome, reason) if the game was adjudicated
+        self._pgn_evals = pgn_evals
+        self._scores = {}  # index in move log -> score reported by the engine that made this move
+        self._player1.set_publisher(publish, slot, 0)
+        self._player2.set_publisher(publish, slot, 1)
 
     def _get_player(self, sign: Sign) -> Optional[Player]:
         if self._player1.get_sign() == sign:
@@ -49,7 +71,7 @@ class Match:
             self._save_action(player1_opening)  # append opening for further PGN generation
 
         for m in player1_opening:
-            self._board.make_move(m)
+            self._make_move(m)
 
         if len(self._move_log) >= 2:  # move log contains saved state
             player2_response = self._load_action(1)
@@ -63,13 +85,13 @@ class Match:
             self._player2.set_sign(Sign.BLACK)
             return 2
         elif type(player2_response) == Move:  # player2 decides to stay with white
-            self._board.make_move(player2_response)
+            self._make_move(player2_response)
             self._player1.set_sign(Sign.BLACK)
             self._player2.set_sign(Sign.WHITE)
             return 2
         elif type(player2_response) == list and len(player2_response) == 2:  # player2 decides to balance the position and let player1 choose the color
             for m in player2_response:
-                self._board.make_move(m)
+                self._make_move(m)
             if len(self._move_log) >= 3:  # move log contains saved state
                 player1_decision = self._load_action(2)
             else:
@@ -83,7 +105,7 @@ class Match:
                 return 3
             elif type(player1_decision) == Move:  # player1 decides to stay with white
                 assert type(player1_decision) == Move
-                self._board.make_move(player1_decision)
+                self._make_move(player1_decision)
                 self._player1.set_sign(Sign.WHITE)
                 self._player2.set_sign(Sign.BLACK)
                 return 3
@@ -101,17 +123,71 @@ class Match:
                 tmp = move.split(',')
                 m = Move(int(tmp[0]), int(tmp[1]), self._board.get_sign_to_move())
                 self._save_action(m)
-                self._board.make_move(m)
+                self._make_move(m)
             return len(moves)
         else:  # if the game is resumed, the opening moves will already be in the game state
             return 0
 
+    def _make_move(self, move: Move) -> None:
+        self._board.make_move(move)
+        if self._publish is not None:
+            self._publish(MoveMade(self._slot, move.row, move.col, int(move.sign)))
+
+    @traced('state')
     def _save_action(self, action: Union[Move, list, str]) -> None:
         self._move_log.append(action)
+        if self._journal is not None:
+            self._journal.record(self._player1.get_time_left(), self._player2.get_time_left(), parse_action(action))
+
+    def _judge_move(self, move: Move) -> None:
+        start = get_time()
+        self._save_action(move)
+        self._make_move(move)
+        self._judge_times.append(get_time() - start)
+        if self._publish is not None:  # move has just been requested by _request_move
+            player = 0 if self._get_player(move.sign) is self._player1 else 1
+            self._publish(MoveTimed(self._slot, player, self._think_times[player][-1], self._judge_times[-1]))
+
+    def _request_move(self, request: Callable, *args) -> Move:
+        start = get_time()
+        move = request(*args)
+        self._think_times[0 if self._get_player(move.sign) is self._player1 else 1].append(get_time() - start)
+        self._scores[len(self._move_log)] = self._get_player(move.sign).get_last_evaluation()['score']
+        return move
+
+    def _adjudicate(self, move: Move) -> bool:
+        """
+        :param move: move that has just been made by an engine
+        :return: True if the game was adjudicated
+        """
+        score = self._get_player(move.sign).get_last_evaluation()['score']
+        self._adjudication = self._adjudicator.add_move(move.sign, score, self._board.number_of_moves())
+        return self._adjudication is not None
+
+    def get_outcome(self) -> GameOutcome:
+        if self._adjudication is not None:
+            return self._adjudication[0]
+        return self._board.get_outcome()
+
+    def get_judge_latency(self) -> float:
+        """
+        :return: average time (in seconds) the judge needed to process a move made by the engines
+        """
+        return sum(self._judge_times) / max(1, len(self._judge_times))
+
+    def get_judge_times(self) -> list:
+        return list(self._judge_times)
+
+    def get_think_times(self, player: int) -> list:
+        """
+        :param player: 0 for player1, 1 for player2
+        """
+        return list(self._think_times[player])
 
     def _load_action(self, index: int) -> Union[str, Move, list]:
         return self._move_log[index]
 
+    @traced('state')
     def save_state(self) -> str:
         assert not self._player1.is_on_move() and not self._player2.is_on_move()
         result = str(round(self._player1.get_time_left(), 3))
@@ -120,6 +196,7 @@ class Match:
             result += ' ' + parse_action(action)
         return result
 
+    @traced('state')
     def load_state(self, state: str) -> None:
         if state.startswith('in progress = '):
             state = state[14:]
@@ -139,10 +216,15 @@ class Match:
                     self._move_log.append(result[0])
                 else:
                     self._move_log.append(result)
+        if self._journal is not None:
+            self._journal.checkpoint(self.save_state())
 
+    @traced('match')
     def play_game(self) -> GameOutcome:
         self._player1.start(self._board.rows(), self._board.cols(), self._board.rules())
         self._player2.start(self._board.rows(), self._board.cols(), self._board.rules())
+        if self._publish is not None:  # names are known only after start
+            self._publish(GameStarted(self._slot, self._board.rows(), self._board.cols(), self._player1.get_name(), self._player2.get_name()))
 
         if self._opening == 'swap2':
             actions = self._swap2()
@@ -152,31 +234,33 @@ class Match:
         '''making all remaining loaded moves'''
         for i in range(actions, len(self._move_log), 1):
             action = self._load_action(i)
-            self._board.make_move(action)
+            self._make_move(action)
 
         '''Now when opening is prepared, both players can receive BOARD command.'''
         for i in range(2):
-            move = self._get_player_to_move().board(self._board.get_played_moves())
-            self._save_action(move)
-            self._board.make_move(move)
+            move = self._request_move(self._get_player_to_move().board, self._board.get_played_moves())
+            self._judge_move(move)
             if self._board.get_outcome() != GameOutcome.NO_OUTCOME:
                 return self._board.get_outcome()
 
         '''now both players got board state and can make moves'''
         while self._board.get_outcome() == GameOutcome.NO_OUTCOME:
-            move = self._get_player_to_move().turn(self._board.get_last_move())
-            self._save_action(move)
-            self._board.make_move(move)
+            move = self._request_move(self._get_player_to_move().turn, self._board.get_last_move())
+            self._judge_move(move)
+            if self._adjudicate(move):
+                logging.info(self._adjudication[1])
+                break
 
         self.cleanup()
-        return self._board.get_outcome()
+        return self.get_outcome()
 
     def cleanup(self) -> None:
         self._player1.end()
         self._player2.end()
 
+    @traced('state')
     def generate_pgn(self) -> str:
-        outcome = self._board.get_outcome()
+        outcome = self.get_outcome()
         if outcome == GameOutcome.NO_OUTCOME:
             return ''
         result = '[White \"' + self._get_player(Sign.WHITE).get_name() + '\"]\n'
@@ -190,97 +274,23 @@ class Match:
         else:
             return ''  # TODO maybe it's better to throw an exception instead of returning empty PGN?
         result += '[Result \"' + tmp + '\"]\n'
+        if self._adjudication is not None:
+            result += '[Termination \"' + self._adjudication[1] + '\"]\n'
+        if self._opening != 'swap2' and self._opening != '':  # moves of the opening were not chosen by the engines
+            result += '[OpeningPlies \"' + str(len(self._opening.split(' '))) + '\"]\n'
+
+        def action(index: int) -> str:
+            score = self._scores.get(index, '?')
+            if self._pgn_evals and score != '?':
+                return parse_action(self._move_log[index], 1) + ' {' + score + '}'
+            return parse_action(self._move_log[index], 1)
 
         for i in range(0, len(self._move_log), 2):
-            result += str(1 + i // 2) + '. ' + parse_action(self._move_log[i], 1)
+            result += str(1 + i // 2) + '. ' + action(i)
             if i + 1 < len(self._move_log):
-                result += ' ' + parse_action(self._move_log[i + 1], 1)
+                result += ' ' + action(i + 1)
             result += ' '
         return result + '\n'
 
-    def draw(self, size: int = 15, force_refresh: bool = False) -> None:
-        if self._board.number_of_moves() == self._prev_number_of_moves and not force_refresh:
-            return  # do not re-draw if no new moves were played
-        else:
-            self._prev_number_of_moves = self._board.number_of_moves()
-
-        height = (1 + 6 + self._board.rows() + 1) * size
-        width = (1 + self._board.cols() + 1) * size
-        if self._frame is None:
-            self._frame = np.zeros((height, width, 3), dtype=np.uint8)
-
-        '''fill background'''
-        cv2.rectangle(self._frame, (0, 0), (width, height), color=(192, 192, 192), thickness=-1)
-
-        '''highlight side to move'''
-        if self._player1.is_on_move():
-            cv2.rectangle(self._frame, (0, int(0.5 * size)), (width, int((0.5 + 3) * size)), color=(0, 255, 255), thickness=2)
-        if self._player2.is_on_move():
-            cv2.rectangle(self._frame, (0, int((0.5 + 3) * size)), (width, int((0.5 + 3 + 3) * size)), color=(0, 255, 255), thickness=2)
-
-        def summarize_player(player: Player, x: int, y: int) -> None:
-            text1 = player.get_name() + ' : ' + str(round(player.get_time_left(), 1)) + 's'
-            eval = player.get_evaluation()
-            text2 = str(int(eval['memory'])) + 'MB'
-            text_depth = 'depth = ' + eval['depth']
-            text_score = 'score = ' + eval['score']
-            text_nodes = 'nodes = ' + eval['nodes']
-            text_speed = 'speed = ' + eval['speed']
-            if player.get_sign() == Sign.BLACK:
-                color = (0, 0, 0)
-                thickness = -1
-            elif player.get_sign() == Sign.WHITE:
-                color = (255, 255, 255)
-                thickness = -1
-            else:
-                color = (0, 0, 0)
-                thickness = 1
-            cv2.circle(self._frame, (int(0.5 * size + y), x - int(1.8 * size)), size * 4 // 10, color, thickness=thickness)
-            cv2.putText(self._frame, text1, (y + size, x - int(1.5 * size)), cv2.QT_FONT_NORMAL, 0.8, color=(0, 0, 0), thickness=1)
-            cv2.putText(self._frame, text2, (y, x), cv2.QT_FONT_NORMAL, 0.8, color=(0, 0, 0), thickness=1)
-
-            split_1 = int(0.3 * self._board.cols() * size)
-            split_2 = int(0.65 * self._board.cols() * size)
-            cv2.putText(self._frame, text_depth, (y + split_1, x - size // 2), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
-            cv2.putText(self._frame, text_score, (y + split_2, x - size // 2), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
-            cv2.putText(self._frame, text_nodes, (y + split_1, x + size // 4), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
-            cv2.putText(self._frame, text_speed, (y + split_2, x + size // 4), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
-
-        '''print info about players'''
-        summarize_player(self._player1, 3 * size, int(0.5 * size))
-        summarize_player(self._player2, 6 * size, int(0.5 * size))
-
-        '''draw board lines'''
-        for i in range(self._board.rows() - 1):
-            for j in range(self._board.cols() - 1):
-                x0 = int((1 + 6 + i + 0.5) * size)
-                y0 = int((1 + j + 0.5) * size)
-                cv2.rectangle(self._frame, (y0, x0), (y0 + size, x0 + size), color=(0, 0, 0), thickness=1)
-
-        '''highlight last move'''
-        last_move = self._board.get_last_move()
-        if last_move is not None:
-            x0 = (1 + 6 + last_move.row) * size
-            y0 = (1 + last_move.col) * size
-            cv2.rectangle(self._frame, (y0, x0), (y0 + size, x0 + size), color=(0, 255, 255), thickness=1)
-
-        '''draw all moves'''
-        moves = self._board.get_played_moves()
-        for move in moves:
-            x0 = int((1 + 6 + move.row + 0.5) * size)
-            y0 = int((1 + move.col + 0.5) * size)
-            if move.sign == Sign.BLACK:
-                cv2.circle(self._frame, (y0, x0), size * 4 // 10, (0, 0, 0), thickness=-1)
-            else:
-                cv2.circle(self._frame, (y0, x0), size * 4 // 10, (255, 255, 255), thickness=-1)
-
-        tmp_text = str(self._board.number_of_moves()) + ' move'
-        if self._board.number_of_moves() > 1:
-            tmp_text += 's'
-        cv2.putText(self._frame, tmp_text, (size, height - size // 2), cv2.QT_FONT_NORMAL, 0.8, color=(0, 0, 0), thickness=1)
-
-    def get_frame(self) -> np.ndarray:
-        return self._frame
-
     def text_summary(self) -> str:
         pass
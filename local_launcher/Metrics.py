@@ -0,0 +1,205 @@
+import time
+import logging
+from threading import Thread, Lock
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable
+from Board import GameOutcome
+from GameConfig import GameConfig
+from EventBus import GameStarted, MoveMade, MoveTimed, EvalUpdated, EngineCrashed, GameFinished
+
+'''all metrics are exported in the Prometheus text format, with names prefixed by the following'''
+_PREFIX = 'gomoku_'
+
+_FAILURES = ['timeout', 'crash', 'foul', 'illegal', 'memory']
+
+
+def _labels(labels: dict) -> str:
+    if len(labels) == 0:
+        return ''
+    tmp = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        tmp.append(key + '="' + value + '"')
+    return '{' + ','.join(tmp) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets: list):
+        self._buckets = sorted(buckets)
+        self._counts = [0] * len(self._buckets)
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self._buckets):
+            if value <= bound:
+                self._counts[i] += 1
+        self._sum += value
+        self._count += 1
+
+    def render(self, name: str, labels: dict) -> list:
+        result = []
+        for bound, count in zip(self._buckets, self._counts):
+            result.append(name + '_bucket' + _labels(dict(labels, le=repr(float(bound)))) + ' ' + str(count))
+        result.append(name + '_bucket' + _labels(dict(labels, le='+Inf')) + ' ' + str(self._count))
+        result.append(name + '_sum' + _labels(labels) + ' ' + repr(self._sum))
+        result.append(name + '_count' + _labels(labels) + ' ' + str(self._count))
+        return result
+
+
+class TournamentMetrics:
+    """
+    Collects statistics of the games. Per-move statistics are updated from the events of the games as they are
+    played, so a slow or stuck game shows up before it ends. Remote workers do not send events, their games are
+    counted only when they finish.
+    """
+
+    EVENT_TYPES = (GameStarted, MoveMade, MoveTimed, EvalUpdated, EngineCrashed, GameFinished)
+
+    def __init__(self, window: float = 60.0):
+        """
+        :param window: length (in seconds) of the window over which the rates are calculated
+        """
+        self._lock = Lock()
+        self._window = window
+        self._created = time.time()
+        self._games_started = 0
+        self._games_finished = 0
+        self._moves = 0
+        self._recent_starts = deque()
+        self._recent_finishes = deque()
+        self._recent_moves = deque()  # [second, number of moves made in it]
+        self._names = {}  # slot -> names of player1 and player2 of the game played in it
+        self._failures = {}  # (engine, failure) -> count
+        self._judge_latency = Histogram([0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0])
+        self._think_time = {}  # engine -> Histogram
+        self._memory = {}  # engine -> memory reported last time, in MB
+
+    def _trim(self, now: float) -> None:
+        while len(self._recent_starts) > 0 and self._recent_starts[0] < now - self._window:
+            self._recent_starts.popleft()
+        while len(self._recent_finishes) > 0 and self._recent_finishes[0] < now - self._window:
+            self._recent_finishes.popleft()
+        while len(self._recent_moves) > 0 and self._recent_moves[0][0] < now - self._window:
+            self._recent_moves.popleft()
+
+    def add_started_game(self) -> None:
+        with self._lock:
+            self._games_started += 1
+            self._recent_starts.append(time.time())
+
+    def add_finished_game(self, game: GameConfig) -> None:
+        with self._lock:
+            if game.outcome != GameOutcome.NO_OUTCOME:
+                self._games_finished += 1
+                self._recent_finishes.append(time.time())
+
+    def _get_name(self, slot: int, player: int) -> str:
+        return self._names.get(slot, ('?', '?'))[player]
+
+    def add_event(self, event: tuple) -> None:
+        """
+        :param event: one of EVENT_TYPES
+        :return:
+        """
+        if type(event) == GameFinished:
+            self.add_finished_game(event.game)
+            return
+        with self._lock:
+            if type(event) == GameStarted:
+                self._names[event.slot] = (event.name1, event.name2)
+            elif type(event) == MoveMade:
+                self._moves += 1
+                second = int(time.time())
+                if len(self._recent_moves) > 0 and self._recent_moves[-1][0] == second:
+                    self._recent_moves[-1][1] += 1
+                else:
+                    self._recent_moves.append([second, 1])
+            elif type(event) == MoveTimed:
+                self._judge_latency.observe(event.judge_time)
+                engine = self._get_name(event.slot, event.player)
+                if engine not in self._think_time:
+                    self._think_time[engine] = Histogram([0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0])
+                self._think_time[engine].observe(event.think_time)
+            elif type(event) == EvalUpdated:
+                self._memory[self._get_name(event.slot, event.player)] = event.memory
+            elif type(event) == EngineCrashed:  # named by the engine that failed, whatever its colour was
+                failure = event.reason.split(' ')[0]
+                if failure in _FAILURES:
+                    self._failures[(event.name, failure)] = self._failures.get((event.name, failure), 0) + 1
+
+    def render(self, gauges: dict) -> str:
+        """
+        :param gauges: additional values to export, like queue depths (name -> value)
+        :return: all metrics in the Prometheus text format
+        """
+        with self._lock:
+            now = time.time()
+            self._trim(now)
+            window = min(self._window, max(1.0, now - self._created))  # shorter at the beginning of the tournament
+            result = ['# TYPE ' + _PREFIX + 'games_started_total counter',
+                      _PREFIX + 'games_started_total ' + str(self._games_started),
+                      '# TYPE ' + _PREFIX + 'games_finished_total counter',
+                      _PREFIX + 'games_finished_total ' + str(self._games_finished),
+                      '# TYPE ' + _PREFIX + 'moves_total counter',
+                      _PREFIX + 'moves_total ' + str(self._moves),
+                      '# TYPE ' + _PREFIX + 'games_started_per_minute gauge',
+                      _PREFIX + 'games_started_per_minute ' + repr(60.0 * len(self._recent_starts) / window),
+                      '# TYPE ' + _PREFIX + 'games_finished_per_minute gauge',
+                      _PREFIX + 'games_finished_per_minute ' + repr(60.0 * len(self._recent_finishes) / window),
+                      '# TYPE ' + _PREFIX + 'moves_per_second gauge',
+                      _PREFIX + 'moves_per_second ' + repr(sum(m for _, m in self._recent_moves) / window)]
+
+            result.append('# TYPE ' + _PREFIX + 'judge_latency_seconds histogram')
+            result += self._judge_latency.render(_PREFIX + 'judge_latency_seconds', {})
+            result.append('# TYPE ' + _PREFIX + 'think_time_seconds histogram')
+            for engine, histogram in sorted(self._think_time.items()):
+                result += histogram.render(_PREFIX + 'think_time_seconds', {'engine': engine})
+            result.append('# TYPE ' + _PREFIX + 'engine_memory_megabytes gauge')
+            for engine, memory in sorted(self._memory.items()):
+                result.append(_PREFIX + 'engine_memory_megabytes' + _labels({'engine': engine}) + ' ' + repr(float(memory)))
+            result.append('# TYPE ' + _PREFIX + 'engine_failures_total counter')
+            for (engine, failure), count in sorted(self._failures.items()):
+                result.append(_PREFIX + 'engine_failures_total' + _labels({'engine': engine, 'reason': failure}) + ' ' + str(count))
+
+        for name, value in sorted(gauges.items()):
+            result.append('# TYPE ' + _PREFIX + name + ' gauge')
+            result.append(_PREFIX + name + ' ' + repr(float(value)))
+        return '\n'.join(result) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.get_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug('metrics request ' + (format % args))
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """
+    Serves metrics at http://host:port/metrics
+    """
+    daemon_threads = True
+
+    def __init__(self, get_text: Callable[[], str], host: str, port: int):
+        super().__init__((host, port), _MetricsHandler)
+        self.get_text = get_text
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        logging.info('serving metrics on ' + str(self.server_address))
+
+    def close(self) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,169 @@
+import os
+import struct
+import hashlib
+import logging
+from Board import Board, Move, GameOutcome
+from exceptions import MadeIllegalMove
+
+'''
+Binary index format (all numbers little endian):
+    magic b'GOPN', version (uint16), number of openings (uint32)
+    for each opening: number of moves (uint16) followed by row and col of every move (uint8 each)
+'''
+_MAGIC = b'GOPN'
+_VERSION = 1
+
+
+def parse_opening(text: str) -> list:
+    """
+    :param text: opening in the format 'row,col row,col ...', moves are played alternately starting with black
+    :return: list of (row, col) tuples
+    """
+    result = []
+    for move in text.split():
+        tmp = move.split(',')
+        if len(tmp) != 2:
+            raise ValueError('incorrect move \'' + move + '\'')
+        result.append((int(tmp[0]), int(tmp[1])))
+    if len(result) == 0:
+        raise ValueError('empty opening')
+    return result
+
+
+def opening_to_string(moves: list) -> str:
+    return ' '.join(str(row) + ',' + str(col) for row, col in moves)
+
+
+def validate_opening(moves: list, game_config: dict) -> None:
+    """
+    Replays the opening on an empty board.
+    Raises MadeIllegalMove if a move is outside the board or on an occupied spot, and ValueError if the game is already
+    decided after the opening (including a forbidden move).
+    """
+    board = Board(game_config)
+    for row, col in moves:
+        board.make_move(Move(row, col, board.get_sign_to_move()))
+        '''neither a five nor a forbidden move (in renju) can be made with less than five black stones'''
+        if board.number_of_moves() >= 9 and board.get_outcome() != GameOutcome.NO_OUTCOME:
+            raise ValueError('game is already decided after move ' + str(row) + ',' + str(col))
+
+
+def get_symmetries(rows: int, cols: int) -> list:
+    """
+    :return: list of functions mapping (row, col) to the symmetric spot, 8 for a square board and 4 otherwise
+    """
+    result = [lambda r, c: (r, c),
+              lambda r, c: (rows - 1 - r, c),
+              lambda r, c: (r, cols - 1 - c),
+              lambda r, c: (rows - 1 - r, cols - 1 - c)]
+    if rows == cols:  # transposition is a symmetry only of square boards
+        result += [lambda r, c: (c, r),
+                   lambda r, c: (cols - 1 - c, r),
+                   lambda r, c: (c, rows - 1 - r),
+                   lambda r, c: (cols - 1 - c, rows - 1 - r)]
+    return result
+
+
+def canonical_form(moves: list, symmetries: list) -> tuple:
+    """
+    Position does not depend on the order of moves, only on which spots are occupied by black and which by white stones.
+    Canonical form is the smallest of such descriptions of all symmetric positions.
+    """
+    result = None
+    for symmetry in symmetries:
+        tmp = [symmetry(row, col) for row, col in moves]
+        key = (tuple(sorted(tmp[0::2])), tuple(sorted(tmp[1::2])))
+        if result is None or key < result:
+            result = key
+    return result
+
+
+def _encode(openings: list) -> bytes:
+    result = bytearray(_MAGIC + struct.pack('<HI', _VERSION, len(openings)))
+    for moves in openings:
+        result += struct.pack('<H', len(moves))
+        for row, col in moves:
+            result += struct.pack('<BB', row, col)
+    return bytes(result)
+
+
+def _decode(data: bytes) -> list:
+    if data[:4] != _MAGIC:
+        raise ValueError('not an openings index')
+    version, count = struct.unpack_from('<HI', data, 4)
+    if version != _VERSION:
+        raise ValueError('unsupported version ' + str(version) + ' of openings index')
+    result = []
+    offset = 10
+    for i in range(count):
+        length = struct.unpack_from('<H', data, offset)[0]
+        offset += 2
+        tmp = data[offset:offset + 2 * length]
+        if len(tmp) != 2 * length:
+            raise ValueError('truncated openings index')
+        result.append([(tmp[2 * j], tmp[2 * j + 1]) for j in range(length)])
+        offset += 2 * length
+    return result
+
+
+class OpeningSuite:
+    """
+    Openings read from a text file, validated and with duplicates removed (also those that are only rotated or
+    mirrored copies of another opening). The result is cached in a binary index next to the file, keyed by the hash
+    of the file contents and of the board config, so that the suite is processed only once.
+    """
+
+    def __init__(self, path: str, game_config: dict):
+        with open(path, 'rb') as file:
+            data = file.read()
+        key = hashlib.sha256(data)
+        key.update(str((game_config['rows'], game_config['cols'], game_config['rules'])).encode())
+        self._index_path = path + '.' + key.hexdigest()[:16] + '.idx'
+
+        self._openings = None
+        if os.path.exists(self._index_path):
+            try:
+                with open(self._index_path, 'rb') as file:
+                    self._openings = _decode(file.read())
+            except (ValueError, struct.error) as e:
+                logging.warning('rebuilding openings index ' + self._index_path + ' : ' + str(e))
+        if self._openings is None:
+            self._openings = self._build(data.decode('utf-8').split('\n'), game_config, path)
+            with open(self._index_path + '.tmp', 'wb') as file:
+                file.write(_encode(self._openings))
+            os.replace(self._index_path + '.tmp', self._index_path)
+
+    @staticmethod
+    def _build(lines: list, game_config: dict, path: str) -> list:
+        symmetries = get_symmetries(game_config['rows'], game_config['cols'])
+        result = []
+        known = set()
+        invalid = 0
+        for i, line in enumerate(lines):
+            if line.strip() == '':
+                continue
+            try:
+                moves = parse_opening(line)
+                validate_opening(moves, game_config)
+            except (ValueError, MadeIllegalMove) as e:
+                logging.warning('skipping invalid opening in line ' + str(i + 1) + ' of ' + path + ' : ' + str(e))
+                invalid += 1
+                continue
+            key = canonical_form(moves, symmetries)
+            if key not in known:
+                known.add(key)
+                result.append(moves)
+        if len(result) == 0:
+            raise Exception('there are no valid openings in ' + path)
+        print('loaded ' + str(len(result)) + ' openings from ' + path + ' (' + str(invalid) + ' invalid, ' +
+              str(sum(1 for line in lines if line.strip() != '') - invalid - len(result)) + ' duplicates)')
+        return result
+
+    def __len__(self) -> int:
+        return len(self._openings)
+
+    def get_openings(self) -> list:
+        """
+        :return: list of openings in the format used by Match
+        """
+        return [opening_to_string(moves) for moves in self._openings]
@@ -0,0 +1,95 @@
+import os
+import psutil
+from GameConfig import GameConfig
+from utils import get_time, get_value
+
+
+class ParallelismController:
+    """
+    Decides how many games should be played in parallel, based on host load, free memory, rate of timeouts and latency
+    of the judge. The number of games changes by one at a time, and only if the previous change had time to take effect.
+    """
+
+    def __init__(self, config: dict):
+        """
+        :param config: 'adaptive_parallelism' section of tournament config
+        """
+        self._enabled = get_value(config, 'enabled', False)
+        self._min_games = get_value(config, 'min_games_in_parallel', 1)
+        self._max_games = get_value(config, 'max_games_in_parallel', os.cpu_count())
+        self._max_cpu_load = get_value(config, 'max_cpu_load', 0.9)  # fraction of all cores
+        self._min_free_memory = get_value(config, 'min_free_memory', 1024)  # in MB
+        self._max_timeout_rate = get_value(config, 'max_timeout_rate', 0.05)
+        self._max_judge_latency = get_value(config, 'max_judge_latency', 0.05)  # in seconds per move
+        self._interval = get_value(config, 'interval', 30.0)  # in seconds
+        self._memory_per_game = 0.0  # largest memory usage (in MB) of both engines observed in a single game
+
+        self._last_decision = get_time()
+        self._games = 0
+        self._timeouts = 0
+        self._judge_latency = 0.0
+        psutil.cpu_percent()  # first call only starts the measurement
+
+    def clamp(self, games_in_parallel: int) -> int:
+        if not self._enabled:  # games_in_parallel from the config is used as it is
+            return games_in_parallel
+        return max(self._min_games, min(self._max_games, games_in_parallel))
+
+    def set_max_games_in_parallel(self, games_in_parallel: int) -> None:
+        """
+        Used when the number of games is changed manually, the controller may then only decrease it.
+        """
+        self._max_games = games_in_parallel
+        self._min_games = min(self._min_games, games_in_parallel)
+
+    def add_game(self, game: GameConfig) -> None:
+        """
+        Collects statistics of a finished (or interrupted) game.
+        :param game:
+        :return:
+        """
+        self._games += 1
+        if game.saved_state.startswith('timeout'):
+            self._timeouts += 1
+        self._judge_latency = max(self._judge_latency, game.judge_latency)
+        self._memory_per_game = max(self._memory_per_game, game.memory_used)
+
+    def decide(self, active_games: int, pending_games: int) -> (int, str):
+        """
+        :param active_games: number of games currently being played
+        :param pending_games: number of games that were not yet started
+        :return: change of the number of games in parallel (-1, 0 or 1) and the reason for it
+        """
+
+        if not self._enabled or get_time() - self._last_decision < self._interval:
+            return 0, ''
+
+        cpu_load = psutil.cpu_percent() / 100.0
+        free_memory = psutil.virtual_memory().available / (1024 * 1024)
+        '''timeouts and latency are only meaningful if every game slot finished something since the last change'''
+        has_samples = self._games >= active_games
+        timeout_rate = self._timeouts / max(1, self._games)
+
+        delta, reason = 0, ''
+        if active_games > self._min_games:
+            if cpu_load > self._max_cpu_load:
+                delta, reason = -1, 'cpu load ' + str(round(cpu_load, 2)) + ' > ' + str(self._max_cpu_load)
+            elif free_memory < self._min_free_memory:
+                delta, reason = -1, 'free memory ' + str(int(free_memory)) + 'MB < ' + str(self._min_free_memory) + 'MB'
+            elif has_samples and timeout_rate > self._max_timeout_rate:
+                delta, reason = -1, 'timeout rate ' + str(round(timeout_rate, 3)) + ' > ' + str(self._max_timeout_rate)
+            elif has_samples and self._judge_latency > self._max_judge_latency:
+                delta, reason = -1, 'judge latency ' + str(round(self._judge_latency, 4)) + 's > ' + str(self._max_judge_latency) + 's'
+        if delta == 0 and active_games < self._max_games and pending_games > 0 and has_samples:
+            '''engines take turns, so on average another game keeps about one more core busy'''
+            expected_load = cpu_load + 1.0 / psutil.cpu_count()
+            if expected_load <= self._max_cpu_load and free_memory - self._memory_per_game >= self._min_free_memory and \
+                    self._timeouts == 0 and self._judge_latency <= 0.5 * self._max_judge_latency:
+                delta, reason = 1, 'cpu load ' + str(round(cpu_load, 2)) + ', free memory ' + str(int(free_memory)) + 'MB, no timeouts'
+
+        if delta != 0:
+            self._last_decision = get_time()
+            self._games = 0
+            self._timeouts = 0
+            self._judge_latency = 0.0
+        return delta, reason
@@ -0,0 +1,64 @@
+import os
+import logging
+from threading import Lock
+from Journal import AppendOnlyFile
+from Tracing import traced
+
+
+class PgnWriter:
+    """
+    Appends games to a PGN file as they finish, without keeping the whole file in memory.
+    If the launcher died while writing a game, the incomplete record is cut off when the file is opened again.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 1.0):
+        self._path = path
+        self._lock = Lock()
+        if os.path.exists(path):
+            self._repair_tail()
+        self._file = AppendOnlyFile(path, fsync_interval=fsync_interval)
+
+    @staticmethod
+    def _is_complete(record: str) -> bool:
+        """
+        Complete record consists of header lines followed by a line with moves, and ends with a new line.
+        :param record:
+        :return:
+        """
+        if not record.endswith('\n'):
+            return False
+        lines = record[:-1].split('\n')
+        return len(lines) >= 2 and lines[0].startswith('[') and not lines[-1].startswith('[')
+
+    def _repair_tail(self) -> None:
+        with open(self._path, 'rb+') as file:
+            file_size = file.seek(0, os.SEEK_END)
+            if file_size == 0:
+                return
+
+            '''read progressively larger chunks from the end, until the beginning of the last record is found'''
+            chunk_size = 65536
+            while True:
+                start = max(0, file_size - chunk_size)
+                file.seek(start)
+                tail = file.read()
+                idx = tail.rfind(b'\n[White ')
+                if idx >= 0 or start == 0:
+                    break
+                chunk_size *= 2
+
+            if self._is_complete(tail[idx + 1:].decode('utf-8', errors='replace')):
+                return
+            logging.warning('removing incomplete game at the end of ' + self._path)
+            file.truncate(start + idx + 1)
+
+    @traced('io')
+    def write(self, pgn: str) -> None:
+        if pgn == '':
+            return
+        with self._lock:
+            self._file.append(pgn)
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
@@ -2,7 +2,7 @@ import subprocess, shlex
 import psutil
 import copy
 import sys
-from typing import Union, Optional
+from typing import Union, Optional, Callable
 from queue import Queue, Empty
 from threading import Thread
 import logging
@@ -11,6 +11,8 @@ import time
 from Board import Move, Sign, GameRules
 from utils import get_time, get_value
 from exceptions import Timeouted, Crashed, TooMuchMemory, MadeIllegalMove, Interrupted
+from Tracing import traced
+from EventBus import EvalUpdated, ClockUpdate
 
 
 class Player:
@@ -51,13 +53,16 @@ class Player:
         self._suspend()
 
         self._is_engine_running = True
+        self._publish = None
+        self._slot = 0
+        self._player_index = 0
+        self._memory = 0.0  # last measured memory usage, probing it is expensive so it is done only when engine responds
         self._received_messages = []
         self._sent_messages = []
         self._evaluation = {'memory': '?', 'depth': '?', 'score': '?', 'nodes': '?', 'speed': '?', 'time': '?', 'pv': '?'}
         self._is_now_on_move = False
         self._start_time = time.time()
-        self._name = get_value(config, 'name', self._parse_name())  # engine name can be obtained only after the process has started, obviously...
-        time.sleep(1.0)  # sleep so that all processes are not launched exactly at the same time (might mess up with logfiles, etc.)
+        self._name = get_value(config, 'name', '')  # if not given, engine is asked for it by ABOUT in start()
 
     def _parse_name(self) -> str:
         self._resume()
@@ -79,13 +84,13 @@ class Player:
 
     def _parse_evaluation(self, text: str) -> dict:
         assert text.startswith('MESSAGE ')
-        result = {'memory': self.get_memory(), 'depth': '?', 'score': '?', 'nodes': '?', 'speed': '?', 'time': '?', 'pv': '?'}
-        text.replace(', ', ' ')
-        text.replace(' | ', ' ')
-        text.replace('=', ' ')
-        text.replace(':', ' ')
-        text.replace(',', ' ')
-        words = text[8:].split(' ')
+        result = {'memory': self._memory, 'depth': '?', 'score': '?', 'nodes': '?', 'speed': '?', 'time': '?', 'pv': '?'}
+        text = text.replace(', ', ' ')
+        text = text.replace(' | ', ' ')
+        text = text.replace('=', ' ')
+        text = text.replace(':', ' ')
+        text = text.replace(',', ' ')
+        words = text[8:].split()
 
         def find_info(name: str, keywords: list) -> None:
             for keyword in keywords:
@@ -153,10 +158,10 @@ class Player:
             return get_time() - start
 
         while self._is_engine_running and time_used() < timeout:
-            try:
-                buf = self._queue.get_nowait()
+            try:  # wakes up as soon as a line arrives, the short timeout is only to notice interruption
+                buf = self._queue.get(timeout=max(0.0, min(0.1, timeout - time_used())))
             except Empty:
-                time.sleep(0.1)
+                pass
             else:
                 result += buf.decode('utf-8')
 
@@ -166,6 +171,7 @@ class Player:
                 logging.info('received \'' + result + '\' from engine \'' + self.get_name() + '\'')
 
                 used_memory = self.get_memory()
+                self._memory = used_memory
                 if used_memory > self._max_memory:
                     raise TooMuchMemory(self.get_sign(), used_memory, self._max_memory)
                 return result
@@ -177,6 +183,7 @@ class Player:
         else:  # if the process is neither alive nor 'on move' it means interruption
             raise Interrupted(self.get_sign())
 
+    @traced('process')
     def _suspend(self) -> None:
         if not self._allow_pondering:
             try:
@@ -184,6 +191,7 @@ class Player:
             except Exception as e:
                 logging.error(str(e))
 
+    @traced('process')
     def _resume(self) -> None:
         if not self._allow_pondering:
             try:
@@ -197,16 +205,37 @@ class Player:
             if self._is_message(answer):
                 if answer.startswith('MESSAGE'):
                     self._evaluation = self._parse_evaluation(answer)
+                    if self._publish is not None:
+                        e = self._evaluation
+                        self._publish(EvalUpdated(self._slot, self._player_index, e['memory'], e['depth'], e['score'], e['nodes'], e['speed']))
             else:
                 return answer
 
     def _timer_start(self) -> None:
         self._is_now_on_move = True
         self._start_time = time.time()
+        self._evaluation['score'] = '?'  # so that a score from the previous move is never taken as the current one
+        self._emit_clock()
 
     def _timer_stop(self) -> None:
         self._is_now_on_move = False
         self._time_left -= (get_time() - self._start_time)
+        self._emit_clock()
+
+    def _emit_clock(self) -> None:
+        if self._publish is not None:
+            self._publish(ClockUpdate(self._slot, self._player_index, self.get_time_left(), self._is_now_on_move, int(self._sign)))
+
+    def set_publisher(self, publish: Optional[Callable[[tuple], None]], slot: int, player_index: int) -> None:
+        """
+        :param publish: called with ClockUpdate and EvalUpdated events, must not block
+        :param slot: slot of the game, put into the events
+        :param player_index: 0 or 1, put into the events
+        :return:
+        """
+        self._publish = publish
+        self._slot = slot
+        self._player_index = player_index
 
     def get_name(self) -> str:
         if self._name is None or self._name == '':
@@ -219,7 +248,9 @@ class Player:
 
     def set_sign(self, sign: Sign) -> None:
         self._sign = sign
+        self._emit_clock()
 
+    @traced('process')
     def get_memory(self) -> float:
         """
 
@@ -248,6 +279,15 @@ class Player:
         self._evaluation['memory'] = self.get_memory()
         return self._evaluation
 
+    def get_last_evaluation(self) -> dict:
+        """
+        Unlike get_evaluation() this does not probe the process, memory usage is the one measured at last response.
+        :return: copy of the evaluation
+        """
+        result = copy.copy(self._evaluation)
+        result['memory'] = self._memory
+        return result
+
     def set_time_left(self, time_left: float) -> None:
         """
         Used to resume a game with given amount of used time.
@@ -255,10 +295,12 @@ class Player:
         :return:
         """
         self._time_left = time_left
+        self._emit_clock()
 
     def is_on_move(self) -> bool:
         return self._is_now_on_move
 
+    @traced('engine')
     def start(self, rows: int, columns: int, rules: GameRules) -> None:
         """
         Method used to initialize the engine with all necessary info about timeouts, rule, etc.
@@ -267,6 +309,8 @@ class Player:
         :param rules:
         :return:
         """
+        if self._name == '':
+            self._name = self._parse_name()
         self._timer_start()
         self._resume()
         if rows == columns:
@@ -295,6 +339,7 @@ class Player:
         """
         self._send('INFO ' + msg)
 
+    @traced('engine')
     def board(self, list_of_moves: list) -> Move:
         """
         Method used to start the game with given opening. It calls either BEGIN if the opening is empty, or BOARD otherwise.
@@ -325,6 +370,7 @@ class Player:
         self._timer_stop()
         return self._parse_move_from_string(answer, self._sign)
 
+    @traced('engine')
     def swap2board(self, list_of_moves) -> Union[str, list, Move]:
         """
         This method implements swap2 opening phase.
@@ -392,6 +438,7 @@ class Player:
         else:
             raise MadeIllegalMove(self.get_sign(), 'incorrect number of moves')
 
+    @traced('engine')
     def turn(self, last_move: Move) -> Move:
         """
         :param last_move:
@@ -407,14 +454,18 @@ class Player:
         self._timer_stop()
         return self._parse_move_from_string(answer, self._sign)
 
+    @traced('engine')
     def end(self) -> None:
         self._resume()
         self._is_now_on_move = False
         self._send('END')
-        time.sleep(self._tolerance)
         try:
-            logging.info('player \'' + self.get_name() + '\' did not stop on time, killing process')
+            self._process.wait(timeout=self._tolerance)
+        except subprocess.TimeoutExpired:
+            pass
+        try:
             if self.is_alive():
+                logging.info('player \'' + self.get_name() + '\' did not stop on time, killing process')
                 for pp in self._pp.children(recursive=True):
                     pp.kill()
                 self._pp.kill()
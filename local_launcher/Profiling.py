@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import hashlib
+import itertools
+import threading
+from typing import Callable
+
+'''
+Profiling of playing threads. Each thread is profiled with cProfile (exact call counts and times), and additionally
+its stack is sampled periodically, which gives full call stacks for flame graphs. Each thread writes its results
+into the 'profile' directory (also in worker processes), and merge_profiles() combines them at the end.
+'''
+
+
+class _StackSampler(threading.Thread):
+    """
+    Single sampler per process, collecting stacks of all registered threads.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(name='StackSampler', daemon=True)
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._stacks = {}  # thread ident -> dict collapsed stack -> number of samples
+
+    def register(self, ident: int) -> None:
+        with self._lock:
+            self._stacks[ident] = {}
+
+    def take(self, ident: int) -> dict:
+        with self._lock:
+            return self._stacks.pop(ident, {})
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        tmp = []
+        while frame is not None:
+            code = frame.f_code
+            tmp.append(code.co_name + ' (' + os.path.basename(code.co_filename) + ':' + str(code.co_firstlineno) + ')')
+            frame = frame.f_back
+        return ';'.join(reversed(tmp))
+
+    def run(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, counts in self._stacks.items():
+                    if ident in frames:
+                        stack = self._collapse(frames[ident])
+                        counts[stack] = counts.get(stack, 0) + 1
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+_counter = itertools.count()  # threads may be created in the same slot many times, so files are numbered
+
+
+def _get_sampler(interval: float) -> _StackSampler:
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = _StackSampler(interval)
+            _sampler.start()
+        return _sampler
+
+
+def profile_thread(function: Callable, directory: str, interval: float = 0.01) -> None:
+    """
+    Runs the function in the calling thread, with profiling enabled.
+    :param function:
+    :param directory: where to write the results
+    :param interval: interval (in seconds) of stack sampling
+    :return:
+    """
+    name = str(os.getpid()) + '-' + str(next(_counter))
+    sampler = _get_sampler(interval)
+    sampler.register(threading.get_ident())
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        function()
+    finally:
+        profiler.disable()
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(directory, name + '.prof'))
+        with open(os.path.join(directory, name + '.collapsed'), 'w') as file:
+            for stack, count in sampler.take(threading.get_ident()).items():
+                file.write(stack + ' ' + str(count) + '\n')
+
+
+def merge_profiles(directory: str, config: dict) -> str:
+    """
+    Merges results of all profiled threads. Output files are tagged with the time and with the hash of the config,
+    and the config itself is saved next to them, so that runs can be compared later.
+    :param directory: directory with results of the threads, they are removed after merging
+    :param config: tournament config
+    :return: common prefix of the output files
+    """
+    config_text = json.dumps(config, sort_keys=True)
+    tag = time.strftime('%Y%m%d-%H%M%S') + '-' + hashlib.sha256(config_text.encode('utf-8')).hexdigest()[:8]
+    prefix = os.path.join(directory, 'profile-' + tag)
+    files = sorted(os.listdir(directory)) if os.path.exists(directory) else []
+    files = [f for f in files if not f.startswith('profile-')]  # results of previous runs
+
+    stats = None
+    collapsed = {}
+    for filename in files:
+        path = os.path.join(directory, filename)
+        if filename.endswith('.prof'):
+            if stats is None:
+                stats = pstats.Stats(path)
+            else:
+                stats.add(path)
+        elif filename.endswith('.collapsed'):
+            with open(path, 'r') as file:
+                for line in file:
+                    stack, count = line.rstrip('\n').rsplit(' ', 1)
+                    collapsed[stack] = collapsed.get(stack, 0) + int(count)
+        else:
+            continue
+        os.remove(path)
+
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    if stats is not None:
+        stats.dump_stats(prefix + '.pstats')
+    with open(prefix + '.collapsed', 'w') as file:
+        for stack, count in sorted(collapsed.items()):
+            file.write(stack + ' ' + str(count) + '\n')
+    with open(prefix + '.json', 'w') as file:
+        file.write(json.dumps({'config': config, 'threads': sum(1 for f in files if f.endswith('.prof'))}, indent=4))
+    return prefix
@@ -0,0 +1,158 @@
+import numpy as np
+import cv2
+from game_rules import Sign
+
+'''static layers (background and grid) are shared by all renderers with the same board size'''
+_static_layers = {}
+
+
+def _get_static_layer(rows: int, cols: int, size: int) -> np.ndarray:
+    key = (rows, cols, size)
+    if key not in _static_layers:
+        height = (1 + 6 + rows + 1) * size
+        width = (1 + cols + 1) * size
+        layer = np.zeros((height, width, 3), dtype=np.uint8)
+
+        '''fill background'''
+        cv2.rectangle(layer, (0, 0), (width, height), color=(192, 192, 192), thickness=-1)
+
+        '''draw board lines'''
+        for i in range(rows - 1):
+            for j in range(cols - 1):
+                x0 = int((1 + 6 + i + 0.5) * size)
+                y0 = int((1 + j + 0.5) * size)
+                cv2.rectangle(layer, (y0, x0), (y0 + size, x0 + size), color=(0, 0, 0), thickness=1)
+        _static_layers[key] = layer
+    return _static_layers[key]
+
+
+class BoardRenderer:
+    """
+    Renders a single game into a frame. Only the parts that actually changed are redrawn:
+    the grid comes from a cached static layer, stones are drawn incrementally and the player text areas are
+    restored from the static layer before being repainted.
+    """
+
+    def __init__(self, rows: int, cols: int, size: int):
+        self._rows = rows
+        self._cols = cols
+        self._size = size
+        self._static = _get_static_layer(rows, cols, size)
+        self._frame = self._static.copy()
+        self._stones = {}  # (row, col) -> sign of every stone drawn so far
+        self._number_of_moves = 0
+        self._highlighted = None
+        self._draw_footer()
+
+    def size(self) -> int:
+        return self._size
+
+    def number_of_moves(self) -> int:
+        return self._number_of_moves
+
+    def get_frame(self) -> np.ndarray:
+        return self._frame
+
+    def _header_height(self) -> int:
+        return (1 + 6) * self._size
+
+    def _footer_top(self) -> int:
+        '''footer starts right below the stones in the last row'''
+        return int((1 + 6 + self._rows - 0.5) * self._size) + self._size * 4 // 10 + 1
+
+    def _cell_corner(self, row: int, col: int) -> tuple:
+        return (1 + 6 + row) * self._size, (1 + col) * self._size
+
+    def _draw_stone(self, row: int, col: int, sign: Sign) -> None:
+        x0 = int((1 + 6 + row + 0.5) * self._size)
+        y0 = int((1 + col + 0.5) * self._size)
+        if sign == Sign.BLACK:
+            cv2.circle(self._frame, (y0, x0), self._size * 4 // 10, (0, 0, 0), thickness=-1)
+        else:
+            cv2.circle(self._frame, (y0, x0), self._size * 4 // 10, (255, 255, 255), thickness=-1)
+
+    def _restore_cell(self, row: int, col: int) -> None:
+        x0, y0 = self._cell_corner(row, col)
+        self._frame[x0:x0 + self._size + 1, y0:y0 + self._size + 1] = self._static[x0:x0 + self._size + 1, y0:y0 + self._size + 1]
+        if (row, col) in self._stones:
+            self._draw_stone(row, col, self._stones[(row, col)])
+
+    def _draw_footer(self) -> None:
+        height = self._frame.shape[0]
+        top = self._footer_top()
+        self._frame[top:height] = self._static[top:height]
+        tmp_text = str(self._number_of_moves) + ' move'
+        if self._number_of_moves > 1:
+            tmp_text += 's'
+        cv2.putText(self._frame, tmp_text, (self._size, height - self._size // 2), cv2.QT_FONT_NORMAL, 0.8, color=(0, 0, 0), thickness=1)
+
+    def draw_moves(self, new_moves: list) -> None:
+        """
+        Draws stones that were played since the last call.
+        :param new_moves: moves played after the ones that were already drawn
+        :return:
+        """
+        if len(new_moves) == 0:
+            return
+        if self._highlighted is not None:
+            self._restore_cell(self._highlighted.row, self._highlighted.col)
+
+        for move in new_moves:
+            self._stones[(move.row, move.col)] = move.sign
+            self._draw_stone(move.row, move.col, move.sign)
+        self._number_of_moves += len(new_moves)
+        self._draw_footer()
+
+        '''highlight last move'''
+        self._highlighted = new_moves[-1]
+        x0, y0 = self._cell_corner(self._highlighted.row, self._highlighted.col)
+        cv2.rectangle(self._frame, (y0, x0), (y0 + self._size, x0 + self._size), color=(0, 255, 255), thickness=1)
+
+    def draw_players(self, player1: dict, player2: dict) -> None:
+        """
+        Repaints the text area with players info.
+        :param player1: dict with keys 'name', 'time_left', 'sign', 'on_move', 'memory', 'depth', 'score', 'nodes', 'speed'
+        :param player2: same as above
+        :return:
+        """
+        size = self._size
+        width = self._frame.shape[1]
+        header = self._header_height()
+        self._frame[0:header] = self._static[0:header]
+
+        '''highlight side to move'''
+        if player1['on_move']:
+            cv2.rectangle(self._frame, (0, int(0.5 * size)), (width, int((0.5 + 3) * size)), color=(0, 255, 255), thickness=2)
+        if player2['on_move']:
+            cv2.rectangle(self._frame, (0, int((0.5 + 3) * size)), (width, int((0.5 + 3 + 3) * size)), color=(0, 255, 255), thickness=2)
+
+        def summarize_player(player: dict, x: int, y: int) -> None:
+            text1 = player['name'] + ' : ' + str(round(player['time_left'], 1)) + 's'
+            text2 = str(int(player['memory'])) + 'MB'
+            text_depth = 'depth = ' + player['depth']
+            text_score = 'score = ' + player['score']
+            text_nodes = 'nodes = ' + player['nodes']
+            text_speed = 'speed = ' + player['speed']
+            if player['sign'] == Sign.BLACK:
+                color = (0, 0, 0)
+                thickness = -1
+            elif player['sign'] == Sign.WHITE:
+                color = (255, 255, 255)
+                thickness = -1
+            else:
+                color = (0, 0, 0)
+                thickness = 1
+            cv2.circle(self._frame, (int(0.5 * size + y), x - int(1.8 * size)), size * 4 // 10, color, thickness=thickness)
+            cv2.putText(self._frame, text1, (y + size, x - int(1.5 * size)), cv2.QT_FONT_NORMAL, 0.8, color=(0, 0, 0), thickness=1)
+            cv2.putText(self._frame, text2, (y, x), cv2.QT_FONT_NORMAL, 0.8, color=(0, 0, 0), thickness=1)
+
+            split_1 = int(0.3 * self._cols * size)
+            split_2 = int(0.65 * self._cols * size)
+            cv2.putText(self._frame, text_depth, (y + split_1, x - size // 2), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
+            cv2.putText(self._frame, text_score, (y + split_2, x - size // 2), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
+            cv2.putText(self._frame, text_nodes, (y + split_1, x + size // 4), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
+            cv2.putText(self._frame, text_speed, (y + split_2, x + size // 4), cv2.QT_FONT_NORMAL, 0.6, color=(0, 0, 0), thickness=1)
+
+        '''print info about players'''
+        summarize_player(player1, 3 * size, int(0.5 * size))
+        summarize_player(player2, 6 * size, int(0.5 * size))
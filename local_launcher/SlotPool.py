@@ -0,0 +1,57 @@
+import heapq
+import itertools
+from threading import Condition
+from typing import Callable
+
+
+class SlotPool:
+    """
+    Global budget of games that can be played at the same time, shared by several tournaments.
+    Free slots are given to the waiting thread of the tournament with the highest priority, ties are resolved in
+    the order of arrival. So a long tournament running out of games leaves its slots to the others.
+    """
+
+    def __init__(self, slots: int):
+        self._condition = Condition()
+        self._free = slots
+        self._waiting = []  # heap of (-priority, ticket)
+        self._tickets = itertools.count()
+
+    def acquire(self, priority: int, is_running: Callable[[], bool]) -> bool:
+        """
+        Blocks until a slot is free.
+        :param priority: higher values are served first
+        :param is_running: waiting ends if this returns False
+        :return: True if the slot was acquired, False if waiting was cancelled
+        """
+        with self._condition:
+            entry = (-priority, next(self._tickets))
+            heapq.heappush(self._waiting, entry)
+            while True:
+                if not is_running():
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._condition.notify_all()  # this entry may have been blocking the others
+                    return False
+                if self._free > 0 and self._waiting[0] == entry:
+                    heapq.heappop(self._waiting)
+                    self._free -= 1
+                    self._condition.notify_all()
+                    return True
+                self._condition.wait(1.0)
+
+    def release(self) -> None:
+        with self._condition:
+            self._free += 1
+            self._condition.notify_all()
+
+    def wake(self) -> None:
+        """
+        Makes waiting threads check their is_running().
+        """
+        with self._condition:
+            self._condition.notify_all()
+
+    def get_number_of_free_slots(self) -> int:
+        with self._condition:
+            return self._free
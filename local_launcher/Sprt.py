@@ -0,0 +1,98 @@
+import math
+from typing import Optional
+from Board import GameOutcome
+from GameConfig import GameConfig
+from utils import get_value
+
+
+def expected_score(elo: float) -> float:
+    return 1.0 / (1.0 + 10.0 ** (-elo / 400.0))
+
+
+def game_score(game: GameConfig, player: str) -> float:
+    """
+    :param game: finished game
+    :param player: key of the player from whose perspective the score is calculated
+    :return: 1 for a win, 0.5 for a draw and 0 for a loss
+    """
+    if game.outcome == GameOutcome.DRAW:
+        return 0.5
+    elif (game.outcome == GameOutcome.BLACK_WIN) == (game.black_player == player):
+        return 1.0
+    else:
+        return 0.0
+
+
+def is_pair(game1: GameConfig, game2: GameConfig) -> bool:
+    """
+    Games form a pair if they were played with the same opening, but with players having swapped colors.
+    """
+    return game1.opening == game2.opening and game1.black_player == game2.white_player and game1.white_player == game2.black_player
+
+
+class Sprt:
+    """
+    Sequential probability ratio test of the hypothesis that player is stronger by elo1 against being stronger by elo0.
+    Games are counted in pairs with swapped colors, so that the advantage of the first move cancels out. Each pair scores
+    0, 0.5, 1, 1.5 or 2 points (pentanomial distribution), and the log-likelihood ratio is calculated with
+    the normal approximation of its distribution.
+    """
+
+    def __init__(self, config: dict, player: str):
+        """
+        :param config: 'sprt' section of tournament config
+        :param player: key of the tested player, its opponent is the baseline
+        """
+        self._enabled = get_value(config, 'enabled', False)
+        self._elo0 = get_value(config, 'elo0', 0.0)
+        self._elo1 = get_value(config, 'elo1', 5.0)
+        self._alpha = get_value(config, 'alpha', 0.05)
+        self._beta = get_value(config, 'beta', 0.05)
+        self._min_pairs = get_value(config, 'min_pairs', 10)  # variance estimated from just a few pairs is unreliable
+        self._player = player
+        self._pentanomial = [0, 0, 0, 0, 0]
+        self._lower_bound = math.log(self._beta / (1.0 - self._alpha))
+        self._upper_bound = math.log((1.0 - self._beta) / self._alpha)
+
+    def is_enabled(self) -> bool:
+        return self._enabled
+
+    def add_pair(self, game1: GameConfig, game2: GameConfig) -> None:
+        points = game_score(game1, self._player) + game_score(game2, self._player)
+        self._pentanomial[int(round(2 * points))] += 1
+
+    def get_llr(self) -> float:
+        pairs = sum(self._pentanomial)
+        if pairs == 0:
+            return 0.0
+        '''empty bins are slightly regularized, otherwise variance would be zero if all pairs ended the same way'''
+        frequencies = [(n + 1.0e-3) / (pairs + 5.0e-3) for n in self._pentanomial]
+        scores = [0.0, 0.25, 0.5, 0.75, 1.0]
+        mean = sum(f * s for f, s in zip(frequencies, scores))
+        variance = sum(f * (s - mean) ** 2 for f, s in zip(frequencies, scores))
+        s0 = expected_score(self._elo0)
+        s1 = expected_score(self._elo1)
+        return pairs * (s1 - s0) * (2.0 * mean - s0 - s1) / (2.0 * variance)
+
+    def get_result(self) -> Optional[bool]:
+        """
+        :return: True if H1 (player is stronger by elo1) is accepted, False if H0 is accepted, None if the test continues
+        """
+        if not self._enabled or sum(self._pentanomial) < self._min_pairs:
+            return None
+        llr = self.get_llr()
+        if llr >= self._upper_bound:
+            return True
+        elif llr <= self._lower_bound:
+            return False
+        else:
+            return None
+
+    def summary(self) -> str:
+        result = 'SPRT elo0=' + str(self._elo0) + ' elo1=' + str(self._elo1) + ' alpha=' + str(self._alpha) + ' beta=' + str(self._beta)
+        result += ' : LLR ' + str(round(self.get_llr(), 2)) + ' [' + str(round(self._lower_bound, 2)) + ', ' + str(round(self._upper_bound, 2)) + ']'
+        result += ' pentanomial ' + str(self._pentanomial)
+        tmp = self.get_result()
+        if tmp is not None:
+            result += ' - ' + ('H1' if tmp else 'H0') + ' accepted'
+        return result
@@ -1,64 +1,91 @@
 from __future__ import annotations
-from threading import Thread, Lock
+from threading import Thread, Lock, Event
 import signal
 import os
 import json
 import copy
-import numpy as np
-from typing import Optional
+from typing import Optional, Callable
 import time
-import cv2
 import sys
 import logging
+import argparse
 from Match import Match
 from Board import Board, Sign, GameOutcome
 from Player import Player
+from GameConfig import GameConfig
+from GameStore import GameStore
+from Worker import WorkerPool
+from Visualiser import Visualiser
+from Distributed import Coordinator
+from EventBus import EventBus, GameFinished, EngineCrashed
+from Metrics import TournamentMetrics, MetricsServer
+from Broadcast import BroadcastServer
+from Control import ControlServer
+import Tracing
+import Profiling
+from Journal import GameJournal, get_journal_path
+from PgnWriter import PgnWriter
+from Openings import OpeningSuite
+from ParallelismController import ParallelismController
+from SlotPool import SlotPool
+from Sprt import Sprt, is_pair
+from utils import get_value
 from exceptions import Timeouted, Crashed, MadeFoulMove, MadeIllegalMove, TooMuchMemory, Interrupted
 
 
-class GameConfig:
-    def __init__(self, black_player: str, white_player: str, opening: str, saved_state: str = '', index: int = None):
-        self.black_player = copy.deepcopy(black_player)
-        self.white_player = copy.deepcopy(white_player)
-        self.opening = copy.deepcopy(opening)
-        self.outcome = GameOutcome.NO_OUTCOME
-        self.saved_state = copy.deepcopy(saved_state)
-        self.index = index
-        self.pgn = ''
-        self.in_progress = False
-
-    def save(self) -> str:
-        return self.black_player + ':' + self.white_player + ':' + self.opening + ':' + str(self.outcome) + ':' + self.saved_state
-
-    @staticmethod
-    def load(text: str) -> GameConfig:
-        tmp = text.strip('\n').split(':')
-        assert len(tmp) == 5
-        result = GameConfig(tmp[0], tmp[1], tmp[2], tmp[4])
-        result.outcome = GameOutcome.from_string(tmp[3])
-        return result
+def get_players(config: dict) -> dict:
+    """
+    Players are either given as 'player_1' and 'player_2', or as a list under 'engines'.
+    :param config: tournament config
+    :return: dict mapping keys used in GameConfig to player configs
+    """
+    if 'engines' in config:
+        return {'engine_' + str(i): config['engines'][i] for i in range(len(config['engines']))}
+    else:
+        return {'player_1': config['player_1'], 'player_2': config['player_2']}
+
+
+def get_pairings(config: dict) -> list:
+    """
+    :param config: tournament config
+    :return: list of pairs of player keys that play against each other
+    """
+    keys = list(get_players(config).keys())
+    schedule = get_value(config, 'schedule', 'round_robin')
+    if schedule == 'round_robin':
+        return [(keys[i], keys[j]) for i in range(len(keys)) for j in range(i + 1, len(keys))]
+    elif schedule == 'gauntlet':  # first engine plays against all others
+        return [(keys[0], keys[i]) for i in range(1, len(keys))]
+    else:
+        raise Exception('unknown schedule \'' + schedule + '\'')
 
 
 class PlayingThread(Thread):
-    def __init__(self, manager: Tournament):
-        super().__init__()
+    def __init__(self, manager: Tournament, slot: int = 0):
+        super().__init__(name='PlayingThread-' + str(slot))
         self._manager = manager
         self._full_config = manager.get_config()
+        self._tracing = get_value(self._full_config, 'tracing', 'off')
+        if self._tracing != 'off':
+            Tracing.enable()
+        self._players = get_players(self._full_config)
+        self._slot = slot
         self._is_running = True
         self._match = None
 
-    def draw(self, size: int, force_refresh: bool = False) -> Optional[np.ndarray]:
-        if self._match is not None:
-            self._match.draw(size, force_refresh)
-            return self._match.get_frame()
-        else:
-            return None
+    def _get_publisher(self) -> Optional[Callable[[tuple], None]]:
+        event_bus = self._manager.get_event_bus()
+        return None if event_bus is None else event_bus.publish
 
     def _play_game(self, config: GameConfig) -> GameConfig:
         board = Board(self._full_config['game_config'])
-        player1 = Player(self._full_config[config.black_player])
-        player2 = Player(self._full_config[config.white_player])
-        self._match = Match(board, player1, player2, config.opening)
+        player1 = Player(self._players[config.black_player])
+        player2 = Player(self._players[config.white_player])
+        journal = GameJournal(self._manager.get_journal_path(config.index), get_value(self._full_config, 'journal_fsync_interval', 1.0))
+        publish = self._get_publisher()
+        self._match = Match(board, player1, player2, config.opening, publish, journal,
+                            get_value(self._full_config, 'adjudication', {}), self._slot,
+                            get_value(self._full_config, 'pgn_evals', False))
         self._match.load_state(config.saved_state)
         try:
             config.outcome = self._match.play_game()
@@ -66,6 +93,8 @@ class PlayingThread(Thread):
         except (Timeouted, Crashed, MadeFoulMove, MadeIllegalMove, TooMuchMemory) as e:
             logging.warning(str(e))
             config.saved_state = str(e)
+            if publish is not None:
+                publish(EngineCrashed(self._slot, (player1 if player1.get_sign() == e.sign else player2).get_name(), str(e)))
             if e.sign == Sign.BLACK:
                 config.outcome = GameOutcome.WHITE_WIN
             else:
@@ -73,19 +102,39 @@ class PlayingThread(Thread):
         except Interrupted as e:
             logging.warning(str(e))
             config.saved_state = 'in progress = ' + self._match.save_state()
+        finally:
+            journal.close()
+        config.judge_latency = self._match.get_judge_latency()
+        config.engine_memory = [player1.get_last_evaluation()['memory'], player2.get_last_evaluation()['memory']]
+        config.memory_used = sum(config.engine_memory)
+        config.judge_times = self._match.get_judge_times()
+        config.think_times = [self._match.get_think_times(0), self._match.get_think_times(1)]
         return config
 
     def run(self) -> None:
+        if get_value(self._full_config, 'profile', False):
+            Profiling.profile_thread(self._play_games, self._full_config['working_dir'] + '/profile/')
+        else:
+            self._play_games()
+
+    def _play_games(self) -> None:
         while self._is_running:
             cfg = self._manager.get_game_to_play()
             if cfg is None:
                 self._is_running = False
                 break
-            game_record = self._play_game(cfg)
-            game_record.pgn = self._match.generate_pgn()
-            game_record.in_progress = False
-            self._manager.finish_gamed(game_record)
-            time.sleep(5.0)
+            try:
+                game_record = self._play_game(cfg)
+                game_record.pgn = self._match.generate_pgn()
+                game_record.in_progress = False
+                self._manager.finish_gamed(game_record)
+            finally:  # slot must be returned even if the game could not be played or stored
+                self._manager.release_slot()
+            if game_record.outcome != GameOutcome.NO_OUTCOME:
+                GameJournal(self._manager.get_journal_path(game_record.index)).remove()  # state is already saved in the game store
+            if self._tracing == 'game':
+                Tracing.write_trace(self._full_config['working_dir'] + '/trace/' + str(game_record.index) + '.json', Tracing.take_thread_events())
+            time.sleep(get_value(self._full_config, 'pause_between_games', 5.0))
 
     def cleanup(self) -> None:
         self._is_running = False
@@ -94,7 +143,15 @@ class PlayingThread(Thread):
 
 
 class Tournament:
-    def __init__(self, working_dir: str):
+    def __init__(self, working_dir: str, visualiser: Optional[Visualiser] = None, profile: bool = False,
+                 slots: Optional[SlotPool] = None, priority: int = 0):
+        """
+        :param working_dir:
+        :param visualiser:
+        :param profile: if True, all playing threads are profiled, see Profiling.py
+        :param slots: optional budget of parallel games shared with other tournaments, see BatchRunner.py
+        :param priority: priority of this tournament when acquiring the slots
+        """
         if not os.path.exists(working_dir):
             os.mkdir(working_dir)
 
@@ -108,36 +165,72 @@ class Tournament:
         with open(working_dir + 'config.json', 'r') as file:
             self._config = json.loads(file.read())
         self._config['working_dir'] = working_dir
+        self._config['profile'] = profile  # not saved in config.json, it is passed to threads and workers with the config
         self._is_running = False
+        self._slots = slots
+        self._priority = priority
+        self._resumed = Event()
+        self._resumed.set()
         self._started_games = 0
-        self._finished_games = 0
         self._tournament_lock = Lock()
-        self._games = self._prepare_games()
-        self._save_games()
-        self._pgn = self._load_pgn()
-
+        self._store = GameStore(working_dir + '/games.db')
+        if self._store.is_empty():
+            self._store.add_games(self._prepare_games())
+        else:
+            print('found existing tournament state')
+        self._store.release_running_games()
+        self._finished_games = self._store.number_of_finished_games()
+        self._total_games = self._store.number_of_games()
+        self._resume_from_journals()
+        self._sprt = self._create_sprt()
+        self._pgn_writer = PgnWriter(working_dir + '/result.pgn', get_value(self._config, 'journal_fsync_interval', 1.0))
+
+        self._controller = ParallelismController(get_value(self._config, 'adaptive_parallelism', {}))
+        self._retiring_threads = 0  # that many threads will not get a new game, so that parallelism decreases
+
+        if get_value(self._config, 'tracing', 'off') != 'off':
+            Tracing.enable()
+        self._metrics = TournamentMetrics()
+        self._metrics_server = None
+        if get_value(self._config, 'metrics_port', 0) > 0:
+            self._metrics_server = MetricsServer(self.get_metrics, get_value(self._config, 'metrics_host', '127.0.0.1'), self._config['metrics_port'])
+
+        self._event_bus = EventBus()
+        self._event_bus.subscribe_callback(self._metrics.add_event, TournamentMetrics.EVENT_TYPES, 100000)
+        self._visualiser = visualiser
+        if visualiser is not None:  # moves must not be dropped, the board would be drawn incorrectly
+            self._event_bus.subscribe_callback(visualiser.publish, Visualiser.EVENT_TYPES, 100000)
+        self._broadcast_server = None
+        if get_value(self._config, 'broadcast_port', 0) > 0:
+            self._broadcast_server = BroadcastServer(self._event_bus, get_value(self._config, 'broadcast_host', '127.0.0.1'), self._config['broadcast_port'])
+        self._control_server = None
+        if get_value(self._config, 'control_port', 0) > 0:
+            self._control_server = ControlServer(self, get_value(self._config, 'control_host', '127.0.0.1'), self._config['control_port'])
         self._threads = []
-        for i in range(self._config['games_in_parallel']):
-            self._threads.append(PlayingThread(self))
-
-        self._frame = None
+        self._pool = None
+        if get_value(self._config, 'worker_mode', 'thread') == 'process':
+            self._pool = WorkerPool(self)
+        for i in range(self._controller.clamp(self._config['games_in_parallel'])):
+            self._threads.append(self._create_thread(i))
+
+    def _create_thread(self, slot: int):
+        if self._pool is None:
+            return PlayingThread(self, slot)
+        else:
+            return self._pool.create_worker(slot)
 
     def _load_openings(self, filename: str) -> list:
         if filename == 'swap2':
             return ['swap2'] * self._config['games_to_play']
         elif os.path.exists(self._config['working_dir'] + '/' + filename):
-            with open(self._config['working_dir'] + '/' + filename) as file:
-                result = file.readlines()
-                for i in range(len(result)):
-                    result[i] = result[i].replace('\n', '').strip()
-                return result
+            return OpeningSuite(self._config['working_dir'] + '/' + filename, self._config['game_config']).get_openings()
         else:
             raise Exception('could not read file with openings')
 
     def _prepare_games(self) -> list:
         result = []
         if os.path.exists(self._config['working_dir'] + '/games.txt'):
-            print('found existing tournament state')
+            print('importing tournament state from games.txt')
             with open(self._config['working_dir'] + '/games.txt', 'r') as file:
                 lines = file.readlines()
                 for line in lines:
@@ -146,115 +239,322 @@ class Tournament:
         else:
             print('creating new tournament state')
             openings = self._load_openings(self._config['openings'])
+            pairings = get_pairings(self._config)
             for i in range(0, self._config['games_to_play'], 2):
                 op = openings[(i // 2) % len(openings)]
-                '''schedule two games with the same opening, but with players having different colors'''
-                result.append(GameConfig('player_1', 'player_2', op))
-                if i + 1 < self._config['games_to_play']:  # for odd number of games to play
-                    result.append(GameConfig('player_2', 'player_1', op))
+                '''all pairings are interleaved, so that each of them progresses at the same pace'''
+                for player_1, player_2 in pairings:
+                    '''schedule two games with the same opening, but with players having different colors'''
+                    result.append(GameConfig(player_1, player_2, op))
+                    if i + 1 < self._config['games_to_play']:  # for odd number of games to play
+                        result.append(GameConfig(player_2, player_1, op))
 
         for i in range(len(result)):
             result[i].index = i
-            if result[i].outcome != GameOutcome.NO_OUTCOME:
-                self._finished_games += 1
         return result
 
-    def _save_games(self) -> None:
-        with open(self._config['working_dir'] + '/games.txt', 'w') as file:
-            for game in self._games:
-                file.write(game.save() + '\n')
-
-    def _save_pgn(self) -> None:
-        with open(self._config['working_dir'] + '/result.pgn', 'w') as file:
-            file.write(self._pgn)
-
-    def _load_pgn(self) -> str:
-        result = ''
-        if os.path.exists(self._config['working_dir'] + '/result.pgn'):
-            with open(self._config['working_dir'] + '/result.pgn', 'r') as file:
-                result = file.read()
+    def _create_sprt(self) -> Sprt:
+        players = list(get_players(self._config).keys())
+        result = Sprt(get_value(self._config, 'sprt', {}), players[0])
+        if result.is_enabled():
+            if len(players) != 2:
+                raise Exception('SPRT can be used only for a match of two players')
+            finished = {game.index: game for game in self._store.get_finished_games()}
+            for index, game in finished.items():
+                if index % 2 == 0 and index + 1 in finished and is_pair(game, finished[index + 1]):
+                    result.add_pair(game, finished[index + 1])
         return result
 
+    def _update_sprt(self, game: GameConfig) -> None:
+        """
+        Games are scheduled in pairs (2k, 2k+1) with swapped colors, the pair is counted when the second one finishes.
+        :param game: game that has just finished
+        :return:
+        """
+        if not self._sprt.is_enabled() or game.outcome == GameOutcome.NO_OUTCOME:
+            return
+        other = self._store.get_game(game.index ^ 1)
+        if other is not None and other.outcome != GameOutcome.NO_OUTCOME and is_pair(game, other):
+            self._sprt.add_pair(game, other)
+
+    def get_journal_path(self, index: int) -> str:
+        return get_journal_path(self._config['working_dir'], index)
+
+    def _resume_from_journals(self) -> None:
+        """
+        Games that were in progress when the launcher was killed are restored from their journals.
+        :return:
+        """
+        journal_dir = self._config['working_dir'] + '/journal/'
+        if not os.path.exists(journal_dir):
+            os.mkdir(journal_dir)
+            return
+        resumed = 0
+        for filename in os.listdir(journal_dir):
+            stem = filename[:-len('.journal')]
+            if not filename.endswith('.journal') or not stem.isdigit():  # e.g. backups made by editors
+                continue
+            path = journal_dir + filename
+            game = self._store.get_game(int(stem))
+            if game is not None and game.outcome == GameOutcome.NO_OUTCOME:
+                state = GameJournal.read(path)
+                if state != '':
+                    self._store.set_saved_state(game.index, 'in progress = ' + state)
+                    resumed += 1
+            else:  # game has already finished, journal was not removed before the launcher stopped
+                os.remove(path)
+        if resumed > 0:
+            print('resuming ' + str(resumed) + ' games from journals')
+
     def get_summary(self) -> str:
         result = ''
         result += str(self._started_games) + ' games started\n'
         result += str(self._finished_games) + ' games finished\n'
 
-        wins = 0
-        draws = 0
-        losses = 0
-        for game in self._games:
-            if game.outcome == GameOutcome.DRAW:
-                draws += 1
-            elif game.outcome == GameOutcome.BLACK_WIN:
-                if game.black_player == 'player_1':
-                    wins += 1
-                else:
-                    losses += 1
-            elif game.outcome == GameOutcome.WHITE_WIN:
-                if game.black_player == 'player_2':
-                    wins += 1
-                else:
-                    losses += 1
-
-        result += self._config['player_1']['command'] + ' = ' + str(wins) + ':' + str(draws) + ':' + str(losses) + '\n'
-        result += self._config['player_2']['command'] + ' = ' + str(losses) + ':' + str(draws) + ':' + str(wins) + '\n'
+        results = self._store.get_results()
+        players = get_players(self._config)
+
+        def score(player: str, opponent: Optional[str]) -> list:
+            '''wins, draws and losses of the player against opponent (or against all opponents if None)'''
+            tmp = [0, 0, 0]
+            for (black, white, outcome), games in results.items():
+                if (black == player and opponent in (None, white)) or (white == player and opponent in (None, black)):
+                    if outcome == GameOutcome.DRAW:
+                        tmp[1] += games
+                    elif (outcome == GameOutcome.BLACK_WIN) == (black == player):
+                        tmp[0] += games
+                    else:
+                        tmp[2] += games
+            return tmp
+
+        def to_string(wdl: list) -> str:
+            return str(wdl[0]) + ':' + str(wdl[1]) + ':' + str(wdl[2])
+
+        for key in players.keys():
+            result += players[key]['command'] + ' = ' + to_string(score(key, None)) + '\n'
+        if len(players) > 2:
+            for player_1, player_2 in get_pairings(self._config):
+                result += players[player_1]['command'] + ' vs ' + players[player_2]['command'] + ' = ' + to_string(score(player_1, player_2)) + '\n'
+        if self._sprt.is_enabled():
+            result += self._sprt.summary() + '\n'
         return result
 
     def start(self) -> None:
         self._is_running = True
+        if self._metrics_server is not None:
+            self._metrics_server.start()
+        if self._broadcast_server is not None:
+            self._broadcast_server.start()
+        if self._control_server is not None:
+            self._control_server.start()
         for t in self._threads:
             t.start()
 
-    def get_game_to_play(self) -> Optional[GameConfig]:
+    def _number_of_active_threads(self) -> int:
+        return sum(1 for t in self._threads if t.is_alive()) - self._retiring_threads
+
+    def _change_parallelism(self, delta: int) -> None:
+        """
+        Threads are retired only between games - they simply do not get another game to play.
+        Must be called under the tournament lock.
+        :param delta: number of threads to start, or to retire if negative
+        :return:
+        """
+        for _ in range(-delta):
+            self._retiring_threads += 1
+        for _ in range(delta):
+            if self._retiring_threads > 0:  # thread that was going to retire simply continues
+                self._retiring_threads -= 1
+                continue
+            for slot in range(len(self._threads) + 1):
+                if slot == len(self._threads):
+                    self._threads.append(None)
+                if self._threads[slot] is None or not self._threads[slot].is_alive():
+                    self._threads[slot] = self._create_thread(slot)
+                    self._threads[slot].start()
+                    break
+
+    def adjust_parallelism(self) -> None:
+        """
+        Called periodically, starts or retires one playing thread if the controller decides so.
+        :return:
+        """
+        if self.is_paused():  # threads are idle, the samples would not say anything about the load
+            return
         with self._tournament_lock:
-            for game in self._games:
-                if game.outcome == GameOutcome.NO_OUTCOME and not game.in_progress:
-                    game.in_progress = True
-                    self._started_games += 1
-                    return copy.deepcopy(game)
-            return None
+            active = self._number_of_active_threads()
+            pending = self._total_games - self._finished_games - self._store.number_of_running_games()
+            delta, reason = self._controller.decide(active, pending)
+            if delta == 0:
+                return
+            print('changing games in parallel from ' + str(active) + ' to ' + str(active + delta) + ' (' + reason + ')')
+            self._change_parallelism(delta)
+
+    def set_games_in_parallel(self, games_in_parallel: int) -> None:
+        """
+        Changes the number of playing threads. Games in progress are not interrupted, surplus threads stop
+        after finishing them. If adaptive parallelism is enabled, it may only decrease the number from now on.
+        :param games_in_parallel:
+        :return:
+        """
+        if games_in_parallel < 1:
+            raise Exception('games in parallel must be at least 1, got ' + str(games_in_parallel))
+        with self._tournament_lock:
+            active = self._number_of_active_threads()
+            print('changing games in parallel from ' + str(active) + ' to ' + str(games_in_parallel) + ' (requested)')
+            self._controller.set_max_games_in_parallel(games_in_parallel)
+            self._change_parallelism(games_in_parallel - active)
+
+    def pause(self) -> None:
+        """
+        Playing threads finish their current games and then wait. Remote workers are told to wait too.
+        """
+        print('pausing the tournament, games in progress will be finished')
+        self._resumed.clear()
+
+    def resume(self) -> None:
+        print('resuming the tournament')
+        self._resumed.set()
+
+    def is_paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def set_priority(self, priority: int, indices: Optional[list] = None, player: Optional[str] = None) -> int:
+        """
+        Pending games with higher priority are played first. See GameStore.set_priority
+        :param player: key of the player in the config, or its name
+        """
+        if player is None:
+            return self._store.set_priority(priority, indices)
+        players = get_players(self._config)
+        keys = [player] if player in players else [k for k, v in players.items() if get_value(v, 'name', '') == player]
+        if len(keys) == 0:
+            raise Exception('unknown player \'' + player + '\'')
+        result = 0 if indices is None else self._store.set_priority(priority, indices)
+        for key in keys:
+            result += self._store.set_priority(priority, None, key)
+        return result
 
-    def finish_gamed(self, game: GameConfig) -> None:
+    def get_status(self) -> dict:
         with self._tournament_lock:
-            self._games[game.index] = game
-            self._pgn += game.pgn
-            self._finished_games += 1
-            self._save_games()
-            self._save_pgn()
+            running = self._store.number_of_running_games()
+            return {'games_in_parallel': self._number_of_active_threads(),
+                    'paused': self.is_paused(),
+                    'games_total': self._total_games,
+                    'games_finished': self._finished_games,
+                    'games_running': running,
+                    'games_pending': self._total_games - self._finished_games - running}
+
+    def get_game_to_play(self, worker: str = '') -> Optional[GameConfig]:
+        """
+        :param worker: identifier of a remote worker, empty for local threads
+        :return:
+        """
+        if worker == '':  # remote workers check is_paused() themselves, they should not block the coordinator
+            while not self._resumed.wait(1.0):
+                if not self.is_running():
+                    return None
+        with self._tournament_lock:
+            if self._retiring_threads > 0 and worker == '':
+                self._retiring_threads -= 1
+                return None
+            if self._sprt.get_result() is not None:
+                return None
+        uses_slot = worker == '' and self._slots is not None  # remote workers have their own machines
+        if uses_slot and not self._slots.acquire(self._priority, self.is_running):
+            return None
+        game = self._store.claim_game(worker)
+        if game is not None:
+            with self._tournament_lock:
+                self._started_games += 1
+            self._metrics.add_started_game()
+        elif uses_slot:
+            self._slots.release()
+        return game
+
+    def release_slot(self) -> None:
+        """
+        Called by a local thread after each game returned by get_game_to_play, whether it was finished or not.
+        :return:
+        """
+        if self._slots is not None:
+            self._slots.release()
+
+    def finish_gamed(self, game: GameConfig, worker: str = '') -> None:
+        pgn = game.pgn
+        game.pgn = ''
+        with self._tournament_lock:  # game is stored under the lock, so that a pair is never counted twice by SPRT
+            if not self._store.update_game(game, worker):
+                logging.warning('ignoring late result of game ' + str(game.index) + ' from worker \'' + worker + '\'')
+                return
+            if game.outcome != GameOutcome.NO_OUTCOME:
+                self._finished_games += 1
+            self._update_sprt(game)
+            if not self.is_paused():  # games finished after pausing ran with fewer threads than are active
+                self._controller.add_game(game)
             print(self.get_summary())
+        players = get_players(self._config)
+        self._event_bus.publish(GameFinished(game, [players[game.black_player]['command'], players[game.white_player]['command']]))
+        self._pgn_writer.write(pgn)  # writer has its own lock, so other threads are not blocked by the I/O
+
+    def renew_lease(self, index: int, worker: str) -> bool:
+        return self._store.renew_lease(index, worker)
+
+    def release_expired_games(self) -> None:
+        """
+        Called periodically, games of remote workers that stopped renewing their leases are given to someone else.
+        :return:
+        """
+        for index in self._store.release_expired_games(get_value(self._config, 'lease_timeout', 60.0)):
+            print('lease of game ' + str(index) + ' has expired, it will be played again')
 
     def get_config(self) -> dict:
         return copy.deepcopy(self._config)
 
-    def draw(self, size: int, force_reshresh: bool = False) -> None:
-        height = 0
-        width = 0
-        imgs = []
-        for t in self._threads:
-            tmp = t.draw(size, force_reshresh)
-            if tmp is None:
-                return
-            imgs.append(tmp)
-            height = max(height, tmp.shape[0])
-            width += tmp.shape[1]
-
-        if self._frame is None:
-            self._frame = np.zeros((height, width, 3), dtype=np.uint8)
-        width = 0
-        for img in imgs:
-            self._frame[0:img.shape[0], width:width + img.shape[1], :] = img
-            width += img.shape[1]
-
-    def get_frame(self) -> np.ndarray:
-        if self._frame is None:
-            return np.zeros((1, 1, 3), dtype=np.uint8)
-        else:
-            return self._frame
+    def get_metrics(self) -> str:
+        """
+        :return: metrics of the tournament in the Prometheus text format
+        """
+        with self._tournament_lock:
+            gauges = {'games_total': self._total_games,
+                      'games_pending': self._total_games - self._finished_games - self._store.number_of_running_games(),
+                      'games_running': self._store.number_of_running_games(),
+                      'games_in_parallel': self._number_of_active_threads()}
+        if self._pool is not None:
+            gauges['worker_requests_queue_depth'] = self._pool.get_queue_depth()
+        if self._visualiser is not None:
+            gauges['visualiser_queue_depth'] = self._visualiser.get_queue_depth()
+        gauges['dropped_events'] = self._event_bus.get_dropped_events()
+        if self._broadcast_server is not None:
+            gauges['broadcast_viewers'] = self._broadcast_server.get_number_of_viewers()
+        return self._metrics.render(gauges)
+
+    def get_event_bus(self) -> EventBus:
+        return self._event_bus
 
     def cleanup(self) -> None:
         for t in self._threads:
             t.cleanup()
+        for t in self._threads:  # interrupted threads still save state of their games
+            if t.is_alive():
+                t.join()
+        if self._pool is not None:
+            self._pool.close()
+        self._event_bus.close()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+        if self._broadcast_server is not None:
+            self._broadcast_server.close()
+        if self._control_server is not None:
+            self._control_server.close()
+        self._pgn_writer.close()
+        self._store.close()
+        if Tracing.is_enabled():  # in 'game' mode this contains only what happened outside of the games
+            Tracing.write_trace(self._config['working_dir'] + '/trace.json', Tracing.take_all_events())
+        if self._config['profile']:
+            config = dict(self._config)
+            del config['working_dir'], config['profile']
+            print('profile saved to ' + Profiling.merge_profiles(self._config['working_dir'] + '/profile/', config) + '.*')
 
     @staticmethod
     def _create_default_config() -> dict:
@@ -271,11 +571,41 @@ class Tournament:
 
         result = {'games_to_play': 10,
                   'games_in_parallel': 1,
+                  'worker_mode': 'thread',  # can also be 'process', then each game is judged in a separate process
+                  'adaptive_parallelism': {'enabled': False,  # if enabled, games_in_parallel is only the initial value
+                                           'min_games_in_parallel': 1,
+                                           'max_games_in_parallel': os.cpu_count(),
+                                           'max_cpu_load': 0.9,  # fraction of all cores
+                                           'min_free_memory': 1024,  # in MB
+                                           'max_timeout_rate': 0.05,
+                                           'max_judge_latency': 0.05,  # in seconds per move
+                                           'interval': 30.0},  # minimal time between changes, in seconds
                   'openings': 'openings_freestyle.txt',  # can also be 'swap2'
-                  'visualise': True,
+                  'visualise': False,  # requires opencv, it can be overridden with --draw or --headless
+                  'journal_fsync_interval': 1.0,  # in seconds
+                  'pause_between_games': 5.0,  # in seconds, for each playing thread
+                  'pgn_evals': False,  # if enabled, scores reported by the engines are written to result.pgn as comments
+                  'adjudication': {'enabled': False,  # scores are in the units reported by the engines
+                                   'resign_score': 1000.0,
+                                   'resign_moves': 4,  # for each engine
+                                   'draw_score': 10.0,
+                                   'draw_moves': 8,  # for each engine
+                                   'draw_after': 100},  # number of moves on board
+                  'tracing': 'off',  # 'game' writes trace/<index>.json after every game, 'tournament' writes trace.json at the end
+                  'metrics_port': 0,  # if positive, metrics in the Prometheus format are served at http://localhost:port/metrics
+                  'broadcast_port': 0,  # if positive, games can be watched in a browser at http://localhost:port/
+                  'control_port': 0,  # if positive, the running tournament can be scaled and paused, see Control.py
+                  'lease_timeout': 60.0,  # in seconds, after that games of unresponsive remote workers are played again
+                  'sprt': {'enabled': False,  # if enabled, the match stops as soon as player_1 is proven stronger or not
+                           'elo0': 0.0,
+                           'elo1': 5.0,
+                           'alpha': 0.05,
+                           'beta': 0.05,
+                           'min_pairs': 10},
                   'game_config': {'rows': 20,
                                   'cols': 20,
                                   'rules': 'freestyle'},
+                  'schedule': 'round_robin',  # used if players are given as a list 'engines', can also be 'gauntlet'
                   'player_1': create_default_player_config(),
                   'player_2': create_default_player_config()}
 
@@ -283,15 +613,32 @@ class Tournament:
 
     def is_running(self) -> bool:
         with self._tournament_lock:
-            return self._is_running and self._finished_games < self._config['games_to_play']
+            return self._is_running and self._finished_games < self._total_games and self._sprt.get_result() is None
 
     def stop(self) -> None:
         with self._tournament_lock:
             self._is_running = False
-
-
-def run_tournament(path: str, draw_boards: bool = False) -> None:
-    tournament = Tournament(path)
+        if self._slots is not None:
+            self._slots.wake()
+
+
+def run_tournament(path: str, draw_boards: Optional[bool] = False, address: Optional[tuple] = None, profile: bool = False) -> None:
+    """
+    :param path: working directory of the tournament
+    :param draw_boards: None means that 'visualise' in config decides, if False cv2 is never loaded
+    :param address: (host, port) on which to serve games to remote workers, if given
+    :param profile: if True, playing threads are profiled and merged results are written to path/profile/
+    :return:
+    """
+    if draw_boards is None and os.path.exists(path + 'config.json'):
+        with open(path + 'config.json', 'r') as file:
+            draw_boards = get_value(json.loads(file.read()), 'visualise', False)
+    visualiser = Visualiser(30) if draw_boards else None
+    tournament = Tournament(path, visualiser, profile)
+    coordinator = None
+    if address is not None:
+        coordinator = Coordinator(tournament, address[0], address[1])
+        coordinator.start()
 
     def signal_handler(sig, frame):
         logging.info('Requesting interruption, this may take a while...')
@@ -301,19 +648,28 @@ def run_tournament(path: str, draw_boards: bool = False) -> None:
 
     tournament.start()
     while tournament.is_running():
-        if draw_boards:
-            tournament.draw(30, True)
-            cv2.imshow('preview', tournament.get_frame())
-            cv2.waitKey(100)
-        else:
-            time.sleep(1)
+        time.sleep(1)
+        tournament.adjust_parallelism()
+        tournament.release_expired_games()
 
+    print(tournament.get_summary())
+    if coordinator is not None:
+        coordinator.close()
     tournament.cleanup()
-    if draw_boards:
-        cv2.destroyWindow('preview')
+    if visualiser is not None:
+        visualiser.close()
 
 
 if __name__ == '__main__':
-    # logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
-    run_tournament('somepath')
+    parser = argparse.ArgumentParser(description='Plays a tournament between engines.')
+    parser.add_argument('working_dir', help='directory with config.json of the tournament')
+    group = parser.add_mutually_exclusive_group()  # if neither is given, 'visualise' in config decides
+    group.add_argument('--draw', dest='draw', action='store_const', const=True, default=None, help='show the games being played')
+    group.add_argument('--headless', dest='draw', action='store_const', const=False, help='never load cv2 and do not show the games')
+    parser.add_argument('--profile', action='store_true', help='profile playing threads, results are written to working_dir/profile/')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO if args.verbose else logging.WARNING)
+    run_tournament(args.working_dir, args.draw, profile=args.profile)
     exit(0)
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import functools
+import threading
+from typing import Callable
+
+'''
+Opt-in recording of spans in the Chrome trace event format (chrome://tracing, https://ui.perfetto.dev).
+Recording is global for the process, and each thread appends to its own buffer, so that there is no contention.
+When tracing is disabled, every traced call costs only a check of a flag.
+'''
+
+_enabled = False
+_lock = threading.Lock()
+_buffers = {}  # thread id -> list of events
+_local = threading.local()
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _get_buffer() -> list:
+    result = getattr(_local, 'events', None)
+    if result is None:
+        result = []
+        _local.events = result
+        with _lock:
+            _buffers[threading.get_native_id()] = result
+        result.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': threading.get_native_id(),
+                       'args': {'name': threading.current_thread().name}})
+    return result
+
+
+def _add_span(name: str, category: str, start: float, end: float, args: dict) -> None:
+    _get_buffer().append({'name': name, 'cat': category, 'ph': 'X', 'ts': start * 1.0e6, 'dur': (end - start) * 1.0e6,
+                          'pid': os.getpid(), 'tid': threading.get_native_id(), 'args': args})
+
+
+class span:
+    """
+    Records the time spent in a block of code.
+    with span('name', 'category', key=value):
+        ...
+    """
+
+    def __init__(self, name: str, category: str = 'judge', **args):
+        self._name = name
+        self._category = category
+        self._args = args
+        self._start = 0.0
+
+    def __enter__(self):
+        if _enabled:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if _enabled:
+            _add_span(self._name, self._category, self._start, time.perf_counter(), self._args)
+
+
+def traced(category: str = 'judge') -> Callable:
+    """
+    Decorator recording every call of the function as a span named after the function.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        name = function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _add_span(name, category, start, time.perf_counter(), {})
+
+        return wrapper
+
+    return decorator
+
+
+def take_thread_events() -> list:
+    """
+    :return: events recorded by the calling thread so far, the buffer is cleared
+    """
+    tmp = _get_buffer()
+    result = list(tmp)
+    del tmp[1:]  # thread name is kept, so that each part of the trace has it
+    return result
+
+
+def take_all_events() -> list:
+    """
+    :return: events recorded by all threads so far, all buffers are cleared
+    """
+    result = []
+    with _lock:
+        for events in _buffers.values():
+            result += events
+            del events[1:]
+    return result
+
+
+def write_trace(path: str, events: list) -> None:
+    if os.path.dirname(path) != '' and not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
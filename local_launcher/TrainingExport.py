@@ -0,0 +1,412 @@
+import os
+import sys
+import json
+import hashlib
+import logging
+import argparse
+import multiprocessing
+import numpy as np
+from collections import deque
+from typing import NamedTuple, Iterator, Optional
+from Board import Board, GameOutcome
+from GameConfig import GameConfig
+from Adjudicator import parse_score
+from game_rules import Sign, Move, GameRules
+from exceptions import MadeIllegalMove
+from utils import get_value
+
+'''
+Exports positions from finished games as training data. Supported inputs:
+    result.pgn - written by the local launcher, the board is taken from config.json in the same directory
+    games.txt - state of the local launcher, only games that were decided and still have their moves are used
+    *.psq - written by the server, the outcome is taken from the final position, undecided games are skipped
+    directory - with config.json it is a tournament of the local launcher (result.pgn and games.txt),
+                otherwise all *.pgn and *.psq files in it are used
+Every sample is a position before a move made by an engine (moves of the opening and swap2 decisions are skipped):
+    boards.npy - int8 [n, rows, cols], values of Sign (0 - empty, 1 - black, 2 - white)
+    side.npy - int8 [n], Sign of the player to move
+    move.npy - int16 [n], row * cols + col of the move that was played
+    outcome.npy - int8 [n], final result for the player to move (1 - win, 0 - draw, -1 - loss)
+    eval.npy - float32 [n], score reported by the engine for its move (NaN if unknown, infinity for a forced win),
+               available only if the tournament was played with 'pgn_evals' enabled
+Samples are written in shards (directories shard-00000, shard-00001, ...) that can be opened with
+np.load(path, mmap_mode='r'), manifest.json describes all of them and is written last.
+'''
+
+
+class GameRecord(NamedTuple):
+    rows: int
+    cols: int
+    rules: str
+    actions: list  # for each action a list of (row, col), it is empty for 'SWAP'
+    outcome: GameOutcome
+    scores: list  # for each action a score reported by the engine, '?' if unknown
+    opening_plies: int  # number of first actions that were not chosen by the engines
+
+
+_FIELDS = [('boards', np.int8), ('side', np.int8), ('move', np.int16), ('outcome', np.int8), ('eval', np.float32)]
+
+
+def get_array_symmetries(rows: int, cols: int) -> list:
+    """
+    :return: list of functions transforming arrays along their last two axes, 8 for a square board and 4 otherwise
+    """
+    result = [lambda a: a,
+              lambda a: a[..., ::-1, :],
+              lambda a: a[..., :, ::-1],
+              lambda a: a[..., ::-1, ::-1]]
+    if rows == cols:  # transposition is a symmetry only of square boards
+        result += [lambda a, f=f: np.swapaxes(f(a), -1, -2) for f in list(result)]
+    return result
+
+
+def get_move_mappings(rows: int, cols: int) -> list:
+    """
+    :return: for each of array symmetries, array mapping index of a spot (row * cols + col) to the index after transformation
+    """
+    result = []
+    indices = np.arange(rows * cols).reshape(rows, cols)
+    for symmetry in get_array_symmetries(rows, cols):
+        mapping = np.empty(rows * cols, dtype=np.int16)
+        mapping[symmetry(indices).ravel()] = np.arange(rows * cols)
+        result.append(mapping)
+    return result
+
+
+def _parse_pgn_action(token: str) -> list:
+    if token == 'SWAP':
+        return []
+    return [(ord(m[0]) - 97, int(m[1:])) for m in token.split(',')]
+
+
+def _parse_pgn_result(result: str) -> GameOutcome:
+    '''the local launcher writes 1-0 for white win and 0-1 for black win'''
+    return {'1-0': GameOutcome.WHITE_WIN, '0-1': GameOutcome.BLACK_WIN, '1/2-1/2': GameOutcome.DRAW}.get(result, GameOutcome.NO_OUTCOME)
+
+
+def read_pgn(path: str, game_config: dict) -> Iterator[GameRecord]:
+    """
+    Reads games one by one, without loading the whole file.
+    :param path: PGN written by the local launcher
+    :param game_config: 'game_config' section of the tournament config
+    """
+    with open(path, 'r') as file:
+        headers = {}
+        for line in file:
+            line = line.strip()
+            if line.startswith('['):
+                key, _, value = line[1:-1].partition(' ')
+                headers[key] = value.strip('"')
+            elif line != '' and len(headers) > 0:
+                actions = []
+                scores = []
+                for token in line.split(' '):
+                    if token == '' or token.endswith('.'):
+                        continue
+                    if token.startswith('{'):  # comment with the score of the previous action
+                        scores[-1] = token.strip('{}')
+                    else:
+                        actions.append(_parse_pgn_action(token))
+                        scores.append('?')
+                yield GameRecord(game_config['rows'], game_config['cols'], game_config['rules'], actions,
+                                 _parse_pgn_result(headers.get('Result', '')), scores, int(headers.get('OpeningPlies', 0)))
+                headers = {}
+
+
+def read_games_txt(path: str, game_config: dict) -> Iterator[GameRecord]:
+    """
+    :param path: games.txt of the local launcher, finished games usually have no moves there (they are in result.pgn)
+    :param game_config: 'game_config' section of the tournament config
+    """
+    with open(path, 'r') as file:
+        for line in file:
+            if line.strip() == '':
+                continue
+            game = GameConfig.load(line)
+            state = game.saved_state[14:] if game.saved_state.startswith('in progress = ') else game.saved_state
+            tokens = state.split(' ')[2:]
+            if game.outcome == GameOutcome.NO_OUTCOME or len(tokens) == 0:
+                continue
+            try:
+                actions = [[] if t == 'SWAP' else [(m.row, m.col) for m in map(Move.load, t.split(','))] for t in tokens]
+            except (AssertionError, IndexError, ValueError):
+                continue  # saved state is a description of an error, not a list of moves
+            opening_plies = 0 if game.opening == 'swap2' else len(game.opening.split(' '))
+            yield GameRecord(game_config['rows'], game_config['cols'], game_config['rules'], actions, game.outcome,
+                             ['?'] * len(actions), opening_plies)
+
+
+def read_psq(path: str, rules: str) -> Iterator[GameRecord]:
+    """
+    :param path: psq file written by the server, coordinates in it are 1-based 'x,y,time'
+    :param rules: rules the game was played with, they are not stored in the file
+    """
+    with open(path, 'r') as file:
+        lines = [line.strip() for line in file]
+    size = lines[0].split(' ')[1].split(',')[0].split('x')
+    rows, cols = int(size[1]), int(size[0])
+    actions = []
+    for line in lines[1:]:
+        tmp = line.split(',')
+        if len(tmp) < 2:
+            break  # names of the players follow the moves
+        actions.append([(int(tmp[1]) - 1, int(tmp[0]) - 1)])
+    yield GameRecord(rows, cols, rules, actions, GameOutcome.NO_OUTCOME, ['?'] * len(actions), 0)
+
+
+def read_input(path: str, rules: str = 'freestyle') -> Iterator[GameRecord]:
+    """
+    :param path: file or directory, see the description of the module
+    :param rules: used for psq files
+    """
+    if os.path.isdir(path):
+        if os.path.exists(os.path.join(path, 'config.json')):
+            with open(os.path.join(path, 'config.json'), 'r') as file:
+                game_config = get_value(json.loads(file.read()), 'game_config')
+            if os.path.exists(os.path.join(path, 'result.pgn')):
+                yield from read_pgn(os.path.join(path, 'result.pgn'), game_config)
+            if os.path.exists(os.path.join(path, 'games.txt')):
+                yield from read_games_txt(os.path.join(path, 'games.txt'), game_config)
+        else:
+            for directory, _, files in sorted(os.walk(path)):
+                for name in sorted(files):
+                    if name.endswith('.psq') or name.endswith('.pgn'):
+                        yield from read_input(os.path.join(directory, name), rules)
+    elif path.endswith('.psq'):
+        yield from read_psq(path, rules)
+    elif path.endswith('.pgn'):
+        config_path = os.path.join(os.path.dirname(path), 'config.json')
+        if not os.path.exists(config_path):
+            raise Exception('there is no config.json next to \'' + path + '\', the size of the board is unknown')
+        with open(config_path, 'r') as file:
+            game_config = get_value(json.loads(file.read()), 'game_config')
+        yield from read_pgn(path, game_config)
+    else:
+        raise Exception('unsupported input \'' + path + '\'')
+
+
+def _canonical_hash(stones: np.ndarray, side: int, move: int, symmetries: list, mappings: list) -> int:
+    """
+    :return: hash of the sample that is the same for all its symmetric copies
+    """
+    result = None
+    for symmetry, mapping in zip(symmetries, mappings):
+        key = hashlib.blake2b(symmetry(stones).tobytes() + bytes([side]) + int(mapping[move]).to_bytes(2, 'little'), digest_size=8).digest()
+        if result is None or key < result:
+            result = key
+    return int.from_bytes(result, 'little')
+
+
+def replay_game(record: GameRecord) -> Optional[dict]:
+    """
+    :return: arrays of samples from the game (see _FIELDS) and their canonical hashes, None if the game is invalid
+    """
+    board = Board({'rows': record.rows, 'cols': record.cols, 'rules': record.rules})
+    stones = np.zeros((record.rows, record.cols), dtype=np.int8)
+    symmetries = get_array_symmetries(record.rows, record.cols)
+    mappings = get_move_mappings(record.rows, record.cols)
+    samples = []
+    try:
+        for i, action in enumerate(record.actions):
+            if i >= record.opening_plies and len(action) == 1:
+                side = int(board.get_sign_to_move())
+                move = action[0][0] * record.cols + action[0][1]
+                samples.append((stones.copy(), side, move, parse_score(record.scores[i]),
+                                _canonical_hash(stones, side, move, symmetries, mappings)))
+            for row, col in action:
+                sign = board.get_sign_to_move()
+                board.make_move(Move(row, col, sign))
+                stones[row, col] = int(sign)
+    except MadeIllegalMove:
+        return None
+
+    outcome = record.outcome
+    if outcome == GameOutcome.NO_OUTCOME:
+        outcome = board.get_outcome()
+    if outcome == GameOutcome.NO_OUTCOME:
+        return None
+    winner = {GameOutcome.BLACK_WIN: int(Sign.BLACK), GameOutcome.WHITE_WIN: int(Sign.WHITE)}.get(outcome, 0)
+
+    result = {'boards': np.array([s[0] for s in samples], dtype=np.int8).reshape(-1, record.rows, record.cols),
+              'side': np.array([s[1] for s in samples], dtype=np.int8),
+              'move': np.array([s[2] for s in samples], dtype=np.int16),
+              'eval': np.array([np.nan if s[3] is None else s[3] for s in samples], dtype=np.float32),
+              'hash': np.array([s[4] for s in samples], dtype=np.uint64)}
+    result['outcome'] = np.where(winner == 0, 0, np.where(result['side'] == winner, 1, -1)).astype(np.int8)
+    return result
+
+
+def replay_games(records: list) -> tuple:
+    """
+    Replays a chunk of games in a worker process.
+    :return: (arrays of all samples or None, number of invalid games)
+    """
+    results = [replay_game(record) for record in records]
+    valid = [r for r in results if r is not None and len(r['side']) > 0]
+    if len(valid) == 0:
+        return None, results.count(None)
+    return {key: np.concatenate([r[key] for r in valid]) for key in valid[0]}, results.count(None)
+
+
+class ShardWriter:
+    """
+    Collects samples, removes duplicates (also those that are only rotated or mirrored copies of a sample
+    that was already written) and writes them in shards of fixed size.
+    """
+
+    def __init__(self, directory: str, rows: int, cols: int, shard_size: int, augment: bool, deduplicate: bool):
+        self._directory = directory
+        self._rows = rows
+        self._cols = cols
+        self._shard_size = shard_size
+        self._deduplicate = deduplicate
+        self._symmetries = get_array_symmetries(rows, cols) if augment else get_array_symmetries(rows, cols)[:1]
+        self._mappings = get_move_mappings(rows, cols)[:len(self._symmetries)]
+        self._known = set()
+        self._buffer = []  # chunks of samples waiting to be written
+        self._buffered = 0
+        self._shards = []  # (name, number of samples)
+        self.duplicates = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _augment(self, samples: dict) -> dict:
+        """
+        :return: all symmetric copies of the samples, without copies identical to another one of the same sample
+        """
+        copies = []
+        for symmetry, mapping in zip(self._symmetries, self._mappings):
+            tmp = dict(samples)
+            tmp['boards'] = np.ascontiguousarray(symmetry(samples['boards']))
+            tmp['move'] = mapping[samples['move']]
+            copies.append(tmp)
+        result = []
+        for i, tmp in enumerate(copies):
+            unique = np.ones(len(tmp['move']), dtype=bool)
+            for other in copies[:i]:
+                unique &= (tmp['move'] != other['move']) | np.any(tmp['boards'] != other['boards'], axis=(1, 2))
+            result.append({key: value[unique] for key, value in tmp.items()})
+        return {key: np.concatenate([r[key] for r in result]) for key in samples}
+
+    def add(self, samples: dict) -> None:
+        if self._deduplicate:
+            keep = np.zeros(len(samples['hash']), dtype=bool)
+            for i, h in enumerate(samples['hash'].tolist()):
+                if h not in self._known:
+                    self._known.add(h)
+                    keep[i] = True
+            self.duplicates += len(keep) - int(np.count_nonzero(keep))
+            samples = {key: value[keep] for key, value in samples.items()}
+        samples = self._augment(samples)
+        self._buffer.append(samples)
+        self._buffered += len(samples['side'])
+        while self._buffered >= self._shard_size:
+            self._flush(self._shard_size)
+
+    def _flush(self, size: int) -> None:
+        merged = {key: np.concatenate([b[key] for b in self._buffer]) for key in self._buffer[0]}
+        name = 'shard-' + str(len(self._shards)).zfill(5)
+        os.makedirs(os.path.join(self._directory, name), exist_ok=True)
+        for key, dtype in _FIELDS:
+            np.save(os.path.join(self._directory, name, key + '.npy'), merged[key][:size].astype(dtype))
+        self._shards.append((name, size))
+        self._buffer = [{key: value[size:] for key, value in merged.items()}]
+        self._buffered -= size
+
+    def close(self, manifest: dict) -> dict:
+        """
+        Writes remaining samples and the manifest.
+        :param manifest: additional information stored in the manifest
+        :return: the manifest
+        """
+        if self._buffered > 0:
+            self._flush(self._buffered)
+        result = dict(manifest, rows=self._rows, cols=self._cols, symmetries=len(self._symmetries),
+                      duplicates=self.duplicates, samples=sum(size for _, size in self._shards),
+                      shards=[{'name': name, 'samples': size} for name, size in self._shards],
+                      fields={key: np.dtype(dtype).name for key, dtype in _FIELDS})
+        with open(os.path.join(self._directory, 'manifest.json'), 'w') as file:
+            file.write(json.dumps(result, indent=4))
+        return result
+
+
+def _chunks(records: Iterator[GameRecord], size: int) -> Iterator[list]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def export(inputs: list, output: str, shard_size: int = 1000000, augment: bool = False, deduplicate: bool = True,
+           processes: int = os.cpu_count(), rules: str = 'freestyle', chunk_size: int = 64) -> dict:
+    """
+    :param inputs: files or directories, see the description of the module
+    :param output: directory where the shards are written
+    :param shard_size: number of samples in a shard
+    :param augment: if True, all symmetric copies of every sample are written
+    :param deduplicate: if True, samples that were already written (possibly rotated or mirrored) are skipped
+    :param processes: number of processes replaying the games
+    :param rules: rules of games from psq files
+    :param chunk_size: number of games sent to a process at once
+    :return: manifest of the exported data
+    """
+    records = (record for path in inputs for record in read_input(path, rules))
+    games = 0
+    invalid = 0
+    board = None  # (rows, cols, rules) of all the games
+    writer = None
+    pending = deque()
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        def collect() -> None:
+            nonlocal invalid
+            samples, count = pending.popleft().get()
+            invalid += count
+            if samples is not None:
+                writer.add(samples)
+
+        for chunk in _chunks(records, chunk_size):
+            if board is None:
+                board = (chunk[0].rows, chunk[0].cols, chunk[0].rules)
+                writer = ShardWriter(output, board[0], board[1], shard_size, augment, deduplicate)
+            for record in chunk:
+                if (record.rows, record.cols, record.rules) != board:
+                    raise Exception('all games must be played on the same board, found ' + str(record.rows) + 'x' +
+                                    str(record.cols) + ' ' + record.rules + ' and ' + str(board[0]) + 'x' +
+                                    str(board[1]) + ' ' + board[2])
+            games += len(chunk)
+            pending.append(pool.apply_async(replay_games, (chunk,)))
+            if len(pending) >= 2 * processes:  # the inputs are read only as fast as the games are replayed
+                collect()
+        while len(pending) > 0:
+            collect()
+
+    if writer is None:
+        raise Exception('there are no games in the inputs')
+    if invalid > 0:
+        logging.warning(str(invalid) + ' games were skipped because they are undecided or contain illegal moves')
+    return writer.close({'rules': str(GameRules.from_string(board[2])).lower(), 'games': games, 'invalid_games': invalid,
+                         'inputs': [os.path.abspath(path) for path in inputs]})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exports positions from finished games as sharded NumPy arrays.')
+    parser.add_argument('inputs', nargs='+', help='tournament directories, PGN, games.txt or psq files')
+    parser.add_argument('--output', required=True, help='directory for the shards')
+    parser.add_argument('--shard-size', type=int, default=1000000, help='number of samples in a shard')
+    parser.add_argument('--augment', action='store_true', help='write all rotated and mirrored copies of samples')
+    parser.add_argument('--keep-duplicates', action='store_true')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--rules', default='freestyle', help='rules of games from psq files')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO if args.verbose else logging.WARNING)
+    manifest = export(args.inputs, args.output, args.shard_size, args.augment, not args.keep_duplicates,
+                      args.processes, args.rules)
+    print('exported ' + str(manifest['samples']) + ' samples from ' + str(manifest['games']) + ' games (' +
+          str(manifest['invalid_games']) + ' skipped, ' + str(manifest['duplicates']) + ' duplicates) in ' +
+          str(len(manifest['shards'])) + ' shards to ' + args.output)
+    exit(0)
@@ -0,0 +1,123 @@
+import multiprocessing
+import logging
+import time
+import math
+from queue import Empty
+from game_rules import Move
+from EventBus import GameStarted, MoveMade, ClockUpdate, EvalUpdated
+
+
+class _GameView:
+    def __init__(self, renderer, name1: str, name2: str):
+        self.renderer = renderer
+        self.players = []
+        for name in [name1, name2]:
+            self.players.append({'name': name, 'time_left': 0.0, 'stamp': time.time(), 'sign': 0, 'on_move': False,
+                                 'memory': 0.0, 'depth': '?', 'score': '?', 'nodes': '?', 'speed': '?'})
+
+    def apply(self, event: tuple) -> None:
+        if isinstance(event, MoveMade):
+            self.renderer.draw_moves([Move(event.row, event.col, event.sign)])
+        elif isinstance(event, ClockUpdate):
+            player = self.players[event.player]
+            player['time_left'] = event.time_left
+            player['stamp'] = time.time()
+            player['on_move'] = event.on_move
+            player['sign'] = event.sign
+        elif isinstance(event, EvalUpdated):
+            player = self.players[event.player]
+            player['memory'], player['depth'], player['score'], player['nodes'], player['speed'] = event[2:7]
+
+    def draw(self) -> None:
+        now = time.time()
+        summaries = []
+        for player in self.players:
+            tmp = dict(player)
+            if player['on_move']:  # clock is extrapolated locally, so there is no need to send it continuously
+                tmp['time_left'] -= now - player['stamp']
+            summaries.append(tmp)
+        self.renderer.draw_players(summaries[0], summaries[1])
+
+
+def _run_visualiser(queue: multiprocessing.Queue, size: int, fps: float) -> None:
+    import numpy as np
+    import cv2
+    from Renderer import BoardRenderer
+
+    views = {}
+    canvas = None
+    next_frame = time.time()
+    while True:
+        try:
+            event = queue.get(timeout=max(0.0, next_frame - time.time()))
+        except Empty:  # time to render a frame
+            event = ()
+        if event is None:
+            break
+        if len(event) > 0:
+            if isinstance(event, GameStarted):
+                views[event.slot] = _GameView(BoardRenderer(event.rows, event.cols, size), event.name1, event.name2)
+            elif event.slot in views:
+                views[event.slot].apply(event)
+            if time.time() < next_frame:
+                continue
+        next_frame = time.time() + 1.0 / fps
+
+        if len(views) == 0:
+            continue
+        for view in views.values():
+            view.draw()
+
+        '''arrange boards in a grid that is as close to a square as possible'''
+        frames = [views[slot].renderer.get_frame() for slot in sorted(views.keys())]
+        columns = int(math.ceil(math.sqrt(len(frames))))
+        height = max(f.shape[0] for f in frames)
+        width = max(f.shape[1] for f in frames)
+        shape = (height * int(math.ceil(len(frames) / columns)), width * columns, 3)
+        if canvas is None or canvas.shape != shape:
+            canvas = np.zeros(shape, dtype=np.uint8)
+        for i, f in enumerate(frames):
+            x0 = (i // columns) * height
+            y0 = (i % columns) * width
+            canvas[x0:x0 + f.shape[0], y0:y0 + f.shape[1], :] = f
+        cv2.imshow('preview', canvas)
+        cv2.waitKey(1)
+    cv2.destroyAllWindows()
+
+
+class Visualiser:
+    """
+    Renders all games in a separate process, so that drawing does not compete with the judge for the GIL.
+    It subscribes to the EVENT_TYPES on the event bus, and passes them to the rendering process.
+    """
+    EVENT_TYPES = (GameStarted, MoveMade, ClockUpdate, EvalUpdated)  # all of them carry the slot of the game
+
+    def __init__(self, size: int = 30, fps: float = 10.0):
+        context = multiprocessing.get_context('spawn')  # do not inherit engine pipes and threads
+        self._queue = context.Queue()
+        self._process = context.Process(target=_run_visualiser, args=(self._queue, size, fps), daemon=True)
+        self._process.start()
+        logging.info('started visualiser process ' + str(self._process.pid))
+
+    def get_queue(self) -> multiprocessing.Queue:
+        return self._queue
+
+    def publish(self, event: tuple) -> None:
+        """
+        Never blocks, the queue is unbounded and pickling happens in the queue's feeder thread.
+        :param event:
+        :return:
+        """
+        self._queue.put_nowait(event)
+
+    def get_queue_depth(self) -> int:
+        try:
+            return self._queue.qsize()
+        except NotImplementedError:  # on macOS
+            return -1
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._process.join(timeout=5.0)
+        if self._process.is_alive():
+            self._process.terminate()
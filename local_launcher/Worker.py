@@ -0,0 +1,215 @@
+import multiprocessing
+import signal
+import logging
+from queue import Empty
+from threading import Thread, Lock
+from typing import Optional
+from GameConfig import GameConfig
+from EventBus import GAME_EVENTS
+from Journal import get_journal_path
+import Tracing
+
+'''
+Workers talk to the coordinator with tuples sent through a single request queue:
+    ('get', worker_id) - coordinator responds with GameConfig or None
+    ('finish', worker_id, game) - coordinator responds with True once the game is stored
+    ('release', worker_id) - sent after each game returned by 'get', no response
+    ('stop', worker_id) - sent when worker process exits, no response
+Events of the games are sent through a separate queue, and the coordinator publishes them on its event bus.
+'''
+
+
+class _Publisher:
+    def __init__(self, queue: multiprocessing.Queue, listening: multiprocessing.Event):
+        self._queue = queue
+        self._listening = listening
+
+    def publish(self, event: tuple) -> None:
+        if self._listening.is_set():  # otherwise events would be pickled just to be discarded by the coordinator
+            self._queue.put_nowait(event)
+
+
+class RemoteManager:
+    """
+    Used by PlayingThread inside a worker process in place of the Tournament.
+    """
+
+    def __init__(self, worker_id: int, config: dict, requests: multiprocessing.Queue, responses: multiprocessing.Queue,
+                 events: multiprocessing.Queue, listening: multiprocessing.Event):
+        self._worker_id = worker_id
+        self._config = config
+        self._requests = requests
+        self._responses = responses
+        self._event_bus = _Publisher(events, listening)
+
+    def get_config(self) -> dict:
+        return self._config
+
+    def get_event_bus(self) -> _Publisher:
+        return self._event_bus
+
+    def get_journal_path(self, index: int) -> str:
+        return get_journal_path(self._config['working_dir'], index)
+
+    def get_game_to_play(self) -> Optional[GameConfig]:
+        self._requests.put(('get', self._worker_id))
+        return self._responses.get()
+
+    def finish_gamed(self, game: GameConfig) -> None:
+        self._requests.put(('finish', self._worker_id, game))
+        self._responses.get()
+
+    def release_slot(self) -> None:
+        self._requests.put(('release', self._worker_id))
+
+
+def _run_worker(worker_id: int, config: dict, requests: multiprocessing.Queue, responses: multiprocessing.Queue,
+                stop: multiprocessing.Event, events: multiprocessing.Queue, listening: multiprocessing.Event) -> None:
+    from Tournament import PlayingThread  # imported here to avoid circular import
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # interruption is requested by the coordinator
+    thread = PlayingThread(RemoteManager(worker_id, config, requests, responses, events, listening), worker_id)
+    thread.start()
+    while thread.is_alive():
+        if stop.wait(0.5):
+            thread.cleanup()
+            break
+    thread.join()
+    if Tracing.is_enabled():
+        Tracing.write_trace(config['working_dir'] + '/trace_worker_' + str(worker_id) + '.json', Tracing.take_all_events())
+    requests.put(('stop', worker_id))
+
+
+class WorkerProcess:
+    """
+    Coordinator-side handle of a worker process, with the same interface that Tournament uses for PlayingThread.
+    """
+
+    def __init__(self, pool, worker_id: int):
+        self._stop = pool.context.Event()
+        self._process = pool.context.Process(target=_run_worker,
+                                             args=(worker_id, pool.config, pool.requests, pool.responses[worker_id],
+                                                   self._stop, pool.events, pool.listening))
+
+    def start(self) -> None:
+        self._process.start()
+
+    def cleanup(self) -> None:
+        if self._process.is_alive():  # setting the event blocks if a killed process was waiting on it
+            self._stop.set()
+
+    def is_alive(self) -> bool:
+        return self._process.is_alive()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        self._process.join(timeout)
+
+
+class WorkerPool:
+    """
+    Runs each game in a separate process, so that judging of parallel games does not contend for a single GIL.
+    Worker processes only exchange GameConfig objects with the coordinator, which keeps all the bookkeeping.
+    """
+
+    def __init__(self, manager):
+        self.context = multiprocessing.get_context('spawn')  # do not inherit engine pipes and threads
+        self.config = manager.get_config()
+        self.requests = self.context.Queue()
+        self.responses = {}
+        self.events = self.context.Queue()
+        self.listening = self.context.Event()  # set while someone subscribed to events of the games
+        self._manager = manager
+        self._workers = {}  # worker_id -> WorkerProcess
+        self._claimed = set()  # ids of workers that hold a slot of the manager
+        self._claimed_lock = Lock()
+        self._dispatcher = Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        self._forwarder = Thread(target=self._forward_events, daemon=True)
+        self._forwarder.start()
+
+    def create_worker(self, worker_id: int) -> WorkerProcess:
+        self._release_slot(worker_id)  # previous worker with this id is dead, see Tournament._change_parallelism
+        self.responses[worker_id] = self.context.Queue()
+        self._workers[worker_id] = WorkerProcess(self, worker_id)
+        return self._workers[worker_id]
+
+    def _release_slot(self, worker_id: int) -> None:
+        with self._claimed_lock:
+            if worker_id not in self._claimed:
+                return
+            self._claimed.discard(worker_id)
+        self._manager.release_slot()
+
+    def _release_dead_workers(self) -> None:
+        """
+        Slot of a worker process that died while playing a game would never be released by the worker itself.
+        :return:
+        """
+        with self._claimed_lock:
+            dead = [i for i in self._claimed if not self._workers[i].is_alive()]
+        for worker_id in dead:
+            logging.warning('worker ' + str(worker_id) + ' died while playing a game')
+            self._release_slot(worker_id)
+
+    def _dispatch(self) -> None:
+        while True:
+            try:
+                request = self.requests.get(timeout=1.0)
+            except Empty:
+                self._release_dead_workers()
+                continue
+            if request is None:
+                break
+            if request[0] == 'release':
+                self._release_slot(request[1])
+            elif request[0] == 'stop':
+                logging.info('worker ' + str(request[1]) + ' has stopped')
+            elif request[0] == 'get':  # may wait for a slot shared with other tournaments, so it must not block the others
+                Thread(target=self._process, args=(request,), daemon=True).start()
+            else:
+                self._process(request)
+
+    def _process(self, request: tuple) -> None:
+        response = None
+        try:
+            if request[0] == 'get':
+                response = self._manager.get_game_to_play()
+                if response is not None:
+                    with self._claimed_lock:
+                        self._claimed.add(request[1])
+            elif request[0] == 'finish':
+                self._manager.finish_gamed(request[2])
+                response = True
+        except Exception as e:
+            logging.error(str(e))
+        self.responses[request[1]].put(response)  # worker is always waiting for the response
+
+    def _forward_events(self) -> None:
+        event_bus = self._manager.get_event_bus()
+        while True:
+            if any(event_bus.wants(t) for t in GAME_EVENTS):
+                self.listening.set()
+            else:
+                self.listening.clear()
+            try:
+                event = self.events.get(timeout=1.0)
+            except Empty:
+                continue
+            if event is None:
+                break
+            event_bus.publish(event)
+
+    def get_queue_depth(self) -> int:
+        """
+        :return: number of requests of the workers waiting for the dispatcher, or -1 if it can't be measured
+        """
+        try:
+            return self.requests.qsize()
+        except NotImplementedError:  # on macOS
+            return -1
+
+    def close(self) -> None:
+        self.requests.put(None)
+        self._dispatcher.join()
+        self.events.put(None)
+        self._forwarder.join()
@@ -0,0 +1,124 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import statistics
+import subprocess
+from threading import Event
+
+'''
+Measures how long it takes from starting the interpreter to the first move of an engine, using the engines and
+openings of an existing tournament. Each run is a fresh interpreter with a temporary copy of the tournament,
+so the state of the tournament is not touched. All times are in seconds since the interpreter was launched:
+    interpreter - the script starts running
+    imports - Tournament and its dependencies are imported
+    setup - Tournament is created (config, game store, openings)
+    engines_ready - both engines answered START
+    first_move - the first move made by an engine (not from the opening) is on the board
+'''
+
+_STAGES = ['interpreter', 'imports', 'setup', 'engines_ready', 'first_move']
+
+
+def _prepare_copy(working_dir: str) -> str:
+    with open(os.path.join(working_dir, 'config.json'), 'r') as file:
+        config = json.loads(file.read())
+    config['games_in_parallel'] = 1
+    config['visualise'] = False
+    for key in ['metrics_port', 'broadcast_port', 'control_port']:
+        config.pop(key, None)
+    if 'adaptive_parallelism' in config:
+        config['adaptive_parallelism']['enabled'] = False
+
+    result = tempfile.mkdtemp(prefix='benchmark_startup_')
+    openings = config.get('openings', '')
+    if openings != 'swap2' and os.path.exists(os.path.join(working_dir, openings)):
+        shutil.copy(os.path.join(working_dir, openings), result)
+    with open(os.path.join(result, 'config.json'), 'w') as file:
+        file.write(json.dumps(config, indent=4))
+    return os.path.join(result, '')
+
+
+def _run_child(working_dir: str, launched: float) -> None:
+    started = time.time()
+    from Tournament import Tournament  # importing is a part of what is measured
+    from EventBus import GameStarted, ClockUpdate, MoveMade
+    imported = time.time()
+
+    tournament = Tournament(working_dir)
+    created = time.time()
+    times = {}
+    done = Event()
+
+    def on_event(event: tuple) -> None:
+        '''opening moves are made without any player being on move'''
+        if isinstance(event, GameStarted):
+            times['engines_ready'] = time.time()
+        elif isinstance(event, ClockUpdate) and event.on_move and 'engines_ready' in times:
+            times['thinking'] = time.time()
+        elif isinstance(event, MoveMade) and 'thinking' in times and not done.is_set():
+            times['first_move'] = time.time()
+            done.set()
+
+    tournament.get_event_bus().subscribe_callback(on_event, (GameStarted, ClockUpdate, MoveMade))
+    tournament.start()
+    done.wait(120.0)
+    result = {'interpreter': started - launched, 'imports': imported - launched, 'setup': created - launched,
+              'engines_ready': times.get('engines_ready', float('nan')) - launched,
+              'first_move': times.get('first_move', float('nan')) - launched,
+              'cv2_loaded': 'cv2' in sys.modules}
+    tournament.stop()
+    tournament.cleanup()
+    print('RESULT ' + json.dumps(result))
+
+
+def run_benchmark(working_dir: str, runs: int) -> dict:
+    """
+    :param working_dir: tournament whose engines and openings are used
+    :param runs: number of fresh interpreters to start
+    :return: median of every stage, and whether cv2 was loaded in any run
+    """
+    samples = []
+    for i in range(runs):
+        copy = _prepare_copy(working_dir)
+        try:
+            launched = time.time()
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', copy, repr(launched)],
+                                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    check=True).stdout.decode('utf-8')
+        finally:
+            shutil.rmtree(copy, ignore_errors=True)
+        lines = [line for line in output.splitlines() if line.startswith('RESULT ')]
+        if len(lines) == 0:
+            raise Exception('run ' + str(i) + ' did not report any result')
+        samples.append(json.loads(lines[-1][7:]))
+
+    result = {stage: statistics.median(s[stage] for s in samples) for stage in _STAGES}
+    result['cv2_loaded'] = any(s['cv2_loaded'] for s in samples)
+    result['runs'] = runs
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures latency from interpreter start to the first move.')
+    parser.add_argument('working_dir', help='directory with config.json of a tournament, it is not modified')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print the result as a single JSON line, for tracking')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('launched', nargs='?', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _run_child(args.working_dir, args.launched)
+        exit(0)
+    result = run_benchmark(args.working_dir, args.runs)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print('median of ' + str(args.runs) + ' runs, in seconds since the interpreter was launched:')
+        for stage in _STAGES:
+            print('    ' + stage.ljust(16) + str(round(result[stage], 3)))
+        print('cv2 was loaded' if result['cv2_loaded'] else 'cv2 was not loaded')
@@ -0,0 +1,113 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import contextlib
+from threading import Lock
+from Tournament import Tournament
+from EventBus import GameFinished
+
+'''
+Measures throughput of the judge by playing tournaments between two instances of mock_engine.py, for several values
+of games_in_parallel. Reported for each of them:
+    games/s, moves/s
+    judge ms/move - time between receiving a move and sending the next request (mean and 99th percentile)
+    overhead/game - time of a playing slot that was not spent by the engines thinking, per game (starting and
+                    stopping engines, opening, storing the result), pause_between_games is set to 0
+'''
+
+
+def _create_tournament(games: int, games_in_parallel: int, args: argparse.Namespace) -> str:
+    working_dir = tempfile.mkdtemp(prefix='benchmark_throughput_')
+    engine = sys.executable + ' ' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_engine.py')
+    engine += ' --think ' + str(args.think) + ' --messages ' + str(args.messages)
+
+    def player(name: str, seed: int) -> dict:
+        return {'command': engine + ' --name ' + name + ' --seed ' + str(seed),
+                'name': name,
+                'timeout_turn': 5.0 + args.think,
+                'timeout_match': 10000.0,
+                'max_memory': 1024,
+                'folder': working_dir,
+                'allow_pondering': False,
+                'tolerance': 1.0,
+                'working_dir': working_dir}
+
+    config = {'games_to_play': games,
+              'games_in_parallel': games_in_parallel,
+              'worker_mode': args.mode,
+              'openings': 'openings.txt',
+              'visualise': False,
+              'pause_between_games': 0.0,
+              'game_config': {'rows': args.size, 'cols': args.size, 'rules': 'freestyle'},
+              'player_1': player('mock1', 1),
+              'player_2': player('mock2', 2)}
+    with open(os.path.join(working_dir, 'config.json'), 'w') as file:
+        file.write(json.dumps(config, indent=4))
+    with open(os.path.join(working_dir, 'openings.txt'), 'w') as file:
+        for i in range(games):
+            file.write(str(i % args.size) + ',' + str((3 * i) % args.size) + '\n')
+    return os.path.join(working_dir, '')
+
+
+def measure(games: int, games_in_parallel: int, args: argparse.Namespace) -> dict:
+    working_dir = _create_tournament(games, games_in_parallel, args)
+    lock = Lock()
+    finished = []
+
+    def on_finished(event: GameFinished) -> None:
+        with lock:
+            finished.append(event.game)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):  # summaries of the tournament are not interesting here
+            tournament = Tournament(working_dir)
+            tournament.get_event_bus().subscribe_callback(on_finished, (GameFinished,))
+            start = time.perf_counter()
+            tournament.start()
+            while tournament.is_running():
+                time.sleep(0.05)
+            wall = time.perf_counter() - start
+            tournament.cleanup()
+    finally:
+        shutil.rmtree(working_dir, ignore_errors=True)
+
+    judge_times = sorted(t for game in finished for t in game.judge_times)
+    think_time = sum(t for game in finished for times in game.think_times for t in times)
+    moves = max(1, len(judge_times))
+    return {'games_in_parallel': games_in_parallel,
+            'games': len(finished),
+            'wall': wall,
+            'games_per_second': len(finished) / wall,
+            'moves_per_second': len(judge_times) / wall,
+            'judge_ms_per_move': 1000.0 * sum(judge_times) / moves,
+            'judge_ms_p99': 1000.0 * judge_times[int(0.99 * (len(judge_times) - 1))] if len(judge_times) > 0 else 0.0,
+            'overhead_per_game': (wall * games_in_parallel - think_time) / max(1, len(finished))}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures throughput of the judge using mock engines.')
+    parser.add_argument('--parallel', type=int, nargs='+', default=[1, 2, 4], help='values of games_in_parallel to test')
+    parser.add_argument('--games', type=int, default=8, help='games played for each value of games_in_parallel')
+    parser.add_argument('--think', type=float, default=0.0, help='think time of the mock engines per move, in seconds')
+    parser.add_argument('--messages', type=int, default=1, help='MESSAGE lines sent by the mock engines per move')
+    parser.add_argument('--size', type=int, default=15, help='size of the board')
+    parser.add_argument('--mode', default='thread', choices=['thread', 'process'], help='worker_mode of the tournament')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    args = parser.parse_args()
+
+    if not args.json:
+        print('parallel   games/s   moves/s   judge ms/move (p99)   overhead/game [s]')
+    for games_in_parallel in args.parallel:
+        result = measure(args.games, games_in_parallel, args)
+        if args.json:
+            print(json.dumps(result))
+        else:
+            print(str(games_in_parallel).rjust(8) + str(round(result['games_per_second'], 3)).rjust(10) +
+                  str(round(result['moves_per_second'], 1)).rjust(10) +
+                  (str(round(result['judge_ms_per_move'], 3)) + ' (' + str(round(result['judge_ms_p99'], 3)) + ')').rjust(22) +
+                  str(round(result['overhead_per_game'], 3)).rjust(20))
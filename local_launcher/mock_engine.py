@@ -0,0 +1,137 @@
+import sys
+import time
+import random
+import argparse
+
+'''
+Deterministic engine speaking the Gomocup protocol, used to measure the judge itself (see benchmark_throughput.py).
+Moves are random but reproducible - they depend only on the seed and on the commands received.
+Faults can be injected to test how the judge handles misbehaving engines.
+Example of a command in tournament config:
+    "command": "python mock_engine.py --think 0.01 --messages 5 --seed 1"
+'''
+
+
+class MockEngine:
+    def __init__(self, args: argparse.Namespace):
+        self._args = args
+        self._random = random.Random(args.seed)
+        self._width = 20
+        self._height = 20
+        self._occupied = set()  # (x, y)
+        self._moves_made = 0
+        self._ballast = None
+
+    def _write(self, text: str) -> None:
+        sys.stdout.write(text + '\n')
+        sys.stdout.flush()
+
+    def _allocate_ballast(self) -> None:
+        if self._args.memory > 0 and self._ballast is None:
+            self._ballast = bytearray(self._args.memory * 1024 * 1024)
+            for i in range(0, len(self._ballast), 4096):  # touch every page, so that it is really resident
+                self._ballast[i] = 1
+
+    def _reset(self, width: int, height: int) -> None:
+        self._width = width
+        self._height = height
+        self._occupied.clear()
+        self._allocate_ballast()
+        self._write('OK')
+
+    def _random_move(self) -> (int, int):
+        if len(self._occupied) >= self._width * self._height:
+            raise Exception('board is full')
+        while True:
+            move = (self._random.randrange(self._width), self._random.randrange(self._height))
+            if move not in self._occupied:
+                self._occupied.add(move)
+                return move
+
+    def _think(self) -> None:
+        self._moves_made += 1
+        if 0 < self._args.crash_after < self._moves_made:
+            sys.exit(1)
+        if 0 < self._args.timeout_after < self._moves_made:
+            while True:  # until the judge kills the process
+                time.sleep(1.0)
+        for i in range(self._args.messages):
+            if self._args.think > 0:
+                time.sleep(self._args.think / (self._args.messages + 1))
+            self._write('MESSAGE depth ' + str(i + 1) + ' ev ' + str(self._random.randint(-100, 100)) + ' n ' + str(1000 * (i + 1)) + ' tm ' + str(i))
+        if self._args.think > 0:
+            time.sleep(self._args.think / (self._args.messages + 1))
+
+    def _move(self) -> None:
+        self._think()
+        x, y = self._random_move()
+        self._write(str(x) + ',' + str(y))
+
+    def _read_moves(self) -> list:
+        """
+        Reads lines 'x,y' (SWAP2BOARD) or 'x,y,who' (BOARD) until DONE.
+        """
+        result = []
+        for line in sys.stdin:
+            line = line.strip()
+            if line.upper() == 'DONE':
+                break
+            tmp = line.split(',')
+            result.append((int(tmp[0]), int(tmp[1])))
+        return result
+
+    def _swap2board(self) -> None:
+        moves = self._read_moves()
+        self._occupied.update(moves)
+        self._think()
+        if len(moves) == 0:
+            self._write(' '.join(str(x) + ',' + str(y) for x, y in [self._random_move() for _ in range(3)]))
+        elif self._random.random() < 0.5:
+            self._write('SWAP')
+        else:
+            x, y = self._random_move()
+            self._write(str(x) + ',' + str(y))
+
+    def run(self) -> None:
+        for line in sys.stdin:
+            line = line.strip()
+            command = line.split(' ')[0].upper()
+            if command == 'START':
+                size = int(line.split(' ')[1])
+                self._reset(size, size)
+            elif command == 'RECTSTART':
+                width, height = line.split(' ')[1].split(',')
+                self._reset(int(width), int(height))
+            elif command == 'RESTART':
+                self._reset(self._width, self._height)
+            elif command == 'ABOUT':
+                self._write('name="' + self._args.name + '", version="1.0", author="judge benchmark"')
+            elif command == 'INFO':
+                pass
+            elif command == 'BEGIN':
+                self._move()
+            elif command == 'BOARD':
+                self._occupied = set(self._read_moves())
+                self._move()
+            elif command == 'TURN':
+                x, y = line.split(' ')[1].split(',')
+                self._occupied.add((int(x), int(y)))
+                self._move()
+            elif command == 'SWAP2BOARD':
+                self._swap2board()
+            elif command == 'END':
+                break
+            elif len(command) > 0:
+                self._write('UNKNOWN ' + line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deterministic Gomocup engine for testing and benchmarking the judge.')
+    parser.add_argument('--name', default='mock')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--think', type=float, default=0.0, help='time spent on every move, in seconds')
+    parser.add_argument('--messages', type=int, default=1, help='number of MESSAGE lines sent with every move')
+    parser.add_argument('--memory', type=int, default=0, help='memory ballast allocated on start, in MB')
+    parser.add_argument('--crash-after', type=int, default=0, help='exit without answering after that many moves')
+    parser.add_argument('--timeout-after', type=int, default=0, help='stop answering after that many moves')
+    MockEngine(parser.parse_args()).run()
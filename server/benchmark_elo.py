@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import shutil
+import random
+import argparse
+import tempfile
+import subprocess
+import bradley_terry
+'''
+Measures the time of updating ratings after a match, as done by Tournament.compute_elo, on a random tournament:
+    mm cold - fit starting from zero ratings
+    mm warm - fit starting from the ratings before the match
+    exactdist, los - confidence intervals and likelihood of superiority
+    bayeselo - round trip through bayeselo (writing the PGN, running it, reading ratings.txt), if --bayeselo is given
+'''
+
+
+def random_tournament(nengines, ngames, draw_ratio, seed):
+    '''
+    :return: list of (player1, player2, result), result is 1 if player1 wins, 2 if player2 wins, 3 for a draw
+    '''
+    generator = random.Random(seed)
+    strengths = [generator.gauss(0, 200) for i in range(nengines)]
+    games = []
+    for k in range(ngames):
+        player1, player2 = generator.sample(range(nengines), 2)
+        expected = 1 / (1 + 10**((strengths[player2] - strengths[player1]) / 400.0))
+        r = generator.random()
+        if r < draw_ratio:
+            result = 3
+        elif r < draw_ratio + (1 - draw_ratio) * expected:
+            result = 1
+        else:
+            result = 2
+        games.append((player1, player2, result))
+    return games
+
+
+def add_game(mresult, game):
+    player1, player2, result = game
+    if result == 1:
+        mresult[player1][player2][0] += 1
+        mresult[player2][player1][1] += 1
+    elif result == 2:
+        mresult[player1][player2][1] += 1
+        mresult[player2][player1][0] += 1
+    else:
+        mresult[player1][player2][2] += 1
+        mresult[player2][player1][2] += 1
+
+
+def write_pgn(file_name, games):
+    fout = open(file_name, 'w')
+    for player1, player2, result in games:
+        cur_result = {1: "1-0", 2: "0-1", 3: "1/2-1/2"}[result]
+        fout.write("[White \"" + str(player1) + "#E" + str(player1) + "\"]\n")
+        fout.write("[Black \"" + str(player2) + "#E" + str(player2) + "\"]\n")
+        fout.write("[Result \"" + cur_result + "\"]\n\n1. d4 d5 " + cur_result + "\n\n")
+    fout.close()
+
+
+def run_bayeselo(bayeselo, directory):
+    '''
+    Runs bayeselo with the commands the server used to send, writes ratings.txt and los.txt into directory.
+    '''
+    p = subprocess.Popen([bayeselo], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL, universal_newlines=True)
+    p.communicate("readpgn " + os.path.join(directory, "result.pgn") + "\nelo\noffset 1600\nmm\nexactdist\n" +
+                  "ratings >" + os.path.join(directory, "ratings.txt") + "\n" +
+                  "los 0 200 4 >" + os.path.join(directory, "los.txt") + "\nx\nx\n")
+
+
+def measure(args):
+    games = random_tournament(args.engines, args.games, args.draws, args.seed)
+    mresult = [[[0, 0, 0] for i in range(args.engines)] for j in range(args.engines)]
+    for game in games[:-args.updates]:
+        add_game(mresult, game)
+    valids = [True for i in range(args.engines)]
+    players, wins, draws = bradley_terry.condense(mresult, valids)
+    bt = bradley_terry.BradleyTerry(wins, draws)
+    bt.minorization_maximization()
+    elos = dict(zip(players, bt.elos))
+
+    timings = {'cold': [], 'warm': [], 'exactdist': [], 'los': [], 'bayeselo': []}
+    iterations = {'cold': [], 'warm': []}
+    directory = tempfile.mkdtemp(prefix='benchmark_elo_')
+    for k in range(len(games) - args.updates, len(games)):
+        add_game(mresult, games[k])
+        players, wins, draws = bradley_terry.condense(mresult, valids)
+        for mode in ['cold', 'warm']:
+            bt = bradley_terry.BradleyTerry(wins, draws)
+            start = time.perf_counter()
+            if mode == 'cold':
+                bt.minorization_maximization()
+            else:
+                bt.minorization_maximization([elos.get(i, 0.0) for i in players])
+            timings[mode].append(time.perf_counter() - start)
+            iterations[mode].append(bt.iterations)
+        elos = dict(zip(players, bt.elos))
+        start = time.perf_counter()
+        bt.exact_intervals()
+        timings['exactdist'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        bt.likelihood_of_superiority()
+        timings['los'].append(time.perf_counter() - start)
+        if args.bayeselo:
+            start = time.perf_counter()
+            write_pgn(os.path.join(directory, "result.pgn"), games[:k + 1])
+            run_bayeselo(args.bayeselo, directory)
+            fin = open(os.path.join(directory, "ratings.txt"), 'r')
+            fin.read()
+            fin.close()
+            timings['bayeselo'].append(time.perf_counter() - start)
+    shutil.rmtree(directory, ignore_errors=True)
+
+    print('engines: ' + str(args.engines) + ', games: ' + str(args.games) + ', updates: ' + str(args.updates))
+    for name in ['cold', 'warm', 'exactdist', 'los', 'bayeselo']:
+        if len(timings[name]) == 0:
+            continue
+        line = name.ljust(10) + str(round(1000.0 * sum(timings[name]) / len(timings[name]), 3)).rjust(10) + ' ms'
+        if name in iterations:
+            line += ', ' + str(round(sum(iterations[name]) * 1.0 / len(iterations[name]), 1)) + ' iterations'
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measures the time of rating updates.')
+    parser.add_argument('--engines', type=int, default=40, help='number of engines')
+    parser.add_argument('--games', type=int, default=10000, help='number of games')
+    parser.add_argument('--draws', type=float, default=0.1, help='ratio of draws')
+    parser.add_argument('--updates', type=int, default=20, help='number of measured updates, one game each')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--bayeselo', default=None, help='path of bayeselo, to compare with the round trip')
+    args = parser.parse_args()
+    if args.updates < 1 or args.updates >= args.games:
+        print('--updates must be between 1 and --games')
+        sys.exit(-1)
+    measure(args)
@@ -0,0 +1,252 @@
+import math
+import numpy as np
+'''
+Bradley-Terry model with draws, fitted by the minorization-maximization algorithm, it follows CBradleyTerry and
+CEloRatingCUI from BayesElo with the commands used by the server: mm (advantage and drawelo are not fitted),
+exactdist and los. Colours are not recorded in the results, the advantage of playing first is therefore 0, which
+is also the default of the bundled BayesElo.
+'''
+
+DRAW_ELO = 0.01
+PRIOR = 2.0  # number of virtual draws
+CONFIDENCE = 0.95
+ELO_MIN = -1500.0
+ELO_MAX = 1500.0
+RESOLUTION = 1001
+
+
+def condense(mresult, valids):
+    '''
+    Returns the players (valid engines that played against another valid engine), wins[i][j] of players[i] against
+    players[j] and draws between them.
+    Only the upper triangle of mresult is read, the result of a match added meanwhile is then either complete or
+    missing.
+    '''
+    results = np.array(mresult, dtype=np.float64).reshape(len(valids), len(valids), 3)
+    valid = np.array(valids, dtype=bool)
+    upper = np.triu(np.ones((len(valids), len(valids)), dtype=bool), 1) & valid[:, None] & valid[None, :]
+    wins = np.where(upper, results[:, :, 0], 0.0) + np.where(upper, results[:, :, 1], 0.0).T
+    draws = np.where(upper, results[:, :, 2], 0.0)
+    draws = draws + draws.T
+    players = np.nonzero((wins + wins.T + draws).sum(axis=1) > 0)[0]
+    return [int(i) for i in players], wins[np.ix_(players, players)], draws[np.ix_(players, players)]
+
+
+def round_elo(x):
+    if x > 0:
+        return int(x + 0.5)
+    else:
+        return int(x - 0.5)
+
+
+def value_from_index(i):
+    return ELO_MIN + ((i + 0.5) * (ELO_MAX - ELO_MIN)) / RESOLUTION
+
+
+def bound_value(distribution, confidence, begin, end, direction):
+    '''
+    Same as CCDistribution::GetBoundValue, linear interpolation of the cumulated distribution.
+    '''
+    threshold = (1 - confidence) / 2
+    indices = np.arange(begin, end, direction)
+    probabilities = distribution[indices]
+    cumulated = np.cumsum(probabilities) - probabilities / 2
+    reached = np.nonzero(cumulated >= threshold)[0]
+    if len(reached) == 0:
+        return value_from_index(end - direction)
+    k = reached[0]
+    previous = cumulated[k - 1] if k > 0 else 0.0
+    value = value_from_index(indices[k] - direction)
+    new_value = value_from_index(indices[k])
+    return value + (new_value - value) * (threshold - previous) / (cumulated[k] - previous)
+
+
+class BradleyTerry:
+    def __init__(self, wins, draws, prior=PRIOR, draw_elo=DRAW_ELO):
+        '''
+        :param wins: wins[i][j] - wins of player i against player j
+        :param draws: draws[i][j] - draws between players i and j, symmetric
+        :param prior: virtual draws of each player, distributed among its opponents like in
+                      CCondensedResults::AddPrior
+        '''
+        self.wins = np.array(wins, dtype=np.float64)
+        self.draws = np.array(draws, dtype=np.float64)
+        self.games = self.wins + self.wins.T + self.draws
+        self.nplayers = len(self.games)
+        total_games = self.games.sum(axis=1)
+        '''draws including the prior, they are used for fitting, raw results are used for the tables'''
+        self.prior_draws = self.draws + prior * 0.5 * self.games * (
+            1.0 / total_games[:, None] + 1.0 / total_games[None, :])
+        self.draw_elo = draw_elo
+        self.theta_d = 10**(draw_elo / 400.0)
+        self.elos = np.zeros(self.nplayers)
+        self.iterations = 0
+
+    def minorization_maximization(self, elos=None, epsilon=1e-7, max_iterations=10000):
+        '''
+        :param elos: ratings to start from, e.g. the ratings before the last results were added, zeros if None
+        :return: number of iterations
+        '''
+        if elos is None:
+            gammas = np.ones(self.nplayers)
+        else:
+            gammas = 10**(np.array(elos, dtype=np.float64) / 400.0)
+        theta_d = self.theta_d
+        wins_draws = self.wins + self.prior_draws
+        losses_draws = self.wins.T + self.prior_draws
+        numerator = wins_draws.sum(axis=1)
+        for iteration in range(max_iterations):
+            gamma_i = gammas[:, None]
+            gamma_j = gammas[None, :]
+            denominator = (wins_draws / (gamma_i + theta_d * gamma_j) + losses_draws * theta_d /
+                           (theta_d * gamma_i + gamma_j)).sum(axis=1)
+            next_gammas = numerator / denominator
+            next_gammas /= np.exp(np.log(next_gammas).mean())
+            difference = (np.abs(next_gammas - gammas) / (next_gammas + gammas)).max()
+            gammas = next_gammas
+            if difference < epsilon:
+                break
+        self.iterations = iteration + 1
+        self.elos = np.log10(gammas) * 400
+        self.elos -= self.elos.mean()
+        return self.iterations
+
+    def elo_scale(self):
+        x = 10**(-self.draw_elo / 400.0)
+        return x * 4.0 / ((1 + x) * (1 + x))
+
+    def player_log_likelihoods(self, player, values):
+        '''
+        Log-likelihood of the results of a player for each of its ratings in values, the ratings of the others are
+        moved in the opposite direction to keep the mean, like in CBradleyTerry::GetPlayerDist.
+        '''
+        opponents = np.nonzero(self.games[player] > 0)[0]
+        shift = (values - self.elos[player]) / (self.nplayers - 1) if self.nplayers > 1 else 0.0 * values
+        gammas = 10**((values[:, None] + shift[:, None] - self.elos[None, opponents]) / 400.0)
+        win = gammas / (gammas + self.theta_d)
+        loss = 1 / (1 + self.theta_d * gammas)
+        draw = 1 - win - loss
+        result = np.zeros(len(values))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for counts, probabilities in ((self.wins[player, opponents], win),
+                                          (self.prior_draws[player, opponents], draw),
+                                          (self.wins[opponents, player], loss)):
+                terms = counts[None, :] * np.log(np.maximum(probabilities, 0.0))
+                result += np.where(counts[None, :] > 0, terms, 0.0).sum(axis=1)
+        return result
+
+    def player_distribution(self, player, cutoff=50.0, chunk=64):
+        '''
+        Likelihood distribution of the rating of a player on the grid of exactdist.
+        The log-likelihood is concave, it is computed from the rating of the player in both directions only until it
+        is cutoff below its maximum, the rest of the grid has no influence on the bounds.
+        '''
+        center = min(max(int((self.elos[player] - ELO_MIN) * RESOLUTION / (ELO_MAX - ELO_MIN)), 0), RESOLUTION - 1)
+        begin = max(center - chunk // 2, 0)
+        end = min(center + chunk // 2, RESOLUTION)
+        log_likelihoods = self.player_log_likelihoods(player, value_from_index(np.arange(begin, end)))
+        while True:
+            maximum = log_likelihoods.max()
+            if begin > 0 and log_likelihoods[0] > maximum - cutoff:
+                new_begin = max(begin - chunk, 0)
+                log_likelihoods = np.concatenate(
+                    (self.player_log_likelihoods(player, value_from_index(np.arange(new_begin, begin))),
+                     log_likelihoods))
+                begin = new_begin
+            elif end < RESOLUTION and log_likelihoods[-1] > maximum - cutoff:
+                new_end = min(end + chunk, RESOLUTION)
+                log_likelihoods = np.concatenate(
+                    (log_likelihoods, self.player_log_likelihoods(player, value_from_index(np.arange(end, new_end)))))
+                end = new_end
+            else:
+                break
+        distribution = np.zeros(RESOLUTION)
+        distribution[begin:end] = np.exp(log_likelihoods - maximum)
+        return distribution / distribution.sum()
+
+    def exact_intervals(self, confidence=CONFIDENCE):
+        '''
+        Confidence intervals of the ratings, assuming the ratings of opponents are exact (exactdist of BayesElo).
+        :return: (lower, upper) - distances of the bounds from the ratings
+        '''
+        lower = np.zeros(self.nplayers)
+        upper = np.zeros(self.nplayers)
+        for player in range(self.nplayers):
+            distribution = self.player_distribution(player)
+            lower[player] = self.elos[player] - bound_value(distribution, confidence, 0, RESOLUTION, 1)
+            upper[player] = bound_value(distribution, confidence, RESOLUTION - 1, -1, -1) - self.elos[player]
+        return lower, upper
+
+    def covariance(self):
+        '''
+        Covariance of the ratings, from the Hessian of the log-likelihood at the maximum.
+        '''
+        if self.nplayers < 2:
+            return np.zeros((self.nplayers, self.nplayers))
+        gammas = 10**(self.elos / 400.0)
+        theta_d = self.theta_d
+        gamma_i = gammas[:, None]
+        gamma_j = gammas[None, :]
+        h = (self.wins + self.prior_draws) / (gamma_i + theta_d * gamma_j)**2 + (
+            self.wins.T + self.prior_draws) / (theta_d * gamma_i + gamma_j)**2
+        h *= gamma_i * gamma_j * theta_d * (math.log(10.0) / 400)**2
+        hessian = np.diag(h.sum(axis=1)) - h
+        '''the last rating is fixed to make the Hessian invertible, A maps the others to ratings with zero mean'''
+        a = np.eye(self.nplayers, self.nplayers - 1) - 1.0 / self.nplayers
+        return a.dot(np.linalg.solve(hessian[:-1, :-1], a.T))
+
+    def likelihood_of_superiority(self):
+        '''
+        :return: los[i][j] - probability that player i is stronger than player j
+        '''
+        covariance = self.covariance()
+        variance = np.diag(covariance)
+        sigma2 = variance[:, None] + variance[None, :] - covariance - covariance.T
+        x = (self.elos[None, :] - self.elos[:, None]) / np.sqrt(2 * np.maximum(sigma2, 1e-300))
+        los = np.vectorize(math.erfc)(x) / 2
+        np.fill_diagonal(los, 0.0)
+        return los
+
+    def order(self):
+        return [int(i) for i in np.argsort(-self.elos, kind='stable')]
+
+
+def write_ratings(file_name, names, bt, lower, upper, offset):
+    '''
+    Writes the table in the format of the ratings command of BayesElo.
+    '''
+    scale = bt.elo_scale()
+    width = max(4, max(len(name) for name in names))
+    games = bt.games.sum(axis=1)
+    scores = bt.wins.sum(axis=1) + bt.draws.sum(axis=1) * 0.5
+    opponents = bt.games.dot(bt.elos) / games
+    fout = open(file_name, 'w')
+    fout.write('Rank ' + 'Name'.ljust(width) + '   Elo    +    - games score oppo. draws \n')
+    for rank, i in enumerate(bt.order()):
+        fout.write(str(rank + 1).rjust(4) + ' ' + names[i].ljust(width) + ' ' +
+                   str(round_elo(scale * bt.elos[i] + offset)).rjust(5) + ' ' +
+                   str(round_elo(scale * upper[i])).rjust(4) + ' ' + str(round_elo(scale * lower[i])).rjust(4) +
+                   ' ' + str(int(games[i])).rjust(5) + ' ' + str(round_elo(100 * scores[i] / games[i])).rjust(4) +
+                   '% ' + str(round_elo(scale * opponents[i] + offset)).rjust(5) + ' ' +
+                   str(round_elo(100 * bt.draws[i].sum() / games[i])).rjust(4) + '% \n')
+    fout.close()
+
+
+def write_los(file_name, names, los, order, first=0, players=200, width=4):
+    '''
+    Writes the matrix in the format of the los command of BayesElo, values are in 1/10^(width-1).
+    '''
+    name_width = max(len(name) for name in names)
+    mult = 10**(min(width, 8) - 1)
+    shown = order[first:first + players]
+    fout = open(file_name, 'w')
+    fout.write(' ' * name_width + ' ' + ''.join(names[i][:width - 1].rjust(width) for i in shown) + '\n')
+    for i in shown:
+        fout.write(names[i].ljust(name_width) + ' ')
+        for j in shown:
+            if i != j:
+                fout.write(str(int(los[i][j] * mult)).rjust(width))
+            else:
+                fout.write(' ' * width)
+        fout.write('\n')
+    fout.close()
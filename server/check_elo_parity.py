@@ -0,0 +1,106 @@
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import subprocess
+import bradley_terry
+from benchmark_elo import random_tournament, add_game, write_pgn, run_bayeselo
+'''
+Compares ratings.txt and los.txt written by Tournament.compute_elo with those of bayeselo, on random tournaments.
+bayeselo is built from the sources in BayesElo with g++ if --bayeselo is not given.
+Values may differ by 1, because bayeselo stops iterating sooner and counts games in floats.
+'''
+
+
+def build_bayeselo(directory):
+    sources = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'BayesElo')
+    bayeselo = os.path.join(directory, 'bayeselo')
+    subprocess.check_call(['g++', '-o', bayeselo, '-O3', '-w', 'bayeselo.cpp'], cwd=sources)
+    return bayeselo
+
+
+def read_ratings(file_name):
+    '''
+    :return: {name: [elo, +, -, games, score, oppo., draws]}
+    '''
+    ratings = {}
+    fin = open(file_name, 'r')
+    fin.readline()
+    for line in fin:
+        reads = line.replace('%', '').split()
+        ratings[reads[1]] = list(map(int, reads[2:]))
+    fin.close()
+    return ratings
+
+
+def read_los(file_name, width=4):
+    '''
+    :return: {(name, name): los}, columns have fixed width, as values may touch
+    '''
+    fin = open(file_name, 'r')
+    lines = fin.read().splitlines()[1:]
+    fin.close()
+    names = [line.split()[0] for line in lines]
+    name_width = max(len(name) for name in names)
+    los = {}
+    for i in range(len(lines)):
+        for j in range(len(names)):
+            if i != j:
+                begin = name_width + 1 + j * width
+                los[(names[i], names[j])] = int(lines[i][begin:begin + width])
+    return los
+
+
+def check(bayeselo, nengines, ngames, draw_ratio, seed, directory):
+    '''
+    :return: (largest difference of ratings.txt, largest difference of los.txt)
+    '''
+    games = random_tournament(nengines, ngames, draw_ratio, seed)
+    mresult = [[[0, 0, 0] for i in range(nengines)] for j in range(nengines)]
+    for game in games:
+        add_game(mresult, game)
+    write_pgn(os.path.join(directory, 'result.pgn'), games)
+    run_bayeselo(bayeselo, directory)
+
+    players, wins, draws = bradley_terry.condense(mresult, [True for i in range(nengines)])
+    bt = bradley_terry.BradleyTerry(wins, draws)
+    bt.minorization_maximization()
+    lower, upper = bt.exact_intervals()
+    names = [str(i) + '#E' + str(i) for i in players]
+    bradley_terry.write_ratings(os.path.join(directory, 'ratings_bt.txt'), names, bt, lower, upper, 1600)
+    bradley_terry.write_los(os.path.join(directory, 'los_bt.txt'), names, bt.likelihood_of_superiority(), bt.order())
+
+    expected = read_ratings(os.path.join(directory, 'ratings.txt'))
+    actual = read_ratings(os.path.join(directory, 'ratings_bt.txt'))
+    if sorted(expected.keys()) != sorted(actual.keys()):
+        raise Exception('Different players')
+    ratings_difference = max(abs(a - b) for name in expected for a, b in zip(expected[name], actual[name]))
+    expected = read_los(os.path.join(directory, 'los.txt'))
+    actual = read_los(os.path.join(directory, 'los_bt.txt'))
+    los_difference = max([abs(expected[key] - actual[key]) for key in expected] + [0])
+    return ratings_difference, los_difference
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the ratings with bayeselo.')
+    parser.add_argument('--bayeselo', default=None, help='path of bayeselo')
+    parser.add_argument('--seeds', type=int, default=5, help='random tournaments of each size')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='check_elo_parity_')
+    bayeselo = args.bayeselo if args.bayeselo else build_bayeselo(directory)
+    failed = False
+    print('engines   games  draws   ratings   los')
+    for nengines, ngames, draw_ratio in [(2, 3, 0.0), (5, 12, 0.3), (8, 200, 0.1), (20, 400, 0.5), (30, 3000, 0.1),
+                                         (60, 20000, 0.05)]:
+        for seed in range(args.seeds):
+            ratings_difference, los_difference = check(bayeselo, nengines, ngames, draw_ratio, seed, directory)
+            print(str(nengines).rjust(7) + str(ngames).rjust(8) + str(draw_ratio).rjust(7) +
+                  str(ratings_difference).rjust(10) + str(los_difference).rjust(6))
+            if ratings_difference > 1 or los_difference > 1:
+                failed = True
+    shutil.rmtree(directory, ignore_errors=True)
+    if failed:
+        print('Differences larger than 1')
+        sys.exit(1)
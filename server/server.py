@@ -1,18 +1,18 @@
 import time
-import socket
 import sys
-import string
+import asyncio
 import threading
+import queue
 import platform
 import re
 import os
 import hashlib
 import base64
-from queue import Queue
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 import random
 import ftplib
 import paramiko
+import bradley_terry
 
 
 def get_md5(curpath, engine):
@@ -37,7 +37,7 @@ def get_base64(curpath, engine):
         fin.close()
         if not reads:
             return None
-        return re.sub(r'\s+', '', base64.b64encode(reads))
+        return base64.b64encode(reads).decode('ascii')
     else:
         return None
 
@@ -119,6 +119,10 @@ class Tournament:
                  time_match, tolerance, memory, real_time_pos,
                  real_time_message):
         self.curpath = curpath
+        self.reports_lock = threading.Lock()
+        self.reports_requested = False
+        self.reports_running = False
+        self.reports_executor = ThreadPoolExecutor(max_workers=1)
         self.enginepath = curpath + slash + 'engine'
         self.engines = engines
         self.engine_ratings = engine_ratings
@@ -157,6 +161,11 @@ class Tournament:
         self.losses = [[0, 0] for i in range(self.nengines)]
         self.draws = [[0, 0] for i in range(self.nengines)]
         self.valids = [True for i in range(self.nengines)]
+        self.finished_matches = []
+        self.pgn_valids = None
+        self.pgn_matches = 0
+        self.pgn_records = 0
+        self.elos = {}
         matchcount = 0
         for i in range(self.round):
             if self.is_tournament:
@@ -226,27 +235,27 @@ class Tournament:
                 short_engines[engine] = (engine, len(engine) - 1)
         while True:
             revert_map = {}
-            for engine, short_engine in short_engines.iteritems():
+            for engine, short_engine in short_engines.items():
                 short_engine, pos = short_engine
-                if not revert_map.has_key(short_engine):
+                if short_engine not in revert_map:
                     revert_map[short_engine] = []
                 revert_map[short_engine].append((engine, pos))
             flag = False
-            for short_engine, engines in revert_map.iteritems():
+            for short_engine, engines in revert_map.items():
                 if len(engines) >= 2:
                     for engine, pos in engines:
                         if pos < len(engine) - 1:
                             flag = True
             if not flag:
                 break
-            for short_engine, engines in revert_map.iteritems():
+            for short_engine, engines in revert_map.items():
                 minpos = 1024
                 maxpos = -1
                 for engine, pos in engines:
                     minpos = min(minpos, pos)
                     maxpos = max(maxpos, pos)
             flag = False
-            for short_engine, engines in revert_map.iteritems():
+            for short_engine, engines in revert_map.items():
                 if len(engines) <= 1:
                     continue
                 for engine, pos in engines:
@@ -259,11 +268,18 @@ class Tournament:
             if not flag:
                 break
         ret_short_engines = {}
-        for engine, short_engine in short_engines.iteritems():
+        for engine, short_engine in short_engines.items():
             ret_short_engines[engine] = short_engine[0]
         return ret_short_engines
 
     def statistics(self):
+        '''
+        Rebuilds all statistics from the matches, it is needed only after loading the state.
+        Later they are updated by add_result() with every finished match.
+        '''
+        self.lresult = [[0, 0, 0] for i in range(self.nengines)]
+        self.mresult = [[[0, 0, 0] for i in range(self.nengines)]
+                        for j in range(self.nengines)]
         self.times = [0 for i in range(self.nengines)]
         self.moves = [0 for i in range(self.nengines)]
         self.games = [0 for i in range(self.nengines)]
@@ -273,124 +289,135 @@ class Tournament:
         self.losses = [[0, 0] for i in range(self.nengines)]
         self.draws = [[0, 0] for i in range(self.nengines)]
         self.valids = [True for i in range(self.nengines)]
+        self.finished_matches = []
         for match in self.matches:
             if match.result != None:
-                player1 = match.player1[0]
-                player2 = match.player2[0]
-                self.times[player1] += match.time1
-                self.times[player2] += match.time2
-                self.moves[player1] += match.move1
-                self.moves[player2] += match.move2
-                self.games[player1] += 1
-                self.games[player2] += 1
-                if match.end_with == 2:
-                    if match.result == 1:
-                        self.timeouts[player2] += 1
-                    elif match.result == 2:
-                        self.timeouts[player1] += 1
-                elif match.end_with == 3 or match.end_with == 4:
-                    if match.result == 1:
-                        self.crashes[player2] += 1
-                    elif match.result == 2:
-                        self.crashes[player1] += 1
-                if not match.reverse ^ match.swapped:
-                    if match.result == 1:
-                        self.wins[player1][0] += 1
-                        self.losses[player2][1] += 1
-                    elif match.result == 2:
-                        self.wins[player2][1] += 1
-                        self.losses[player1][0] += 1
-                    else:
-                        self.draws[player1][0] += 1
-                        self.draws[player2][1] += 1
-                else:
-                    if match.result == 1:
-                        self.wins[player1][1] += 1
-                        self.losses[player2][0] += 1
-                    elif match.result == 2:
-                        self.wins[player2][0] += 1
-                        self.losses[player1][1] += 1
-                    else:
-                        self.draws[player1][1] += 1
-                        self.draws[player2][0] += 1
-        for i in range(self.nengines):
-            if self.games[i] > 0 and (self.timeouts[i] + self.crashes[i]
-                                      ) * 1.0 / self.games[i] > 0.1:
-                self.valids[i] = False
+                self.add_result(match)
+
+    def add_result(self, match):
+        player1 = match.player1[0]
+        player2 = match.player2[0]
+        if match.result == 1:
+            self.lresult[player1][0] += 1
+            self.lresult[player2][1] += 1
+            self.mresult[player1][player2][0] += 1
+            self.mresult[player2][player1][1] += 1
+        elif match.result == 2:
+            self.lresult[player1][1] += 1
+            self.lresult[player2][0] += 1
+            self.mresult[player1][player2][1] += 1
+            self.mresult[player2][player1][0] += 1
+        else:
+            self.lresult[player1][2] += 1
+            self.lresult[player2][2] += 1
+            self.mresult[player1][player2][2] += 1
+            self.mresult[player2][player1][2] += 1
+        self.times[player1] += match.time1
+        self.times[player2] += match.time2
+        self.moves[player1] += match.move1
+        self.moves[player2] += match.move2
+        self.games[player1] += 1
+        self.games[player2] += 1
+        if match.end_with == 2:
+            if match.result == 1:
+                self.timeouts[player2] += 1
+            elif match.result == 2:
+                self.timeouts[player1] += 1
+        elif match.end_with == 3 or match.end_with == 4:
+            if match.result == 1:
+                self.crashes[player2] += 1
+            elif match.result == 2:
+                self.crashes[player1] += 1
+        if not match.reverse ^ match.swapped:
+            if match.result == 1:
+                self.wins[player1][0] += 1
+                self.losses[player2][1] += 1
+            elif match.result == 2:
+                self.wins[player2][1] += 1
+                self.losses[player1][0] += 1
+            else:
+                self.draws[player1][0] += 1
+                self.draws[player2][1] += 1
+        else:
+            if match.result == 1:
+                self.wins[player1][1] += 1
+                self.losses[player2][0] += 1
+            elif match.result == 2:
+                self.wins[player2][0] += 1
+                self.losses[player1][1] += 1
+            else:
+                self.draws[player1][1] += 1
+                self.draws[player2][0] += 1
+        for i in [player1, player2]:
+            self.valids[i] = not ((self.timeouts[i] + self.crashes[i]
+                                   ) * 1.0 / self.games[i] > 0.1)
+        self.finished_matches.append(match)
 
     def generate_pgn(self):
+        '''
+        Matches are appended to the PGN in the order they finished, it is rewritten only when the validity
+        of an engine changes.
+        '''
         result_path = self.curpath + slash + 'result' + slash + tur_name
         pgn_file = result_path + slash + "result.pgn"
-        fout = open(pgn_file, 'w')
-        nmatches = 0
-        for match in self.matches:
-            if match.result != None:
-                if self.valids[match.player1[0]] == False or self.valids[
-                        match.player2[0]] == False:
-                    continue
-                fout.write("[White \"" + str(match.player1[0]) + "#" +
-                           match.player1[1].rsplit('.', 1)[0] + "\"]\n")
-                fout.write("[Black \"" + str(match.player2[0]) + "#" +
-                           match.player2[1].rsplit('.', 1)[0] + "\"]\n")
-                if match.result == 1:
-                    cur_result = "1-0"
-                elif match.result == 2:
-                    cur_result = "0-1"
-                else:
-                    cur_result = "1/2-1/2"
-                fout.write("[Result \"" + cur_result + "\"]\n")
-                fout.write("\n")
-                fout.write("1. d4 d5 " + cur_result + "\n")
-                fout.write("\n")
-                nmatches += 1
+        finished = len(self.finished_matches)  # matches finishing meanwhile are written next time
+        valids = list(self.valids)
+        if valids != self.pgn_valids:
+            fout = open(pgn_file, 'w')
+            self.pgn_valids = valids
+            self.pgn_matches = 0
+            self.pgn_records = 0
+        else:
+            fout = open(pgn_file, 'a')
+        for match in self.finished_matches[self.pgn_matches:finished]:
+            if valids[match.player1[0]] == False or valids[
+                    match.player2[0]] == False:
+                continue
+            fout.write("[White \"" + str(match.player1[0]) + "#" +
+                       match.player1[1].rsplit('.', 1)[0] + "\"]\n")
+            fout.write("[Black \"" + str(match.player2[0]) + "#" +
+                       match.player2[1].rsplit('.', 1)[0] + "\"]\n")
+            if match.result == 1:
+                cur_result = "1-0"
+            elif match.result == 2:
+                cur_result = "0-1"
+            else:
+                cur_result = "1/2-1/2"
+            fout.write("[Result \"" + cur_result + "\"]\n")
+            fout.write("\n")
+            fout.write("1. d4 d5 " + cur_result + "\n")
+            fout.write("\n")
+            self.pgn_records += 1
+        self.pgn_matches = finished
         fout.close()
-        if nmatches > 0:
+        if self.pgn_records > 0:
             return True
         else:
             return False
 
     def compute_elo(self):
+        '''
+        Ratings are fitted like by BayesElo (mm, exactdist), from mresult of the valid engines, starting from
+        the previous ratings, so only a few iterations are needed after a match.
+        '''
         result_path = self.curpath + slash + 'result' + slash + tur_name
         ratings = []
-        if self.generate_pgn():
-            bayeselo_exe = self.curpath + slash + "bayeselo.exe"
-            p = subprocess.Popen([bayeselo_exe],
-                                 bufsize=1048576,
-                                 stdin=subprocess.PIPE,
-                                 stdout=subprocess.PIPE)
-            pin, pout = p.stdin, p.stdout
-            pin.write("readpgn " + result_path + slash + "result.pgn\n")
-            pin.flush()
-            pin.write("elo\n")
-            pin.flush()
-            pin.write("offset 1600\n")
-            pin.flush()
-            pin.write("mm\n")
-            pin.flush()
-            pin.write("exactdist\n")
-            pin.flush()
-            pin.write("ratings >" + result_path + slash + "ratings.txt\n")
-            pin.flush()
-            pin.write("los 0 200 4 >" + result_path + slash + "los.txt\n")
-            pin.flush()
-            pin.write("x\n")
-            pin.flush()
-            pin.write("x\n")
-            pin.flush()
-            p.wait()
-            fin = open(result_path + slash + "ratings.txt", 'r')
-            reads = fin.readline()
-            while True:
-                reads = fin.readline()
-                if not reads:
-                    break
-                reads = reads.strip()
-                reads = re.split(r'\s+', reads)
+        self.generate_pgn()
+        players, wins, draws = bradley_terry.condense(self.mresult, list(self.valids))
+        if len(players) > 0:
+            bt = bradley_terry.BradleyTerry(wins, draws)
+            bt.minorization_maximization([self.elos.get(i, 0.0) for i in players])
+            self.elos = dict(zip(players, bt.elos))
+            lower, upper = bt.exact_intervals()
+            names = [str(i) + "#" + self.engines[i].rsplit('.', 1)[0] for i in players]
+            bradley_terry.write_ratings(result_path + slash + "ratings.txt", names, bt, lower, upper, 1600)
+            bradley_terry.write_los(result_path + slash + "los.txt", names, bt.likelihood_of_superiority(),
+                                    bt.order())
+            scale = bt.elo_scale()
+            for i in bt.order():
                 ratings.append(
-                    (string.atoi(reads[1].split('#',
-                                                1)[0]), string.atoi(reads[2]),
-                     reads[1].split('#', 1)[1], string.atoi(reads[4])))
-            fin.close()
+                    (players[i], bradley_terry.round_elo(scale * bt.elos[i] + 1600),
+                     self.engines[players[i]].rsplit('.', 1)[0], bradley_terry.round_elo(scale * lower[i])))
         inratings = [False for i in range(self.nengines)]
         for engine_id, rating, engine_name, rating_m in ratings:
             inratings[engine_id] = True
@@ -489,6 +516,33 @@ class Tournament:
         fout.close()
         ssh_upload(result_path + slash + "_result.txt", False)
 
+    def request_reports(self):
+        '''
+        Reports are generated in a separate thread, because computing ratings takes a while and clients would wait.
+        Requests made while the reports are being generated are merged into one.
+        '''
+        with self.reports_lock:
+            self.reports_requested = True
+            if not self.reports_running:
+                self.reports_running = True
+                self.reports_executor.submit(self.generate_reports)
+
+    def generate_reports(self):
+        while True:
+            with self.reports_lock:
+                if not self.reports_requested:
+                    self.reports_running = False
+                    return
+                self.reports_requested = False
+            try:
+                self.print_table()
+                self.print_statistics()
+            except Exception as e:
+                print_log('Generating reports failed: ' + repr(e))
+
+    def wait_for_reports(self):
+        self.reports_executor.shutdown(wait=True)
+
     def assign_match(self, client):
         inv_ratings = {}
         for engine_id, rating, engine_name, rating_m in self.ratings:
@@ -553,28 +607,6 @@ class Tournament:
                 break
         self.leftmatches = leftmatches
         fin.close()
-        self.restore_result()
-
-    def restore_result(self):
-        for match in self.matches:
-            player1 = match.player1[0]
-            player2 = match.player2[0]
-            if match.result != None:
-                if match.result == 1:
-                    self.lresult[player1][0] += 1
-                    self.lresult[player2][1] += 1
-                    self.mresult[player1][player2][0] += 1
-                    self.mresult[player2][player1][1] += 1
-                elif match.result == 2:
-                    self.lresult[player1][1] += 1
-                    self.lresult[player2][0] += 1
-                    self.mresult[player1][player2][1] += 1
-                    self.mresult[player2][player1][0] += 1
-                else:
-                    self.lresult[player1][2] += 1
-                    self.lresult[player2][2] += 1
-                    self.mresult[player1][player2][2] += 1
-                    self.mresult[player2][player1][2] += 1
 
 
 def cmp_result(result1, result2):
@@ -608,8 +640,8 @@ def parse_pos(pos, opening):
     len_opening = opening_length(opening)
     spos = pos.strip()
     if spos:
-        times = map(lambda x: string.atoi(x.split(',')[-1]),
-                    pos.strip().split('\n'))[len_opening:]
+        times = list(map(lambda x: int(x.split(',')[-1]),
+                         pos.strip().split('\n')))[len_opening:]
     else:
         times = []
     len_times = len(times)
@@ -668,15 +700,15 @@ class Client_state:
         print_log(outstr)
 
     def end(self, pos, message, result, end_with):
-        pos = base64.b64decode(pos)
+        pos = base64.b64decode(pos).decode('utf-8', errors='replace')
         pos = opening_pos2psq(self.match.opening) + pos
-        message = base64.b64decode(message)
-        result_raw = string.atoi(result)
+        message = base64.b64decode(message)  # messages of engines are kept as bytes, their encoding is unknown
+        result_raw = int(result)
         result = result_raw
         if result > 0:
             if opening_reverse(self.match.opening) ^ self.match.swapped:
                 result = 3 - result
-        end_with = string.atoi(end_with)
+        end_with = int(end_with)
         round = self.match.round
         player1 = self.match.player1
         player2 = self.match.player2
@@ -702,9 +734,9 @@ class Client_state:
         fpos.close()
         if upload_offline_result:
             ssh_upload(pos_path, False)
-        fmessage = open(result_path + slash + 'message.txt', 'a')
+        fmessage = open(result_path + slash + 'message.txt', 'ab')
         fmessage.write(message)
-        fmessage.write('\n--> ' + pos_path + '\n\n')
+        fmessage.write(('\n--> ' + pos_path + '\n\n').encode('utf-8'))
         fmessage.close()
         #ssh_upload(result_path + slash + 'message.txt', False)
         self.match.result = result
@@ -712,23 +744,7 @@ class Client_state:
         self.match.time1, self.match.time2, self.match.move1, self.match.move2 = parse_pos(
             pos, self.match.opening)
         cur_tur = self.tournament
-        player1_id = player1[0]
-        player2_id = player2[0]
-        if result == 1:
-            cur_tur.lresult[player1_id][0] += 1
-            cur_tur.lresult[player2_id][1] += 1
-            cur_tur.mresult[player1_id][player2_id][0] += 1
-            cur_tur.mresult[player2_id][player1_id][1] += 1
-        elif result == 2:
-            cur_tur.lresult[player1_id][1] += 1
-            cur_tur.lresult[player2_id][0] += 1
-            cur_tur.mresult[player1_id][player2_id][1] += 1
-            cur_tur.mresult[player2_id][player1_id][0] += 1
-        else:
-            cur_tur.lresult[player1_id][2] += 1
-            cur_tur.lresult[player2_id][2] += 1
-            cur_tur.mresult[player1_id][player2_id][2] += 1
-            cur_tur.mresult[player2_id][player1_id][2] += 1
+        cur_tur.add_result(self.match)
 
         outstr = 'Game ' + str(
             self.match.group_id) + ' finished on Client ' + self.addr + '.'
@@ -752,9 +768,7 @@ class Client_state:
         self.cur_message = None
 
         self.tournament.save_state()
-        self.tournament.statistics()
-        self.tournament.print_table()
-        self.tournament.print_statistics()
+        self.tournament.request_reports()
 
         cur_tur.leftmatches -= 1
         if cur_tur.leftmatches == 0:
@@ -763,7 +777,7 @@ class Client_state:
             return False
 
     def save_pos(self, pos):
-        pos = base64.b64decode(pos)
+        pos = base64.b64decode(pos).decode('utf-8', errors='replace')
         if not self.cur_pos:
             self.cur_pos = opening_pos2psq(self.match.opening) + pos
         else:
@@ -806,74 +820,70 @@ class Client_state:
         else:
             os.makedirs(tmp_path)
         message_path = tmp_path + slash + message_name
-        fmessage = open(message_path, 'w')
+        fmessage = open(message_path, 'wb')
         fmessage.write(self.cur_message)
         fmessage.close()
         #ssh_upload(message_path, True)
 
-    def process(self, output_queue):
+    def process(self):
         if self.active:
             if self.has_player1 == None:
                 self.ask = 'player1'
-                output_queue.put(
-                    (self.addr, "engine exist " + self.match.player1[2]))
+                send(self.addr, "engine exist " + self.match.player1[2])
             elif self.has_player1 == False:
                 self.ask = 'player1'
-                output_queue.put(
-                    (self.addr,
-                     "engine send " + base64.b64encode(self.match.player1[1]) +
-                     " " + get_base64(self.curpath, self.match.player1[1])))
+                send(self.addr,
+                     "engine send " + base64.b64encode(self.match.player1[1].encode('utf-8')).decode('ascii') +
+                     " " + get_base64(self.curpath, self.match.player1[1]))
             elif self.has_player2 == None:
                 self.ask = 'player2'
-                output_queue.put(
-                    (self.addr, "engine exist " + self.match.player2[2]))
+                send(self.addr, "engine exist " + self.match.player2[2])
             elif self.has_player2 == False:
                 self.ask = 'player2'
-                output_queue.put(
-                    (self.addr,
-                     "engine send " + base64.b64encode(self.match.player2[1]) +
-                     " " + get_base64(self.curpath, self.match.player2[1])))
+                send(self.addr,
+                     "engine send " + base64.b64encode(self.match.player2[1].encode('utf-8')).decode('ascii') +
+                     " " + get_base64(self.curpath, self.match.player2[1]))
             elif self.sent_real_time_pos == False:
                 self.ask = 'real_time_pos'
                 if self.match.real_time_pos == True:
-                    output_queue.put((self.addr, "set real_time_pos 1"))
+                    send(self.addr, "set real_time_pos 1")
                 else:
-                    output_queue.put((self.addr, "set real_time_pos 0"))
+                    send(self.addr, "set real_time_pos 0")
             elif self.sent_real_time_message == False:
                 self.ask = 'real_time_message'
                 if self.match.real_time_message == True:
-                    output_queue.put((self.addr, "set real_time_message 1"))
+                    send(self.addr, "set real_time_message 1")
                 else:
-                    output_queue.put((self.addr, "set real_time_message 0"))
+                    send(self.addr, "set real_time_message 0")
             elif self.tmp_pos != None:
-                if tmp_pos.strip() == 'swap':
+                if self.tmp_pos.strip() == 'swap':
                     self.match.swapped = True
                 else:
                     self.save_pos(self.tmp_pos)
                 self.tmp_pos = None
-                output_queue.put((self.addr, "received"))
+                send(self.addr, "received")
             elif self.tmp_message != None:
                 self.save_message(self.tmp_message)
                 self.tmp_message = None
-                output_queue.put((self.addr, "received"))
+                send(self.addr, "received")
             elif not self.started:
                 self.ask = 'match'
-                output_queue.put((self.addr, "match new " + self.match.player1[2] + ' ' + self.match.player2[2] + \
-                                  ' ' + self.match.time_turn + ' ' + self.match.time_match + ' ' + self.match.rule + \
-                                  ' ' + self.match.tolerance + ' ' + self.match.opening + ' ' + self.match.board_size + \
-                                  ' ' + self.match.memory))
+                send(self.addr, "match new " + self.match.player1[2] + ' ' + self.match.player2[2] + \
+                     ' ' + self.match.time_turn + ' ' + self.match.time_match + ' ' + self.match.rule + \
+                     ' ' + self.match.tolerance + ' ' + self.match.opening + ' ' + self.match.board_size + \
+                     ' ' + self.match.memory)
         else:
             if self.blacklist is None:
                 self.ask = 'blacklist'
-                output_queue.put((self.addr, "blacklist"))
+                send(self.addr, "blacklist")
             elif self.ended:
                 self.ask = None
-                output_queue.put((self.addr, "ok"))
+                send(self.addr, "ok")
                 assign_match_result = self.tournament.assign_match(self)
                 if assign_match_result == 2:
-                    self.process(output_queue)
+                    self.process()
                 else:
-                    output_queue.put((self.addr, "end"))
+                    send(self.addr, "end")
                     if assign_match_result == 0:
                         self.ended_all = True
 
@@ -891,98 +901,228 @@ def print_log(outstr, file=None):
     fout.close()
 
 
-def connect_addr(addr, trecv, conn):
+def net_log(direction, addr, line):
+    '''
+    Lines are written to netlog.txt by net_log_process, so that the event loop does not wait for the disk.
+    '''
+    if len(line) > net_log_line_length:  # finished matches are sent with all the messages of the engines
+        line = line[:net_log_line_length] + '... (' + str(len(line)) + ' characters)'
+    strdate = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
+    net_log_queue.put('[' + strdate + '] ' + repr((direction, addr, line)))
+
+
+def net_log_process():
+    fout = open(net_log_file, 'a')
+    while True:
+        outstr = net_log_queue.get()
+        if outstr is None:
+            break
+        fout.write(outstr)
+        fout.write('\n')
+        if net_log_queue.empty():
+            fout.flush()
+    fout.close()
+
+
+class Connection:
+    """
+    Stream of one client. Lines for the client are queued and written by a separate task, so a slow client delays
+    only its own answers. The next line from the client is read only after most of its answers were sent.
+    """
+
+    def __init__(self, addr, reader, writer):
+        self.addr = addr
+        self.reader = reader
+        self.writer = writer
+        self.outbox = asyncio.Queue()
+        self.sender = asyncio.ensure_future(self.send_lines())
+
+    def send(self, line):
+        self.outbox.put_nowait(line)
+
+    def close(self):
+        self.outbox.put_nowait(None)
+
+    async def wait_for_room(self):
+        if self.outbox.qsize() >= outbox_limit:
+            await self.outbox.join()
+
+    async def send_lines(self):
+        try:
+            while True:
+                outstr = await self.outbox.get()
+                if outstr is None:
+                    self.outbox.task_done()
+                    break
+                net_log('output', self.addr, outstr)
+                self.writer.write((outstr + '\n').encode('utf-8'))
+                await self.writer.drain()
+                self.outbox.task_done()
+                if outstr == "end":
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            '''answers that could not be sent are dropped, as if they were sent to a closed socket'''
+            while not self.outbox.empty():
+                self.outbox.get_nowait()
+                self.outbox.task_done()
+            self.writer.close()
+
+
+def send(addr, outstr):
+    if addr in connections:
+        connections[addr].send(outstr)
+
+
+def connect_addr(addr, connection):
     outstr = 'Client ' + addr + ' connected.'
     print_log(outstr)
-    trecvs[addr] = (trecv, conn)
+    connections[addr] = connection
 
 
 def disconnect_addr(addr):
     outstr = 'Client ' + addr + ' disconnected.'
     print_log(outstr)
-    if trecvs.has_key(addr):
-        del trecvs[addr]
-
-
-def recv_client(conn, addr):
-    global recv_str, recv_mutex
-    while True:
-        try:
-            data = conn.recv(5242800)
-            if not data:
-                disconnect_addr(addr)
-                return
-            if recv_mutex.acquire():
-                if not recv_str.has_key(addr):
-                    recv_str[addr] = ''
-                recv_str[addr] = recv_str[addr] + data
-                sdata = recv_str[addr].split('\n')
-                recv_str[addr] = sdata[-1]
-                sdata = sdata[:-1]
-                for edata in sdata:
-                    input_queue.put((addr, edata))
-                    out_str = repr(('input', addr, edata))
-                    print_log(out_str, net_log_file)
-                recv_mutex.release()
-        except:
-            disconnect_addr(addr)
-            if clients_state.has_key(addr):
-                if clients_state[addr].match:
-                    if clients_state[addr].match.result == None:
-                        outstr = 'Game ' + repr(
-                            clients_state[addr].match.group_id
-                        ) + ' failed on Client ' + addr + '.'
-                        print_log(outstr)
-                        clients_state[addr].match.reinit()
-                del clients_state[addr]
-            return
+    if addr in connections:
+        del connections[addr]
+    if addr in clients_state:
+        if clients_state[addr].match:
+            if clients_state[addr].match.result == None:
+                outstr = 'Game ' + repr(
+                    clients_state[addr].match.group_id
+                ) + ' failed on Client ' + addr + '.'
+                print_log(outstr)
+                clients_state[addr].match.reinit()
+        del clients_state[addr]
+
+
+def dispatch(inaddr, instr):
+    instr = instr.strip()
+    sinstr = re.split(r'\s', instr)
+    cur_client = clients_state[inaddr]
+    if len(sinstr) == 0:
+        return
+    if sinstr[0].lower() == 'connected':
+        cur_client.active = False
+        cur_client.blacklist = None
+        cur_client.process()
+    elif sinstr[0].lower() == 'yes':
+        if cur_client.ask == 'player1':
+            cur_client.has_player1 = True
+            cur_client.process()
+        elif cur_client.ask == 'player2':
+            cur_client.has_player2 = True
+            cur_client.process()
+    elif sinstr[0].lower() == 'no':
+        if cur_client.ask == 'player1':
+            cur_client.has_player1 = False
+            cur_client.process()
+        elif cur_client.ask == 'player2':
+            cur_client.has_player2 = False
+            cur_client.process()
+    elif sinstr[0].lower() == 'ok':
+        if cur_client.ask == 'match':
+            cur_client.started == True
+            cur_client.save_pos('')
+        elif cur_client.ask == 'real_time_pos':
+            cur_client.sent_real_time_pos = True
+            cur_client.process()
+        elif cur_client.ask == 'real_time_message':
+            cur_client.sent_real_time_message = True
+            cur_client.process()
+    elif sinstr[0].lower() == 'received':
+        if cur_client.ask == 'player1':
+            cur_client.has_player1 = None
+            cur_client.process()
+        elif cur_client.ask == 'player2':
+            cur_client.has_player2 = None
+            cur_client.process()
+    elif sinstr[0].lower() == 'match':
+        if sinstr[1].lower() == 'finished':
+            pos = sinstr[2]
+            message = sinstr[3]
+            result = sinstr[4]
+            end_with = sinstr[5]
+            cur_client.end(pos, message, result, end_with)
+            cur_client.process()
+    elif sinstr[0].lower() == 'pos':
+        if real_time_pos:
+            cur_client.tmp_pos = sinstr[1]
+            cur_client.process()
+    elif sinstr[0].lower() == 'message':
+        if real_time_message:
+            cur_client.tmp_message = sinstr[1]
+            cur_client.process()
+    elif sinstr[0].lower() == 'blacklist':
+        if cur_client.ask == 'blacklist':
+            if sinstr[1] == 'None':
+                cur_client.blacklist = []
+            else:
+                cur_client.blacklist = sinstr[1].split(';')
+            tournament_state.assign_match(cur_client)
+            cur_client.process()
 
 
-def output_client():
-    while (True):
-        addr, outstr = output_queue.get()
-        out_str = repr(('output', addr, outstr))
-        print_log(out_str, net_log_file)
-        if trecvs.has_key(addr):
-            conn = trecvs[addr][1]
-            conn.sendall(outstr + '\n')
-            if outstr == "end":
-                disconnect_addr(addr)
+def receive(addr, instr):
+    net_log('input', addr, instr)
+    try:
+        dispatch(addr, instr)
+    except Exception as e:
+        print_log('Incorrect command ' + repr(instr) + ' from Client ' + addr + ': ' + repr(e))
+    check_end()
+
+
+async def handle_client(reader, writer):
+    peer = writer.get_extra_info('peername')
+    addr = peer[0] + ':' + str(peer[1])
+    connection = Connection(addr, reader, writer)
+    connect_addr(addr, connection)
+    clients_state[addr] = Client_state(curpath, addr)
+    receive(addr, 'connected')
+    try:
+        while True:
+            data = await reader.readline()
+            if not data.endswith(b'\n'):  # end of stream, possibly with an incomplete line
+                break
+            receive(addr, data[:-1].decode('utf-8', errors='replace'))
+            await connection.wait_for_room()
+    except (ConnectionError, OSError, ValueError):  # ValueError is raised for lines longer than the limit
+        pass
+    finally:
+        disconnect_addr(addr)
+        check_end()
+        connection.close()
+        await connection.sender
 
 
-def accept_client(host, port):
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.bind((host, port))
-    s.listen(1)
-    while True:
-        conn, addr = s.accept()
-        addr = addr[0] + ':' + str(addr[1])
-        trecv = threading.Thread(target=recv_client, args=(conn, addr))
-        connect_addr(addr, trecv, conn)
-        trecv.start()
-        clients_state[addr] = Client_state(curpath, addr)
-        input_queue.put((addr, 'connected'))
-        out_str = repr(('input', addr, 'connected'))
-        print_log(out_str, net_log_file)
-    conn.close()
+def check_end():
+    for client_addr, client in clients_state.items():
+        if not client.ended_all:
+            return
+    if tournament_state.leftmatches > 0:
+        return
+    server_ended.set()
 
 
-def check_end():
-    while True:
-        end_flag = True
-        for client_addr, client in clients_state.iteritems():
-            if not client.ended_all:
-                end_flag = False
-        if not output_queue.empty():
-            end_flag = False
-        if not ftp_queue.empty():
-            end_flag = False
-        if tournament_state.leftmatches > 0:
-            end_flag = False
-        if end_flag:
-            print_log("Server ended.")
-            os._exit(0)
-        time.sleep(1)
+async def serve(host, port):
+    global server_ended
+    server_ended = asyncio.Event()
+    server = await asyncio.start_server(handle_client, host, port, limit=max_line_length, backlog=1024)
+    print_log("Server started.")
+    check_end()
+    await server_ended.wait()
+    server.close()
+    for connection in list(connections.values()):
+        try:
+            await asyncio.wait_for(connection.outbox.join(), close_timeout)
+        except asyncio.TimeoutError:
+            print_log('Answers for Client ' + connection.addr + ' were not sent in time.')
+        connection.writer.close()
+    tournament_state.wait_for_reports()
+    while not ftp_queue.empty():
+        await asyncio.sleep(1)
+    print_log("Server ended.")
 
 
 def parse_line_tournament(line):
@@ -1024,11 +1164,11 @@ def parse_line_opening(line):
 
 def opening2pos(opening, board_size):
     opening = opening.split(',')
-    hboard = board_size / 2
+    hboard = board_size // 2
     pos = ""
-    for i in range(len(opening) / 2):
-        curx = hboard + string.atoi(opening[2 * i])
-        cury = hboard + string.atoi(opening[2 * i + 1])
+    for i in range(len(opening) // 2):
+        curx = hboard + int(opening[2 * i])
+        cury = hboard + int(opening[2 * i + 1])
         pos = pos + chr(ord('a') + curx)
         pos = pos + str(1 + cury)
     return pos
@@ -1039,7 +1179,7 @@ def opening_pos2psq(pos):
     cur_psq = ''
     for p in poses:
         px = ord(p[0]) - ord('a') + 1
-        py = string.atoi(p[1:])
+        py = int(p[1:])
         cur_psq += str(px) + ',' + str(py) + ',' + '0\n'
     return cur_psq
 
@@ -1122,7 +1262,7 @@ def ssh_connect():
         ssh_server = remote_info[0]
         if ':' in ssh_server:
             ssh_server, port = remote_info[0].rsplit(':', 1)
-            port = string.atoi(port)
+            port = int(port)
         else:
             port = 22
         username = remote_info[1]
@@ -1131,6 +1271,7 @@ def ssh_connect():
         tra.connect(username=username, password=password)
         sftp = paramiko.SFTPClient.from_transport(tra)
         return (tra, sftp)
+    return (None, None)
 
 
 def ssh_upload(upfile, is_online):
@@ -1164,10 +1305,12 @@ if __name__ == "__main__":
         print('Parameter error!')
         exit(-1)
 
-    trecvs = {}
+    connections = {}
     clients_state = {}
-    input_queue = Queue(maxsize=0)
-    output_queue = Queue(maxsize=0)
+    outbox_limit = 16  # answers queued for a client before the server stops reading from it
+    max_line_length = 64 * 1024 * 1024  # finished match is sent in one line, with the whole game and messages
+    net_log_line_length = 4096  # longer lines are truncated in netlog.txt
+    close_timeout = 10  # seconds given to clients to receive the last answers when the server ends
 
     curpath = sys.path[0]
     curos = platform.system()
@@ -1176,8 +1319,6 @@ if __name__ == "__main__":
     else:
         slash = '/'
 
-    recv_str = {}
-    recv_mutex = threading.Lock()
     tournament_name = sys.argv[1]
     tournament_file = curpath + slash + 'tournament' + slash + tournament_name + '.txt'
     tournament = read_tournament(tournament_file)
@@ -1197,23 +1338,22 @@ if __name__ == "__main__":
     time_match = tournament['time_match']
     tolerance = tournament['tolerance']
     memory = tournament['memory']
-    real_time_pos = string.atoi(tournament['real_time_pos'])
+    real_time_pos = int(tournament['real_time_pos'])
     if real_time_pos > 0:
         real_time_pos = True
     else:
         real_time_pos = False
-    real_time_message = string.atoi(tournament['real_time_message'])
+    real_time_message = int(tournament['real_time_message'])
     if real_time_message > 0:
         real_time_message = True
     else:
         real_time_message = False
     try:
-        upload_ratio = string.atof(tournament['upload_ratio'])
+        upload_ratio = float(tournament['upload_ratio'])
     except:
         upload_ratio = 1.0
     try:
-        upload_offline_result = string.atoi(
-            tournament['upload_offline_result'])
+        upload_offline_result = int(tournament['upload_offline_result'])
         if upload_offline_result == 1:
             upload_offline_result = True
         else:
@@ -1250,7 +1390,7 @@ if __name__ == "__main__":
     state_file = result_dir + slash + 'state.txt'
     result_file = result_dir + slash + 'result.txt'
     message_file = result_dir + slash + 'message.txt'
-    openings = read_opening(opening_file, string.atoi(board_size))
+    openings = read_opening(opening_file, int(board_size))
 
     tournament_state = Tournament(curpath, engines, engine_ratings,
                                   rating_diff, tur_name, board_size, rule,
@@ -1259,85 +1399,14 @@ if __name__ == "__main__":
                                   real_time_message)
 
     host = '0.0.0.0'
-    port = string.atoi(sys.argv[2])
-    taccept = threading.Thread(target=accept_client, args=(host, port))
-    taccept.start()
-    toutput = threading.Thread(target=output_client)
-    toutput.start()
-    tend = threading.Thread(target=check_end)
-    tend.start()
+    port = int(sys.argv[2])
     tftp = threading.Thread(target=ssh_upload_process)
     tftp.start()
-
-    print_log("Server started.")
-
-    while (True):
-        cur_input = input_queue.get()
-        print(cur_input)
-        inaddr = cur_input[0]
-        instr = cur_input[1].strip()
-        sinstr = re.split(r'\s', instr)
-        cur_client = clients_state[inaddr]
-        if len(sinstr) == 0:
-            continue
-        if sinstr[0].lower() == 'connected':
-            cur_client.active = False
-            cur_client.blacklist = None
-            cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'yes':
-            if cur_client.ask == 'player1':
-                cur_client.has_player1 = True
-                cur_client.process(output_queue)
-            elif cur_client.ask == 'player2':
-                cur_client.has_player2 = True
-                cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'no':
-            if cur_client.ask == 'player1':
-                cur_client.has_player1 = False
-                cur_client.process(output_queue)
-            elif cur_client.ask == 'player2':
-                cur_client.has_player2 = False
-                cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'ok':
-            if cur_client.ask == 'match':
-                cur_client.started == True
-                cur_client.save_pos('')
-            elif cur_client.ask == 'real_time_pos':
-                cur_client.sent_real_time_pos = True
-                cur_client.process(output_queue)
-            elif cur_client.ask == 'real_time_message':
-                cur_client.sent_real_time_message = True
-                cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'received':
-            if cur_client.ask == 'player1':
-                cur_client.has_player1 = None
-                cur_client.process(output_queue)
-            elif cur_client.ask == 'player2':
-                cur_client.has_player2 = None
-                cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'match':
-            if sinstr[1].lower() == 'finished':
-                pos = sinstr[2]
-                message = sinstr[3]
-                result = sinstr[4]
-                end_with = sinstr[5]
-                cur_client.end(pos, message, result, end_with)
-                cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'pos':
-            if real_time_pos:
-                tmp_pos = sinstr[1]
-                cur_client.tmp_pos = tmp_pos
-                cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'message':
-            if real_time_message:
-                tmp_message = sinstr[1]
-                cur_client.tmp_message = tmp_message
-                cur_client.process(output_queue)
-        elif sinstr[0].lower() == 'blacklist':
-            if cur_client.ask == 'blacklist':
-                if sinstr[1] == 'None':
-                    cur_client.blacklist = []
-                else:
-                    cur_client.blacklist = sinstr[1].split(';')
-                tournament_state.assign_match(cur_client)
-                cur_client.process(output_queue)
+    net_log_queue = queue.Queue()
+    tnetlog = threading.Thread(target=net_log_process)
+    tnetlog.start()
+
+    asyncio.run(serve(host, port))
+    net_log_queue.put(None)
+    tnetlog.join()
+    os._exit(0)